@@ -1,21 +1,53 @@
 # api/ai_mocks.py
 
+import logging
 import time
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from . import face_index
+from . import preprocessing
+from . import risk_engine
+from . import tracing
 
+RISK_MODEL_NAMES = {
+    "risk_model": "mock-xgboost-classifier-v1.4",
+    "xai_model": "mock-shap-explainer-v1.1"
+}
 
-def mock_document_intelligence(document_type, file_name):
+logger = logging.getLogger(__name__)
+
+
+def _mock_passport_identity(app_id):
+    """
+    A document number and date of birth for the mock passport, stable per
+    application. A constant number would make every applicant after the
+    first a duplicate document in the identity index.
+    """
+    rng = random.Random(app_id) if app_id else random.Random()
+    dob = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55))
+    return f"P{rng.randrange(10 ** 8):08d}", dob.isoformat()
+
+
+@tracing.traced("ai.document_intelligence")
+def mock_document_intelligence(document_type, file_name, app_id=None, image_bytes=None, model_inputs=None):
     """
     Simulates the "Document Intelligence Layer" (TrOCR + CNN Forensics).
 
     This function will:
-    1. Add a realistic processing delay (1.5 - 3.5 seconds).
-    2. Return mock extracted data based on the document type.
-    3. Return mock forensic analysis (tamper check).
+    1. Preprocess the upload into the OCR and forensics inputs (unless
+       the caller already did, and passes them as model_inputs).
+    2. Add a realistic processing delay (1.5 - 3.5 seconds).
+    3. Return mock extracted data based on the document type.
+    4. Return mock forensic analysis (tamper check).
     """
 
-    print(f"[AI MOCK]: Processing '{file_name}' as '{document_type}'...")
+    logger.debug("Processing document", extra={
+        "application_id": app_id, "stage": "document", "document_type": document_type, "file_name": file_name
+    })
+
+    # Decoded, oriented and downscaled once; the models only see these variants
+    if model_inputs is None:
+        model_inputs = preprocessing.preprocess(image_bytes, preprocessing.DOCUMENT_TARGETS, app_id=app_id)
 
     # Simulate AI processing time
     processing_time = random.uniform(1.5, 3.5)
@@ -28,15 +60,18 @@ def mock_document_intelligence(document_type, file_name):
         "forensics_model": "mock-cnn-tamper-v2.1",
         "processing_time_sec": round(processing_time, 2)
     }
+    if model_inputs is not None:
+        model_info["input"] = model_inputs.describe()
 
     # --- Mock Data Generation ---
     if document_type == "PASSPORT":
+        document_number, dob = _mock_passport_identity(app_id)
         data = {
             "extracted_data": {
                 "first_name": "JANE",
                 "last_name": "DOE",
-                "document_number": "P01234567",
-                "dob": "1990-01-01",
+                "document_number": document_number,
+                "dob": dob,
                 "expiry_date": (datetime.now() + timedelta(days=1825)).strftime('%Y-%m-%d'),
                 "nationality": "USA"
             },
@@ -95,21 +130,30 @@ def mock_document_intelligence(document_type, file_name):
             "model_info": model_info
         }
 
-    print(f"[AI MOCK]: Processing complete. Status: {data['forensics']['status']}")
+    logger.info("Document processed", extra={
+        "application_id": app_id, "stage": "document", "document_type": document_type,
+        "status": data['forensics']['status'], "duration_ms": round(processing_time * 1000, 1)
+    })
     return data
 
 
-def mock_biometric_verification(app_id, file_name, trigger_fail=False):
+@tracing.traced("ai.biometric_verification")
+def mock_biometric_verification(app_id, file_name, trigger_fail=False, image_bytes=None, model_inputs=None):
     """
     Simulates the "Verification Layer" (CNN Face Match + Liveness).
 
     This function will:
-    1. Add a realistic processing delay.
-    2. Simulate liveness detection (is it a real person?).
-    3. Simulate face matching (does this person match the ID?).
+    1. Preprocess the upload into the face model's input (unless passed as model_inputs).
+    2. Add a realistic processing delay.
+    3. Simulate liveness detection (is it a real person?).
+    4. Simulate face matching (does this person match the ID?).
+    5. Search the face index for the same face on other applications.
     """
 
-    print(f"[AI MOCK]: Processing selfie '{file_name}' for app '{app_id}'...")
+    logger.debug("Processing selfie", extra={"application_id": app_id, "stage": "biometric", "file_name": file_name})
+
+    if model_inputs is None:
+        model_inputs = preprocessing.preprocess(image_bytes, preprocessing.SELFIE_TARGETS, app_id=app_id)
 
     # Simulate AI processing time
     processing_time = random.uniform(1.0, 2.5)
@@ -121,6 +165,8 @@ def mock_biometric_verification(app_id, file_name, trigger_fail=False):
         "liveness_model": "mock-antispoof-v1.8",
         "processing_time_sec": round(processing_time, 2)
     }
+    if model_inputs is not None:
+        model_info["input"] = model_inputs.describe()
 
     # --- Mock AI Logic ---
 
@@ -148,6 +194,19 @@ def mock_biometric_verification(app_id, file_name, trigger_fail=False):
         overall_status = "CLEAR"
         reason = "Biometric verification successful."
 
+    # --- Repeat Applicant / Synthetic Identity Check ---
+    # The embedding model sees the normalized face variant when the upload is an image
+    if model_inputs is not None:
+        face = model_inputs.variants["face"]
+        embedding = face_index.mock_face_embedding(preprocessing.model_input(face, "RGB").tobytes())
+    else:
+        embedding = face_index.mock_face_embedding(image_bytes if image_bytes is not None else file_name)
+    same_faces = face_index.find_same_faces(app_id, embedding)
+
+    # Only accepted selfies are added to the index
+    if overall_status == "CLEAR":
+        face_index.get_index().add(app_id, embedding)
+
     data = {
         "status": overall_status,
         "reason": reason,
@@ -160,15 +219,20 @@ def mock_biometric_verification(app_id, file_name, trigger_fail=False):
             "status": face_match_status,
             "match_score": match_score,
             "id_document_face_ref": f"doc_{app_id}_face.jpg",  # Mock reference
-            "selfie_face_ref": f"selfie_{app_id}_face.jpg"  # Mock reference
+            "selfie_face_ref": f"selfie_{app_id}_face.jpg",  # Mock reference
+            "duplicate_faces": same_faces
         },
         "model_info": model_info
     }
 
-    print(f"[AI MOCK]: Biometric check complete. Status: {overall_status}")
+    logger.info("Biometric check complete", extra={
+        "application_id": app_id, "stage": "biometric", "status": overall_status,
+        "duplicate_faces": len(same_faces), "duration_ms": round(processing_time * 1000, 1)
+    })
     return data
 
 
+@tracing.traced("ai.risk_intelligence")
 def mock_risk_intelligence(application_data):
     """
     Simulates the "Risk Intelligence Layer" (XGBoost) and "Explainability Layer".
@@ -181,85 +245,23 @@ def mock_risk_intelligence(application_data):
     """
 
     app_id = application_data.get('application_id')
-    print(f"[AI MOCK]: Running risk analysis for app '{app_id}'...")
+    logger.debug("Running risk analysis", extra={"application_id": app_id, "stage": "risk"})
 
     # Simulate AI processing time
     processing_time = random.uniform(0.5, 1.5)
     time.sleep(processing_time)
 
     # --- Mock Model Information ---
+    rules = risk_engine.get_rules()
     model_info = {
-        "risk_model": "mock-xgboost-classifier-v1.4",
-        "xai_model": "mock-shap-explainer-v1.1",
+        **RISK_MODEL_NAMES,
+        "rules_version": rules.version,
         "processing_time_sec": round(processing_time, 2)
     }
 
     # --- AI Analysis Logic ---
-    risk_score = 0
-    explanations = []
-
-    # 1. Analyze Document Forensics
-    try:
-        id_forensics = application_data['documents']['id_document']['forensics']
-        if id_forensics['status'] != 'CLEAR':
-            risk_score += 70
-            explanations.append(f"ID Document flagged for: {id_forensics['status']}.")
-
-        addr_forensics = application_data['documents']['address_proof']['forensics']
-        if addr_forensics['status'] != 'CLEAR':
-            risk_score += 40
-            explanations.append(f"Address Document flagged for: {addr_forensics['status']}.")
-
-    except Exception:
-        # This shouldn't happen if the workflow is correct, but it's a good safeguard
-        risk_score += 90
-        explanations.append("Critical error: Missing document forensics data.")
-
-    # 2. Analyze Biometric Verification
-    try:
-        selfie_analysis = application_data['selfie']['ai_analysis']
-        if selfie_analysis['status'] != 'CLEAR':
-            risk_score += 90
-            explanations.append(f"Biometric verification failed: {selfie_analysis['reason']}.")
-
-        match_score = selfie_analysis.get('face_match', {}).get('match_score', 0)
-        if match_score < 0.9:  # Lower than our 'good' threshold
-            risk_score += (1 - match_score) * 50  # Add points based on mismatch
-            explanations.append(f"Low biometric match score ({match_score}).")
-
-    except Exception:
-        risk_score += 90
-        explanations.append("Critical error: Missing biometric data.")
-
-    # 3. Analyze Extracted Data (Cross-referencing)
-    try:
-        extracted = application_data.get('extracted_data', {})
-        id_name = f"{extracted.get('first_name', '')} {extracted.get('last_name', '')}".strip()
-        addr_name = extracted.get('name', '')
-
-        if id_name and addr_name and id_name.lower() != addr_name.lower():
-            risk_score += 25
-            explanations.append(f"Name mismatch: ID says '{id_name}', Address proof says '{addr_name}'.")
-
-    except Exception:
-        explanations.append("Could not perform data cross-reference.")
-
-    # 4. Final Risk Calculation & Decision
-    # Add some base "good" factors
-    if not explanations:
-        risk_score = random.randint(5, 15)  # Base score for a clean application
-        explanations.append("All automated checks passed.")
-        explanations.append("Data consistent across documents.")
-        explanations.append("Biometric match score is high.")
-
-    risk_score = min(max(int(risk_score), 0), 100)  # Clamp score between 0 and 100
-
-    final_decision = "MANUAL_REVIEW"  # Default
-    if risk_score < 20:
-        final_decision = "APPROVED"
-    elif risk_score >= 70:
-        final_decision = "REJECTED"
-    # Anything between 20 and 69 remains MANUAL_REVIEW
+    # Features, weights and decision bands come from the compiled risk rules file
+    risk_score, final_decision, explanations = risk_engine.evaluate(application_data, rules=rules)
 
     # Build the final result object
     result = {
@@ -270,5 +272,8 @@ def mock_risk_intelligence(application_data):
         "analyzed_at": datetime.utcnow().isoformat() + "Z"
     }
 
-    print(f"[AI MOCK]: Risk analysis complete. Decision: {final_decision} (Score: {risk_score})")
+    logger.info("Risk analysis complete", extra={
+        "application_id": app_id, "stage": "risk", "decision": final_decision, "risk_score": risk_score,
+        "rules_version": model_info["rules_version"], "duration_ms": round(processing_time * 1000, 1)
+    })
     return result
\ No newline at end of file
@@ -1,6 +1,16 @@
+import os
+
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Expire abandoned applications in the background (api/expiry.py).
+        # Started on the first request so management commands don't sweep.
+        if os.environ.get('SMARTKYC_EXPIRY_SWEEPER', '1') == '1':
+            from . import expiry
+            request_started.connect(expiry.start_sweeper, dispatch_uid='smartkyc-expiry-sweeper')
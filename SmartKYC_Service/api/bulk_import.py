@@ -0,0 +1,169 @@
+# api/bulk_import.py
+
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from . import data_manager
+from . import store_formats
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Top-level fields every stored application has, and their allowed types
+REQUIRED_FIELDS = {
+    "application_id": (str,),
+    "status": (str,),
+    "created_at": (str,),
+    "updated_at": (str,),
+    "explanations": (list,),
+    "documents": (dict,),
+}
+OPTIONAL_FIELDS = {
+    "risk_score": (int, float, type(None)),
+    "selfie": (dict, type(None)),
+    "extracted_data": (dict, type(None)),
+    "risk_analysis": (dict, type(None)),
+}
+DOCUMENT_KEYS = ("id_document", "address_proof")
+
+logger = logging.getLogger(__name__)
+
+
+# --- Validation ---
+
+def _valid_timestamp(value):
+    try:
+        datetime.fromisoformat(value.rstrip('Z'))
+        return True
+    except (ValueError, AttributeError):
+        return False
+
+
+def validate_application(app):
+    """Checks one record against the application schema. Returns a list of problems (empty if valid)."""
+    if not isinstance(app, dict):
+        return ["record is not an object"]
+
+    errors = []
+    for field, types in REQUIRED_FIELDS.items():
+        if field not in app:
+            errors.append(f"missing '{field}'")
+        elif not isinstance(app[field], types):
+            errors.append(f"'{field}' has type {type(app[field]).__name__}")
+    for field, types in OPTIONAL_FIELDS.items():
+        if field in app and not isinstance(app[field], types):
+            errors.append(f"'{field}' has type {type(app[field]).__name__}")
+    if errors:
+        return errors
+
+    try:
+        uuid.UUID(app['application_id'])
+    except ValueError:
+        errors.append("'application_id' is not a UUID")
+    if not data_manager.is_known_status(app['status']):
+        errors.append(f"unknown status '{app['status']}'")
+    for field in ("created_at", "updated_at"):
+        if not _valid_timestamp(app[field]):
+            errors.append(f"'{field}' is not an ISO 8601 timestamp")
+
+    for key in DOCUMENT_KEYS:
+        entry = app['documents'].get(key)
+        if entry is not None and (not isinstance(entry, dict) or 'status' not in entry):
+            errors.append(f"documents.{key} must be null or an object with a status")
+    selfie = app.get('selfie')
+    if selfie is not None and 'status' not in selfie:
+        errors.append("selfie must have a status")
+
+    return errors
+
+
+# --- Sources ---
+
+def iter_source(path):
+    """
+    Yields records from an import file.
+
+    *.jsonl / *.ndjson files are streamed line by line. Anything else is
+    read as an application store (e.g. applications.json, or .msgpack /
+    .cbor / .snap), and may be either the {app_id: app} dict or a list.
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_number}: invalid JSON ({e.msg})")
+        return
+
+    extension = os.path.splitext(path)[1].lstrip('.')
+    store_format = next(
+        (fmt for fmt in store_formats.FORMATS.values() if fmt.extension == extension),
+        store_formats.get_format("json")
+    )
+    with open(path, 'rb') as f:
+        data = store_format.decode(f.read())
+    yield from (data.values() if isinstance(data, dict) else data)
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Core Import Function ---
+
+def import_applications(records, chunk_size=DEFAULT_CHUNK_SIZE, overwrite=True, dry_run=False, log=None):
+    """
+    Validates and loads records into the store, one commit per chunk.
+
+    Invalid records are skipped and reported. Each chunk is written with
+    data_manager.bulk_upsert, so loading N records costs N / chunk_size
+    store writes rather than N.
+
+    Progress goes to log (e.g. a management command's stdout.write), or to
+    the module logger.
+
+    Returns a summary dict.
+    """
+    log = log or _log
+    summary = {"read": 0, "invalid": 0, "inserted": 0, "updated": 0, "skipped": 0, "errors": []}
+
+    for chunk in _chunks(records, chunk_size):
+        valid = []
+        for record in chunk:
+            summary['read'] += 1
+            problems = validate_application(record)
+            if problems:
+                summary['invalid'] += 1
+                # Keep the report bounded on a bad file
+                if len(summary['errors']) < 100:
+                    app_id = record.get('application_id') if isinstance(record, dict) else None
+                    summary['errors'].append({"record": summary['read'], "application_id": app_id,
+                                              "problems": problems})
+                continue
+            valid.append(record)
+
+        if valid and not dry_run:
+            inserted, updated, skipped = data_manager.bulk_upsert(valid, overwrite=overwrite)
+            summary['inserted'] += inserted
+            summary['updated'] += updated
+            summary['skipped'] += skipped
+
+        log(f"Processed {summary['read']} record(s): {summary['invalid']} invalid so far.")
+
+    return summary
+
+
+def _log(message):
+    logger.info(message, extra={"stage": "import"})
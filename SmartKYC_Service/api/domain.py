@@ -0,0 +1,48 @@
+# api/domain.py
+
+from enum import Enum
+
+# The application and document statuses and the document types used by
+# the workflow (data_manager, views). Records stay plain JSON dicts,
+# updated copy-on-write (api/records.py); members compare equal to, and
+# format as, the strings stored in them.
+
+
+class _InternedEnum(str, Enum):
+    """A str-valued enum whose members format and compare as their value."""
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+class Status(_InternedEnum):
+    PENDING_DOCUMENTS = "PENDING_DOCUMENTS"
+    PENDING_ID_DOCUMENT = "PENDING_ID_DOCUMENT"
+    PENDING_ADDRESS_PROOF = "PENDING_ADDRESS_PROOF"
+    PENDING_SELFIE = "PENDING_SELFIE"
+    PENDING_RISK_ANALYSIS = "PENDING_RISK_ANALYSIS"
+    APPROVED = "APPROVED"
+    MANUAL_REVIEW = "MANUAL_REVIEW"
+    REJECTED = "REJECTED"
+    EXPIRED = "EXPIRED"
+    REJECTED_ID_DOCUMENT = "REJECTED_ID_DOCUMENT"
+    REJECTED_ADDRESS_PROOF = "REJECTED_ADDRESS_PROOF"
+    REJECTED_REJECTED_MISMATCH = "REJECTED_REJECTED_MISMATCH"
+    REJECTED_REJECTED_LIVENESS = "REJECTED_REJECTED_LIVENESS"
+    # Document and selfie entry statuses
+    PROCESSED = "PROCESSED"
+    CLEAR = "CLEAR"
+    REJECTED_MISMATCH = "REJECTED_MISMATCH"
+    REJECTED_LIVENESS = "REJECTED_LIVENESS"
+
+
+class DocumentType(_InternedEnum):
+    PASSPORT = "PASSPORT"
+    DRIVER_LICENSE = "DRIVER_LICENSE"
+    TAMPERED_EXAMPLE = "TAMPERED_EXAMPLE"
+    UTILITY_BILL = "UTILITY_BILL"
+
+    @property
+    def storage_key(self):
+        """The application slot this document fills: 'id_document' or 'address_proof'."""
+        return "address_proof" if self is DocumentType.UTILITY_BILL else "id_document"
@@ -0,0 +1,218 @@
+# api/expiry.py
+
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from . import tracing
+
+# How long an application may sit in each non-terminal state (hours).
+# States not listed (e.g. MANUAL_REVIEW, which waits on a human) never expire.
+DEFAULT_TTL_HOURS = {
+    "PENDING_DOCUMENTS": 24,
+    "PENDING_ID_DOCUMENT": 72,
+    "PENDING_ADDRESS_PROOF": 72,
+    "PENDING_SELFIE": 72,
+    "PENDING_RISK_ANALYSIS": 24,
+}
+
+# The background sweeper wakes at the next deadline, and at least this often
+SWEEP_INTERVAL_SEC = float(os.environ.get('SMARTKYC_EXPIRY_SWEEP_SEC', '60'))
+# At most this many applications are expired per commit
+SWEEP_BATCH_SIZE = int(os.environ.get('SMARTKYC_EXPIRY_BATCH_SIZE', '1000'))
+
+logger = logging.getLogger(__name__)
+
+
+def _load_ttls():
+    """
+    DEFAULT_TTL_HOURS, overridden by SMARTKYC_EXPIRY_TTL_HOURS, e.g.
+    "PENDING_DOCUMENTS=2,PENDING_SELFIE=48". A TTL of 0 disables expiry for that state.
+    """
+    ttls = dict(DEFAULT_TTL_HOURS)
+    for item in os.environ.get('SMARTKYC_EXPIRY_TTL_HOURS', '').split(','):
+        if '=' in item:
+            state, hours = item.split('=', 1)
+            ttls[state.strip()] = float(hours)
+    return {state: hours * 3600 for state, hours in ttls.items() if hours > 0}
+
+
+TTL_SEC = _load_ttls()
+
+
+# --- Time-ordered Index ---
+#
+# A min-heap of (deadline, app_id, updated_at), plus the latest known
+# (status, updated_at, deadline) of every expirable application. A
+# transition pushes a new heap entry and leaves the old one in place;
+# popped entries that no longer match the latest version are skipped.
+# A sweep therefore only pops due entries and never scans the store.
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+# 'pending' buffers changes committed while the initial scan is running
+_state = {"built": False, "pending": None, "heap": [], "tracked": {}}
+_wakeup = threading.Event()
+
+
+def _deadline(app):
+    ttl = TTL_SEC.get(app.get('status'))
+    if ttl is None:
+        return None
+    try:
+        updated_at = datetime.fromisoformat(str(app.get('updated_at')).rstrip('Z'))
+    except ValueError:
+        return None
+    return updated_at.replace(tzinfo=timezone.utc).timestamp() + ttl
+
+
+def _track_locked(app_id, app):
+    deadline = _deadline(app) if app else None
+    if deadline is None:
+        _state['tracked'].pop(app_id, None)
+        return
+    _state['tracked'][app_id] = (app['status'], app['updated_at'], deadline)
+    heap = _state['heap']
+    if not heap or deadline < heap[0][0]:
+        # New earliest deadline: let the sweeper re-arm its timer
+        _wakeup.set()
+    heapq.heappush(heap, (deadline, app_id, app['updated_at']))
+
+
+def track_changes(changes):
+    """Indexes committed changes, as (app_id, app) pairs (app=None for removals). Called by data_manager."""
+    with _lock:
+        if _state['built']:
+            for app_id, app in changes:
+                _track_locked(app_id, app)
+        elif _state['pending'] is not None:
+            _state['pending'].extend(changes)
+        # Otherwise the index is not built yet; the first build scans the store
+
+
+def _ensure_built():
+    """Builds the index from one scan of the store, the first time it is needed."""
+    if _state['built']:
+        return
+    from . import data_manager
+    with _build_lock:
+        if _state['built']:
+            return
+        with _lock:
+            _state['pending'] = []
+        # Only the fields the index needs are kept from the scan
+        expirable = [
+            (app['application_id'], {"status": app['status'], "updated_at": app.get('updated_at')})
+            for app in data_manager.iter_applications() if app.get('status') in TTL_SEC
+        ]
+        with _lock:
+            _state['heap'] = []
+            _state['tracked'] = {}
+            for app_id, app in expirable:
+                _track_locked(app_id, app)
+            # Changes committed during the scan are newer than what it saw
+            for app_id, app in _state['pending']:
+                _track_locked(app_id, app)
+            _state['pending'] = None
+            _state['built'] = True
+
+
+def next_deadline():
+    """Epoch seconds of the earliest pending deadline, or None."""
+    _ensure_built()
+    with _lock:
+        heap, tracked = _state['heap'], _state['tracked']
+        # Drop stale heads so the timer is armed for a real deadline
+        while heap and tracked.get(heap[0][1], (None, None, None))[1] != heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+
+def _pop_due(now, limit):
+    due = []
+    with _lock:
+        heap, tracked = _state['heap'], _state['tracked']
+        while heap and heap[0][0] <= now and len(due) < limit:
+            deadline, app_id, updated_at = heapq.heappop(heap)
+            current = tracked.get(app_id)
+            if current is None or current[1] != updated_at:
+                continue
+            status = current[0]
+            del tracked[app_id]
+            hours = TTL_SEC[status] / 3600
+            due.append((app_id, status, updated_at,
+                        f"Application expired after {hours:g} hours in {status}."))
+    return due
+
+
+# --- Core Sweep Function ---
+
+def sweep(now=None, limit=SWEEP_BATCH_SIZE, dry_run=False):
+    """
+    Expires every application whose deadline has passed, in commits of at
+    most `limit`. Returns the ids expired (or, with dry_run, due).
+    """
+    from . import data_manager
+
+    _ensure_built()
+    now = time.time() if now is None else now
+    expired = []
+    if dry_run:
+        due = _pop_due(now, float('inf'))
+        # Put them back; nothing was written
+        with _lock:
+            for app_id, status, updated_at, _ in due:
+                _track_locked(app_id, {"status": status, "updated_at": updated_at})
+        return [app_id for app_id, *_ in due]
+
+    while True:
+        due = _pop_due(now, limit)
+        if not due:
+            return expired
+        expired.extend(data_manager.expire_applications(due))
+
+
+def _run_sweeper():
+    while True:
+        try:
+            start = time.perf_counter()
+            with tracing.span("expiry.sweep"):
+                expired = sweep()
+            if expired:
+                logger.info("Expired applications", extra={
+                    "stage": "expiry", "count": len(expired),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+                })
+            deadline = next_deadline()
+        except Exception:
+            logger.exception("Expiry sweep failed", extra={"stage": "expiry"})
+            deadline = None
+
+        timeout = SWEEP_INTERVAL_SEC
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.time(), 0.0))
+        _wakeup.wait(timeout)
+        _wakeup.clear()
+
+
+_sweeper = {"thread": None}
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper(**kwargs):
+    """
+    Starts the background sweeper thread once per process. Connected to
+    request_started (see api/apps.py), so only serving processes sweep;
+    signal arguments are ignored.
+    """
+    if _sweeper['thread'] is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper['thread'] is not None:
+            return
+        thread = threading.Thread(target=_run_sweeper, name="smartkyc-expiry", daemon=True)
+        _sweeper['thread'] = thread
+        thread.start()
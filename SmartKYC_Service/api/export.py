@@ -0,0 +1,142 @@
+# api/export.py
+
+import csv
+import hmac
+import io
+import os
+from datetime import datetime, timezone
+
+from . import data_manager
+from .store_formats import CompactJSONFormat
+
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Flat columns for the CSV report. Explanations are joined into one cell.
+CSV_COLUMNS = [
+    "application_id", "status", "created_at", "updated_at",
+    "decision", "risk_score", "explanations", "rules_version", "analyzed_at"
+]
+
+# Leading characters that make a spreadsheet evaluate a cell (CSV injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Records are buffered into chunks of about this size before being emitted
+CHUNK_SIZE = 64 * 1024
+
+# The export contains every applicant's personal data. The HTTP endpoint
+# answers 404 unless this token is set and sent in EXPORT_HEADER; the
+# export_applications management command needs no token.
+EXPORT_TOKEN = os.environ.get('SMARTKYC_EXPORT_TOKEN', '')
+EXPORT_HEADER = 'X-SmartKYC-Export-Token'
+
+_json = CompactJSONFormat()
+
+
+# --- Helper Functions ---
+
+def is_authorized(request):
+    """True if the request carries the export token (header only, so it never lands in access logs)."""
+    if not EXPORT_TOKEN:
+        return False
+    supplied = request.headers.get(EXPORT_HEADER) or ''
+    return hmac.compare_digest(supplied.encode('utf-8'), EXPORT_TOKEN.encode('utf-8'))
+
+
+def parse_since(value):
+    """
+    Parses the 'since' filter (an ISO 8601 date or timestamp) into a naive
+    UTC datetime. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _updated_at(app):
+    try:
+        return datetime.fromisoformat(str(app.get('updated_at') or app.get('created_at')).rstrip('Z'))
+    except ValueError:
+        return None
+
+
+def iter_matching(statuses=None, since=None):
+    """Yields stored applications filtered by status and last update time."""
+    for app in data_manager.iter_applications():
+        if statuses and app.get('status') not in statuses:
+            continue
+        if since is not None:
+            updated_at = _updated_at(app)
+            if updated_at is None or updated_at < since:
+                continue
+        yield app
+
+
+def csv_cell(value):
+    """
+    Prefixes text that a spreadsheet would read as a formula with a quote,
+    so applicant-supplied data cannot inject one into the report.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_row(app):
+    analysis = app.get('risk_analysis') or {}
+    return [csv_cell(value) for value in [
+        app.get('application_id'),
+        app.get('status'),
+        app.get('created_at'),
+        app.get('updated_at'),
+        analysis.get('decision', ''),
+        app.get('risk_score') if app.get('risk_score') is not None else '',
+        " | ".join(app.get('explanations') or []),
+        (analysis.get('model_info') or {}).get('rules_version', ''),
+        analysis.get('analyzed_at', ''),
+    ]]
+
+
+# --- Core Export Function ---
+
+def iter_export(export_format="jsonl", statuses=None, since=None):
+    """
+    Yields the export as byte chunks.
+
+    Records are read from the store and encoded one at a time, and
+    flushed every CHUNK_SIZE bytes, so the first bytes are emitted right
+    away and memory use does not grow with the number of applications
+    (see data_manager.iter_applications; only 'cbor' is decoded whole).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'. Available: {', '.join(EXPORT_FORMATS)}")
+
+    if export_format == "jsonl":
+        chunk, size = [], 0
+        for app in iter_matching(statuses, since):
+            line = _json.dumps(app) + b'\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b''.join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b''.join(chunk)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for app in iter_matching(statuses, since):
+        writer.writerow(csv_row(app))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
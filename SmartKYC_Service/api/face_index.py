@@ -0,0 +1,463 @@
+# api/face_index.py
+
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from . import file_lock, tracing
+
+# Define the path to our vector index (kept next to applications.json)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+FACE_INDEX_DIR = os.path.join(DATA_DIR, 'face_index')
+
+EMBEDDING_DIM = 128
+
+# Cosine similarity above which two selfies are treated as the same face
+SAME_FACE_THRESHOLD = 0.92
+
+# Switch from exact to approximate (LSH) search once the index is this large
+APPROX_THRESHOLD = 1_000_000
+
+# Random-projection LSH parameters for the approximate mode
+LSH_TABLES = 8
+LSH_BITS = 16
+
+_INITIAL_CAPACITY = 1024
+_SEARCH_BLOCK_ROWS = 65536
+
+# ids.bin: a header, then one fixed-width, zero-padded UTF-8 id per row
+# (all zeros for a removed row)
+ID_BYTES = 64
+_MAGIC = b'FIDX'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sIQQQ')  # magic, format version, generation, row count, removed rows
+
+# Removed rows are compacted away once there are this many and they are this share of the index
+COMPACT_MIN_ROWS = 1024
+COMPACT_RATIO = 0.25
+
+
+# --- Mock Embedding Model ---
+
+def mock_face_embedding(image_bytes):
+    """
+    Simulates a face embedding model (e.g. FaceNet).
+
+    The embedding is derived deterministically from the image bytes, so
+    uploading the same image twice always yields the same unit vector.
+    """
+    if isinstance(image_bytes, str):
+        image_bytes = image_bytes.encode('utf-8')
+
+    seed = int.from_bytes(hashlib.sha256(image_bytes or b'').digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# --- Vector Index ---
+
+class FaceIndex:
+    """
+    An append-only, memory-mapped index of L2-normalized face embeddings.
+
+    Vectors live in '<path>/vectors.f32' (a float32 memmap that grows by
+    doubling). The row -> application_id mapping lives in '<path>/ids.bin':
+    a header (generation, row count, removed count) followed by one
+    fixed-width record per row, so an append writes only its own records
+    and the new count, and other processes read only the new tail (and add
+    only those rows to their LSH tables). Appends and removals from every
+    worker process are serialized by a flock on '<path>/index.lock'.
+
+    Removed rows get an empty id and a zero vector; once they make up
+    COMPACT_RATIO of the index both files are rewritten without them under
+    a new generation, which makes other processes reopen the index.
+    Search is exact (blocked matrix products) until the index reaches
+    `approx_threshold` vectors, after which a random-projection LSH is used.
+    """
+
+    def __init__(self, path=FACE_INDEX_DIR, dim=EMBEDDING_DIM, approx_threshold=APPROX_THRESHOLD):
+        self.path = path
+        self.dim = dim
+        self.approx_threshold = approx_threshold
+        self.vectors_file = os.path.join(path, 'vectors.f32')
+        self.ids_file = os.path.join(path, 'ids.bin')
+        self.lock_file = os.path.join(path, 'index.lock')
+
+        self._lock = threading.Lock()
+        self._ids = []
+        self._capacity = 0
+        self._vectors = None
+        self._generation = None
+        self._removed = 0
+        self._lsh = None
+
+        os.makedirs(path, exist_ok=True)
+        with file_lock.locked(self.lock_file):
+            self._import_ids_json()
+            self._open()
+
+    # --- Storage Helpers ---
+
+    def _read_header(self):
+        """(generation, count, removed) from ids.bin; zeros if it does not exist yet."""
+        try:
+            with open(self.ids_file, 'rb') as f:
+                raw = f.read(_HEADER.size)
+        except FileNotFoundError:
+            return 0, 0, 0
+        if len(raw) < _HEADER.size:
+            return 0, 0, 0
+        magic, _, generation, count, removed = _HEADER.unpack(raw)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.ids_file} is not a face index id file")
+        return generation, count, removed
+
+    def _write_header(self, f, generation, count, removed):
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, generation, count, removed))
+        f.flush()
+
+    def _read_ids(self, start, end):
+        if end <= start:
+            return []
+        with open(self.ids_file, 'rb') as f:
+            f.seek(_HEADER.size + start * ID_BYTES)
+            raw = f.read((end - start) * ID_BYTES)
+        return [_decode_id(raw[offset:offset + ID_BYTES]) for offset in range(0, len(raw), ID_BYTES)]
+
+    def _map_vectors(self, min_rows):
+        """(Re)maps vectors.f32, growing the file to hold at least min_rows."""
+        try:
+            capacity = os.path.getsize(self.vectors_file) // (self.dim * 4)
+        except OSError:
+            capacity = 0
+        capacity = max(capacity, _INITIAL_CAPACITY)
+        while capacity < min_rows:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        self._resize_file(capacity)
+        self._capacity = capacity
+        self._vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def _open(self):
+        """(Re)opens the memmap and ids from disk (called with the file lock held)."""
+        generation, count, removed = self._read_header()
+        self._ids = self._read_ids(0, count)
+        self._generation, self._removed = generation, removed
+        self._map_vectors(count)
+        self._lsh = None
+
+    def _resize_file(self, capacity):
+        size = capacity * self.dim * 4
+        with open(self.vectors_file, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+    def _import_ids_json(self):
+        """Converts the ids.json of earlier versions to ids.bin, once."""
+        legacy_file = os.path.join(self.path, 'ids.json')
+        if not os.path.exists(legacy_file) or os.path.exists(self.ids_file):
+            return
+        with open(legacy_file, 'r') as f:
+            ids = json.load(f)['ids']
+        self._write_ids_file(self.ids_file, 0, ids)
+        os.remove(legacy_file)
+
+    def _write_ids_file(self, path, generation, ids):
+        tmp_file = file_lock.tmp_path(path)
+        with open(tmp_file, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, generation, len(ids),
+                                 sum(1 for app_id in ids if app_id is None)))
+            f.write(b''.join(_encode_id(app_id) for app_id in ids))
+        os.replace(tmp_file, path)
+
+    def _refresh(self, locked=False):
+        """
+        Picks up rows appended or removed by other processes: only the new
+        tail is read (and added to the LSH tables); a removal re-reads the
+        ids; a compaction reopens everything. locked: the caller holds the
+        file lock.
+        """
+        generation, count, removed = self._read_header()
+        if generation != self._generation:
+            if locked:
+                self._open()
+            else:
+                with file_lock.locked(self.lock_file):
+                    self._open()
+            return
+        if removed != self._removed:
+            self._ids = self._read_ids(0, count)
+            self._removed = removed
+        known = len(self._ids)
+        if count > known:
+            self._ids.extend(self._read_ids(known, count))
+            if count > self._capacity:
+                self._map_vectors(count)
+            if self._lsh is not None:
+                self._lsh.add(np.arange(known, count), self._vectors[known:count])
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- Core Index Functions ---
+
+    def add(self, app_id, embedding):
+        """Appends one embedding for an application."""
+        self.add_batch([app_id], np.asarray(embedding, dtype=np.float32)[None, :])
+
+    def add_batch(self, app_ids, embeddings):
+        """Appends a batch of embeddings (shape: [n, dim]) in one write."""
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        records = b''.join(_encode_id(app_id) for app_id in app_ids)
+
+        # The next free row is only known under the file lock: another
+        # worker may have appended since this one last read the header.
+        with self._lock, file_lock.locked(self.lock_file):
+            self._refresh(locked=True)
+            start = len(self._ids)
+            end = start + len(app_ids)
+            if end > self._capacity:
+                self._map_vectors(end)
+
+            self._vectors[start:end] = embeddings
+            self._vectors.flush()
+            # Records first, then the count that makes them visible
+            with open(self.ids_file, 'r+b' if os.path.exists(self.ids_file) else 'w+b') as f:
+                f.seek(_HEADER.size + start * ID_BYTES)
+                f.write(records)
+                self._write_header(f, self._generation, end, self._removed)
+            self._ids.extend(app_ids)
+
+            if self._lsh is not None:
+                self._lsh.add(np.arange(start, end), embeddings)
+
+    def remove(self, app_ids):
+        """Drops every embedding of the given applications. Returns the number of rows cleared."""
+        app_ids = set(app_ids)
+        with self._lock, file_lock.locked(self.lock_file):
+            self._refresh(locked=True)
+            rows = [row for row, app_id in enumerate(self._ids) if app_id in app_ids]
+            if not rows:
+                return 0
+            self._vectors[rows] = 0.0
+            self._vectors.flush()
+            with open(self.ids_file, 'r+b') as f:
+                for row in rows:
+                    f.seek(_HEADER.size + row * ID_BYTES)
+                    f.write(_encode_id(None))
+                    self._ids[row] = None
+                self._removed += len(rows)
+                self._write_header(f, self._generation, len(self._ids), self._removed)
+
+            if self._removed >= COMPACT_MIN_ROWS and self._removed >= COMPACT_RATIO * len(self._ids):
+                self._compact()
+            return len(rows)
+
+    def _compact(self):
+        """Rewrites both files without the removed rows, under a new generation (file lock held)."""
+        keep = [row for row, app_id in enumerate(self._ids) if app_id is not None]
+        capacity = _INITIAL_CAPACITY
+        while capacity < len(keep):
+            capacity *= 2
+        tmp_file = file_lock.tmp_path(self.vectors_file)
+        compacted = np.memmap(tmp_file, dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+        for offset in range(0, len(keep), _SEARCH_BLOCK_ROWS):
+            block = keep[offset:offset + _SEARCH_BLOCK_ROWS]
+            compacted[offset:offset + len(block)] = self._vectors[block]
+        compacted.flush()
+        del compacted
+
+        self._vectors = None
+        os.replace(tmp_file, self.vectors_file)
+        self._write_ids_file(self.ids_file, self._generation + 1, [self._ids[row] for row in keep])
+        self._open()
+
+    def search(self, queries, k=5, exact=None):
+        """
+        Batched top-k cosine search.
+
+        queries: array of shape [n, dim] (or a single [dim] vector).
+        exact:   force exact (True) or approximate (False) search; by default
+                 approximate search is used once the index passes approx_threshold.
+
+        Returns one list per query of (application_id, similarity) tuples,
+        best match first.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+
+        with self._lock:
+            self._refresh()
+            count = len(self._ids)
+            if count == 0:
+                return [[] for _ in range(len(queries))]
+
+            if exact is None:
+                exact = count < self.approx_threshold
+
+            if exact:
+                rows, scores = self._exact_search(queries, k, count)
+            else:
+                rows, scores = self._approx_search(queries, k, count)
+
+            return [
+                [(self._ids[row], float(score)) for row, score in zip(row_list, score_list)
+                 if row >= 0 and self._ids[row] is not None]
+                for row_list, score_list in zip(rows, scores)
+            ]
+
+    def _exact_search(self, queries, k, count):
+        """Blocked brute-force search over the memmap."""
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for start in range(0, count, _SEARCH_BLOCK_ROWS):
+            end = min(start + _SEARCH_BLOCK_ROWS, count)
+            block_scores = queries @ self._vectors[start:end].T
+            block_rows = np.broadcast_to(np.arange(start, end), block_scores.shape)
+
+            all_scores = np.concatenate([best_scores, block_scores], axis=1)
+            all_rows = np.concatenate([best_rows, block_rows], axis=1)
+            best_rows, best_scores = _top_k(all_rows, all_scores, k)
+
+        return best_rows, best_scores
+
+    def _approx_search(self, queries, k, count):
+        """Multi-table random-projection LSH, re-ranked exactly."""
+        if self._lsh is None:
+            self._lsh = _LSHTables(self.dim)
+            for start in range(0, count, _SEARCH_BLOCK_ROWS):
+                end = min(start + _SEARCH_BLOCK_ROWS, count)
+                self._lsh.add(np.arange(start, end), self._vectors[start:end])
+
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for i, candidates in enumerate(self._lsh.candidates(queries)):
+            if len(candidates) == 0:
+                continue
+            scores = self._vectors[candidates] @ queries[i]
+            rows, top = _top_k(candidates[None, :], scores[None, :], k)
+            best_rows[i, :rows.shape[1]] = rows[0]
+            best_scores[i, :top.shape[1]] = top[0]
+
+        return best_rows, best_scores
+
+
+class _LSHTables:
+    """
+    Random-hyperplane LSH with single-bit multi-probe.
+
+    Each table keeps its bucket codes in a flat array; lookups binary-search
+    a sorted copy that is rebuilt lazily after appends.
+    """
+
+    def __init__(self, dim, tables=LSH_TABLES, bits=LSH_BITS, seed=0):
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, bits, dim)).astype(np.float32)
+        self.weights = (1 << np.arange(bits)).astype(np.int64)
+        self.flips = np.array([0] + [1 << b for b in range(bits)], dtype=np.int64)
+        self.codes = np.empty((tables, 0), dtype=np.int64)
+        self.rows = np.empty(0, dtype=np.int64)
+        self._sorted = None
+
+    def _codes(self, vectors):
+        # [tables, n] integer bucket codes
+        tables, bits, dim = self.planes.shape
+        projections = vectors @ self.planes.reshape(tables * bits, dim).T
+        signs = (projections > 0).reshape(len(vectors), tables, bits).astype(np.int64)
+        return (signs @ self.weights).T
+
+    def add(self, rows, vectors):
+        self.codes = np.concatenate([self.codes, self._codes(np.asarray(vectors, dtype=np.float32))], axis=1)
+        self.rows = np.concatenate([self.rows, rows])
+        self._sorted = None
+
+    def candidates(self, queries):
+        if self._sorted is None:
+            order = np.argsort(self.codes, axis=1, kind='stable')
+            self._sorted = (order, np.take_along_axis(self.codes, order, axis=1))
+        order, sorted_codes = self._sorted
+
+        # [tables, n, probes] codes to look up
+        probes = self._codes(queries)[:, :, None] ^ self.flips
+        for i in range(len(queries)):
+            found = []
+            for table in range(len(sorted_codes)):
+                lo = np.searchsorted(sorted_codes[table], probes[table, i], side='left')
+                hi = np.searchsorted(sorted_codes[table], probes[table, i], side='right')
+                found.extend(order[table, a:b] for a, b in zip(lo, hi) if b > a)
+            if found:
+                yield np.unique(self.rows[np.concatenate(found)])
+            else:
+                yield np.empty(0, dtype=np.int64)
+
+
+def _encode_id(app_id):
+    if app_id is None:
+        return bytes(ID_BYTES)
+    raw = str(app_id).encode('utf-8')
+    if not raw or len(raw) > ID_BYTES or b'\0' in raw:
+        raise ValueError(f"Application id {app_id!r} cannot be stored in the face index")
+    return raw.ljust(ID_BYTES, b'\0')
+
+
+def _decode_id(raw):
+    raw = raw.rstrip(b'\0')
+    return raw.decode('utf-8') if raw else None
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(rows, scores, k):
+    """Selects the k best (rows, scores) per query, sorted best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    top = np.take_along_axis(part, order, axis=1)
+    return np.take_along_axis(rows, top, axis=1), np.take_along_axis(scores, top, axis=1)
+
+
+# --- Module-level Index ---
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide face index, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FaceIndex()
+        return _index
+
+
+@tracing.traced("face_index.find_same_faces")
+def find_same_faces(app_id, embedding, k=5, threshold=SAME_FACE_THRESHOLD):
+    """
+    Returns other applications whose accepted selfie matches this embedding,
+    as a list of {'application_id', 'similarity'} dicts.
+    """
+    matches = get_index().search(embedding, k=k + 1)[0]
+    return [
+        {"application_id": other, "similarity": round(score, 4)}
+        for other, score in matches
+        if other != app_id and score >= threshold
+    ][:k]
+
+
+def remove_applications(app_ids):
+    """Removes the selfies of deleted applications from the index (see api/retention.py)."""
+    return get_index().remove(app_ids)
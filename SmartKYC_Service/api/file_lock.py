@@ -0,0 +1,35 @@
+# api/file_lock.py
+
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl  # POSIX only; used to serialize writers across worker processes
+except ImportError:
+    fcntl = None
+
+
+@contextlib.contextmanager
+def locked(lock_file):
+    """
+    Holds an exclusive flock on lock_file (created if missing) for the
+    duration of the block, as GroupCommitter does for the store. Without
+    fcntl only the calling process is serialized, by the caller's own
+    threading lock.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    with open(lock_file, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def tmp_path(path):
+    """A temp file name next to path that no other process or thread uses."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
@@ -0,0 +1,185 @@
+# api/group_commit.py
+
+import contextlib
+import threading
+import time
+from collections.abc import MutableMapping
+
+from . import tracing
+from .file_lock import locked
+
+
+class _Pending:
+    """A mutation waiting for its batch to be committed."""
+
+    __slots__ = ('mutation', 'done', 'result', 'error', 'trace_id')
+
+    def __init__(self, mutation):
+        self.mutation = mutation
+        self.done = False
+        self.result = None
+        self.error = None
+        # The submitting request's trace, linked from the commit span
+        self.trace_id = tracing.current_trace_id()
+
+
+_MISSING = object()
+
+
+class _Journal(MutableMapping):
+    """
+    The applications dict as one mutation sees it. Every key the mutation
+    sets or removes is recorded with its previous value, so rollback()
+    undoes a mutation that raises halfway without copying the store.
+    Records themselves are never changed in place (see api/records.py), so
+    the top-level keys are all there is to undo.
+    """
+
+    __slots__ = ('data', 'undo')
+
+    def __init__(self, data):
+        self.data = data
+        self.undo = {}
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        if key not in self.undo:
+            self.undo[key] = self.data.get(key, _MISSING)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        previous = self.data.pop(key)
+        self.undo.setdefault(key, previous)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def rollback(self):
+        for key, previous in self.undo.items():
+            if previous is _MISSING:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = previous
+        self.undo.clear()
+
+
+class GroupCommitter:
+    """
+    Coalesces concurrent store mutations into a single load / write / fsync.
+
+    Each caller submits a mutation, which is a function that takes the
+    applications mapping, sets or removes records in it and returns a
+    result. The first waiting caller becomes the batch leader. It waits up
+    to `window_sec` (or until `max_ops` mutations are queued), loads the
+    store once, applies every queued mutation in arrival order, persists
+    once, and only then wakes all callers. No caller is acknowledged before
+    the write (and the fsync, when `store` performs one) has completed.
+
+    A mutation that raises is rolled back before the next one runs, so none
+    of its changes are written while the rest of the batch is.
+
+    The leader only waits when other commits are pending: mutations are
+    already queued behind it, or the previous batch had company. A lone
+    request on an idle store is committed at once. window_sec=0 disables
+    the wait altogether; mutations that are already queued still share a
+    commit.
+    """
+
+    def __init__(self, load, store, window_sec=0.002, max_ops=64, lock_file=None):
+        self.load = load
+        self.store = store
+        self.window_sec = window_sec
+        self.max_ops = max_ops
+        self.lock_file = lock_file
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._leader_active = False
+        # Whether the last batch saw concurrent submitters
+        self._contended = False
+
+        # Counters for tuning the window against latency
+        self.commits = 0
+        self.mutations = 0
+
+    def submit(self, mutation):
+        """Queues a mutation and blocks until it is durably committed."""
+        entry = _Pending(mutation)
+
+        with self._cond:
+            self._queue.append(entry)
+            if len(self._queue) >= self.max_ops:
+                self._cond.notify_all()
+
+            while not entry.done:
+                if self._leader_active:
+                    self._cond.wait()
+                    continue
+                self._leader_active = True
+                batch = self._collect_batch()
+                self._cond.release()
+                try:
+                    self._commit(batch)
+                finally:
+                    self._cond.acquire()
+                    for pending in batch:
+                        pending.done = True
+                    self._contended = len(batch) > 1 or bool(self._queue)
+                    self._leader_active = False
+                    self._cond.notify_all()
+
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _collect_batch(self):
+        """Waits for the window to fill (called with the condition held)."""
+        wait = self._contended or len(self._queue) > 1
+        deadline = time.monotonic() + self.window_sec
+        while wait and len(self._queue) < self.max_ops:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+        batch = self._queue[:self.max_ops]
+        del self._queue[:self.max_ops]
+        return batch
+
+    def _commit(self, batch):
+        with tracing.span("store.group_commit", **{
+            "commit.batch_size": len(batch),
+            "commit.linked_trace_ids": sorted({p.trace_id for p in batch if p.trace_id})
+        }):
+            self._commit_batch(batch)
+
+        self.commits += 1
+        self.mutations += len(batch)
+
+    def _commit_batch(self, batch):
+        with locked(self.lock_file) if self.lock_file else contextlib.nullcontext():
+            try:
+                applications = self.load()
+                for pending in batch:
+                    journal = _Journal(applications)
+                    try:
+                        pending.result = pending.mutation(journal)
+                    except Exception as e:
+                        journal.rollback()
+                        pending.error = e
+                self.store(applications)
+            except Exception as e:
+                # Nothing in this batch reached disk
+                for pending in batch:
+                    pending.error = pending.error or e
@@ -0,0 +1,281 @@
+# api/idempotency.py
+
+import functools
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# How long a completed response is replayed for
+TTL_SEC = float(os.environ.get('SMARTKYC_IDEMPOTENCY_TTL_SEC', str(24 * 3600)))
+# Upper bound on stored responses; the ones closest to expiry are evicted first
+MAX_ENTRIES = int(os.environ.get('SMARTKYC_IDEMPOTENCY_MAX_ENTRIES', '10000'))
+# How long a duplicate waits for the original request to finish
+WAIT_SEC = float(os.environ.get('SMARTKYC_IDEMPOTENCY_WAIT_SEC', '30'))
+# A claim still in flight after this long belongs to a worker that died; it is dropped
+CLAIM_TIMEOUT_SEC = max(WAIT_SEC, 300.0)
+# How often a duplicate re-checks a claim held by another worker process
+POLL_SEC = 0.05
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DB_FILE = os.environ.get('SMARTKYC_IDEMPOTENCY_DB', os.path.join(DATA_DIR, 'idempotency.sqlite3'))
+CLEANUP_PROBABILITY = 0.01
+
+
+class _Entry:
+    """One (endpoint, key) slot as read from the store: in flight while status_code is None."""
+
+    __slots__ = ('owner', 'fingerprint', 'status_code', 'data')
+
+    def __init__(self, owner, fingerprint, status_code=None, data=None):
+        self.owner = owner
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.data = data
+
+
+class IdempotencyStore:
+    """
+    TTL-bounded response store keyed by (endpoint, idempotency key), in a
+    SQLite database shared by every worker process (like the rate limit
+    buckets, see api/rate_limit.py).
+
+    The first request with a key claims the slot and runs. Duplicates that
+    arrive while it runs, in any worker, wait for it and replay its
+    response, so the view (and the AI layer behind it) runs once. 5xx
+    responses are not stored: the slot is released and the client may
+    retry. Each slot records its application, so retention can purge the
+    responses of deleted applications.
+    """
+
+    def __init__(self, path=DB_FILE, ttl_sec=TTL_SEC, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._local = threading.local()
+        # Wakes duplicates waiting in this process; other processes poll
+        self._changed = threading.Condition()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " slot TEXT PRIMARY KEY, owner TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+                " application_id TEXT, claimed REAL NOT NULL, status_code INTEGER, data TEXT, expires REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_application ON responses (application_id)")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, slot, fingerprint, app_id=None):
+        """Returns (entry, is_owner). The owner must call complete() or release()."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._evict(conn, now)
+            row = conn.execute(
+                "SELECT owner, fingerprint, status_code, data, claimed, expires FROM responses WHERE slot = ?",
+                (slot,)
+            ).fetchone()
+            if row is not None and not self._is_stale(row, now):
+                conn.execute("COMMIT")
+                owner, stored_fingerprint, status_code, data = row[:4]
+                return _Entry(owner, stored_fingerprint, status_code,
+                              json.loads(data) if data is not None else None), False
+
+            entry = _Entry(uuid.uuid4().hex, fingerprint)
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (slot, owner, fingerprint, application_id, claimed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (slot, entry.owner, fingerprint, app_id, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return entry, True
+
+    def _is_stale(self, row, now):
+        _, _, status_code, _, claimed, expires = row
+        if status_code is None:
+            return claimed < now - CLAIM_TIMEOUT_SEC
+        return expires <= now
+
+    def complete(self, slot, entry, status_code, data, app_id=None):
+        """Stores the owner's response. app_id fills in the application of a request that created one."""
+        entry.status_code = status_code
+        entry.data = data
+        self._connection().execute(
+            "UPDATE responses SET status_code = ?, data = ?, expires = ?,"
+            " application_id = COALESCE(application_id, ?) WHERE slot = ? AND owner = ?",
+            (status_code, json.dumps(data, cls=JSONEncoder), time.time() + self.ttl_sec, app_id, slot, entry.owner)
+        )
+        self._notify()
+
+    def release(self, slot, entry):
+        self._connection().execute("DELETE FROM responses WHERE slot = ? AND owner = ?", (slot, entry.owner))
+        self._notify()
+
+    def wait(self, slot, entry, timeout):
+        """
+        Waits for the claim `entry` was read from to finish. Returns the
+        completed entry, None if the owner released the slot, or `entry`
+        unchanged if it is still in flight after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        conn = self._connection()
+        while True:
+            row = conn.execute(
+                "SELECT owner, fingerprint, status_code, data FROM responses WHERE slot = ?", (slot,)
+            ).fetchone()
+            if row is None or row[0] != entry.owner:
+                return None
+            if row[2] is not None:
+                return _Entry(row[0], row[1], row[2], json.loads(row[3]))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return entry
+            with self._changed:
+                self._changed.wait(min(POLL_SEC, remaining))
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _evict(self, conn, now):
+        # Expired responses, then (over capacity) the completed responses
+        # closest to expiry. In-flight claims are kept, except abandoned
+        # ones, which are also replaced when their slot is claimed again.
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        if random.random() < CLEANUP_PROBABILITY:
+            conn.execute(
+                "DELETE FROM responses WHERE status_code IS NULL AND claimed < ?", (now - CLAIM_TIMEOUT_SEC,)
+            )
+        # Room for the claim being made
+        excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] + 1 - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM responses WHERE slot IN ("
+                " SELECT slot FROM responses WHERE expires IS NOT NULL ORDER BY expires LIMIT ?)",
+                (excess,)
+            )
+
+    def purge_applications(self, app_ids):
+        """Deletes the stored responses of the given applications. Returns the number deleted."""
+        app_ids = list(app_ids)
+        conn = self._connection()
+        deleted = 0
+        for start in range(0, len(app_ids), 500):
+            chunk = app_ids[start:start + 500]
+            deleted += conn.execute(
+                f"DELETE FROM responses WHERE application_id IN ({','.join('?' * len(chunk))})", chunk
+            ).rowcount
+        return deleted
+
+
+_store = IdempotencyStore()
+
+
+def purge_applications(app_ids):
+    """Removes stored responses of deleted applications (see api/retention.py)."""
+    return _store.purge_applications(app_ids)
+
+
+def _fingerprint(request):
+    """
+    Hashes the method, path and parsed request data so a key cannot be
+    reused for a different request. Uploaded files are hashed by content:
+    multipart boundaries differ between retries, so the raw body cannot be used.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}".encode('utf-8'))
+    data = request.data
+    for name in sorted(data.keys()):
+        values = data.getlist(name) if hasattr(data, 'getlist') else [data[name]]
+        for value in values:
+            digest.update(b'\0' + name.encode('utf-8') + b'=')
+            if hasattr(value, 'chunks'):
+                for chunk in value.chunks():
+                    digest.update(chunk)
+                value.seek(0)
+            else:
+                digest.update(str(value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _replay(entry):
+    response = Response(entry.data, status=entry.status_code)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Makes a DRF function view honour the Idempotency-Key header.
+
+    Goes below @api_view / @parser_classes. Requests without the header
+    run as before. A retry with the same key replays the original response
+    without touching the store or the AI layer; reusing a key for a
+    different request is rejected with 422.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        slot = f"{request.method} {request.path} {key}"
+        fingerprint = _fingerprint(request)
+        app_id = kwargs.get('app_id')
+        entry, is_owner = _store.claim(slot, fingerprint, app_id=str(app_id) if app_id else None)
+
+        if not is_owner:
+            if entry.fingerprint != fingerprint:
+                return Response({"error": f"{HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if entry.status_code is None:
+                entry = _store.wait(slot, entry, WAIT_SEC)
+                if entry is None:
+                    # The original failed and released the key; run this one normally
+                    return wrapper(request, *args, **kwargs)
+                if entry.status_code is None:
+                    return Response({"error": "A request with this Idempotency-Key is still in progress."},
+                                    status=status.HTTP_409_CONFLICT)
+            return _replay(entry)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            _store.release(slot, entry)
+            raise
+
+        if response.status_code >= 500:
+            _store.release(slot, entry)
+        else:
+            created = response.data.get('application_id') if isinstance(response.data, dict) else None
+            _store.complete(slot, entry, response.status_code, response.data, app_id=created)
+        return response
+
+    return wrapper
@@ -0,0 +1,268 @@
+# api/identity_index.py
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+# The index is a (key, application_id) table in a SQLite database shared by
+# every worker process, like the idempotency and rate limit stores: a
+# registration or lookup touches only the rows of its own keys.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DB_FILE = os.environ.get('SMARTKYC_IDENTITY_INDEX_DB', os.path.join(DATA_DIR, 'identity_index.sqlite3'))
+# The JSON index earlier versions wrote; imported once into an empty database
+LEGACY_FILE = os.path.join(DATA_DIR, 'identity_index.json')
+# Keys per query in batch lookups (below SQLite's bound parameter limit)
+_LOOKUP_CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+
+class CorruptIndexError(ValueError):
+    pass
+
+
+# --- Key Normalization ---
+
+def normalize_document_number(document_number):
+    """
+    Normalizes a document number so that 'p0123 4567' and 'P01234567'
+    produce the same key.
+    """
+    if not document_number:
+        return None
+    key = re.sub(r'[^A-Z0-9]', '', str(document_number).upper())
+    return key or None
+
+
+def normalize_name(name):
+    """Uppercases a name and collapses punctuation and whitespace."""
+    if not name:
+        return ''
+    return ' '.join(re.sub(r'[^A-Z0-9 ]', ' ', str(name).upper()).split())
+
+
+def identity_keys(extracted_data):
+    """
+    Builds the index keys for an application's fused extracted data.
+
+    Returns a dict with 'document_number' and 'dob_name' keys (either may be None).
+    """
+    extracted = extracted_data or {}
+
+    doc_key = normalize_document_number(extracted.get('document_number'))
+    if doc_key:
+        doc_key = f"doc:{doc_key}"
+
+    name = f"{extracted.get('first_name', '')} {extracted.get('last_name', '')}".strip()
+    if not name:
+        name = extracted.get('name', '')
+    name = normalize_name(name)
+    dob = str(extracted.get('dob') or '').strip()
+
+    dob_name_key = f"dob_name:{dob}|{name}" if dob and name else None
+
+    return {
+        "document_number": doc_key,
+        "dob_name": dob_name_key
+    }
+
+
+# --- Index Store ---
+
+class IdentityIndex:
+    """
+    Maps identity keys to the applications that have them.
+
+    Registering an application replaces all of its keys in one IMMEDIATE
+    transaction, so keys from data it no longer has (a re-uploaded or
+    rejected document) stop matching. Lookups are indexed reads.
+    Database errors are raised as CorruptIndexError.
+    """
+
+    def __init__(self, path=DB_FILE, legacy_file=None):
+        self.path = path
+        self.legacy_file = legacy_file
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            try:
+                conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS identity_keys ("
+                    " key TEXT NOT NULL, application_id TEXT NOT NULL, PRIMARY KEY (key, application_id))"
+                    " WITHOUT ROWID"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS identity_keys_application ON identity_keys (application_id)"
+                )
+                self._import_legacy(conn)
+            except sqlite3.DatabaseError as e:
+                raise self._corrupt(e) from e
+            self._local.conn = conn
+        return conn
+
+    def _corrupt(self, error):
+        logger.error("Identity index is unreadable", extra={"path": self.path, "reason": str(error)})
+        return CorruptIndexError(f"Identity index {self.path} is unreadable: {error}")
+
+    def _import_legacy(self, conn):
+        """Imports the old JSON index into an empty database, once."""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM identity_keys LIMIT 1").fetchone() is None:
+                try:
+                    with open(self.legacy_file, 'r') as f:
+                        legacy = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning("Legacy identity index not imported",
+                                   extra={"path": self.legacy_file, "reason": str(e)})
+                    legacy = {}
+                conn.executemany(
+                    "INSERT OR IGNORE INTO identity_keys (key, application_id) VALUES (?, ?)",
+                    [(key, app_id) for key, app_ids in legacy.items() for app_id in app_ids]
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(self.legacy_file, f"{self.legacy_file}.imported")
+
+    def _write(self, statements):
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.DatabaseError as e:
+            raise self._corrupt(e) from e
+        return result
+
+    def register(self, items):
+        """Replaces the keys of each (app_id, extracted_data) pair; None data removes them."""
+        items = list(items)
+
+        def statements(conn):
+            conn.executemany("DELETE FROM identity_keys WHERE application_id = ?",
+                             [(app_id,) for app_id, _ in items])
+            conn.executemany(
+                "INSERT OR IGNORE INTO identity_keys (key, application_id) VALUES (?, ?)",
+                [(key, app_id) for app_id, extracted_data in items
+                 for key in identity_keys(extracted_data).values() if key]
+            )
+
+        if items:
+            self._write(statements)
+
+    def unregister(self, app_ids):
+        """Removes every key of the given applications. Returns the number of rows removed."""
+        app_ids = list(app_ids)
+        if not app_ids:
+            return 0
+        return self._write(lambda conn: conn.executemany(
+            "DELETE FROM identity_keys WHERE application_id = ?", [(app_id,) for app_id in app_ids]
+        ).rowcount)
+
+    def lookup(self, key, exclude=None):
+        """The application ids registered under key, other than `exclude`."""
+        try:
+            rows = self._connection().execute(
+                "SELECT application_id FROM identity_keys WHERE key = ? AND application_id != ?",
+                (key, exclude or '')
+            ).fetchall()
+        except sqlite3.DatabaseError as e:
+            raise self._corrupt(e) from e
+        return [app_id for (app_id,) in rows]
+
+    def lookup_many(self, keys):
+        """{key: [application ids]} for many keys, in a few IN queries."""
+        keys = list(dict.fromkeys(key for key in keys if key))
+        found = {key: [] for key in keys}
+        try:
+            conn = self._connection()
+            for offset in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[offset:offset + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    "SELECT key, application_id FROM identity_keys"
+                    f" WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, app_id in rows:
+                    found[key].append(app_id)
+        except sqlite3.DatabaseError as e:
+            raise self._corrupt(e) from e
+        return found
+
+
+_index = IdentityIndex(legacy_file=LEGACY_FILE)
+
+
+# --- Core Index Functions ---
+
+def register_application(app_id, extracted_data):
+    """
+    Sets an application's identity keys, replacing any it had before
+    (extracted_data=None removes them). Called by data_manager every time
+    document data is saved.
+    """
+    register_applications([(app_id, extracted_data)])
+
+
+def register_applications(items):
+    """
+    Bulk version of register_application for (app_id, extracted_data)
+    pairs, in one transaction. An unreadable index is logged and nothing
+    is registered.
+    """
+    try:
+        _index.register(items)
+    except CorruptIndexError:
+        pass
+
+
+def unregister_applications(app_ids):
+    """
+    Removes every key of the given applications from the index (e.g. when
+    retention purges them). Returns the number of (key, application) entries removed.
+    """
+    return _index.unregister(app_ids)
+
+
+def find_duplicates(app_id, extracted_data):
+    """
+    Looks up other applications sharing this application's identity keys.
+
+    Returns a dict of {'document_number': [...], 'dob_name': [...]} with the
+    *other* application ids found for each key, one indexed lookup per key.
+    Raises CorruptIndexError if the index cannot be read.
+    """
+    return {
+        kind: _index.lookup(key, exclude=app_id) if key else []
+        for kind, key in identity_keys(extracted_data).items()
+    }
+
+
+def find_duplicates_batch(items):
+    """
+    find_duplicates for many (app_id, extracted_data) pairs, with the keys
+    of the whole batch looked up together. Returns one dict per pair.
+    """
+    items = [(app_id, identity_keys(extracted_data)) for app_id, extracted_data in items]
+    found = _index.lookup_many(key for _, keys in items for key in keys.values())
+    return [
+        {kind: [other for other in found.get(key, ()) if other != app_id] if key else []
+         for kind, key in keys.items()}
+        for app_id, keys in items
+    ]
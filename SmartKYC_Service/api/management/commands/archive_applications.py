@@ -0,0 +1,41 @@
+# api/management/commands/archive_applications.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives terminal (APPROVED / REJECTED / REJECTED_*) applications older than --max-age-days "
+        "into compressed, date-partitioned JSONL files and removes them from the hot store. "
+        "Interrupted runs resume from the last checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, default=retention.DEFAULT_MAX_AGE_DAYS)
+        parser.add_argument('--batch-size', type=int, default=retention.DEFAULT_BATCH_SIZE)
+        parser.add_argument('--compression', default="gzip", choices=sorted(retention.COMPRESSIONS))
+        parser.add_argument('--purge', action='store_true',
+                            help="Also delete the document and selfie files and the preprocessed variants "
+                                 "of archived applications.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        try:
+            summary = retention.run_retention(
+                max_age_days=options['max_age_days'],
+                batch_size=options['batch_size'],
+                compression=options['compression'],
+                purge=options['purge'],
+                dry_run=options['dry_run'],
+                log=self.stdout.write
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Run {summary['run_id']}: archived {summary['archived']} application(s), "
+                f"purged {summary['blobs_purged']} blob(s)."
+            ))
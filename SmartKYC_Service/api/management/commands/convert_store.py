@@ -0,0 +1,46 @@
+# api/management/commands/convert_store.py
+
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import data_manager
+from api import store_formats
+
+
+class Command(BaseCommand):
+    help = "Converts the application store from one serialization format to another in one shot."
+
+    def add_arguments(self, parser):
+        formats = sorted(store_formats.FORMATS)
+        parser.add_argument('--from', dest='source_format', default=data_manager.STORE_FORMAT, choices=formats)
+        parser.add_argument('--to', dest='target_format', required=True, choices=formats)
+        parser.add_argument('--input', help="Source file (defaults to the store file for --from).")
+        parser.add_argument('--output', help="Target file (defaults to the store file for --to).")
+
+    def handle(self, *args, **options):
+        source = options['input'] or data_manager.store_file_for(options['source_format'])
+        target = options['output'] or data_manager.store_file_for(options['target_format'])
+
+        if not os.path.exists(source):
+            raise CommandError(f"Source store '{source}' does not exist.")
+        if os.path.abspath(source) == os.path.abspath(target) and \
+                options['source_format'] == options['target_format']:
+            raise CommandError("Source and target are identical.")
+
+        start = time.perf_counter()
+        applications = data_manager.read_data(source, options['source_format'])
+        loaded = time.perf_counter()
+        data_manager.write_data(applications, target, options['target_format'])
+        written = time.perf_counter()
+
+        self.stdout.write(
+            f"Converted {len(applications)} application(s): "
+            f"{source} ({os.path.getsize(source):,} bytes, {options['source_format']}) -> "
+            f"{target} ({os.path.getsize(target):,} bytes, {options['target_format']})"
+        )
+        self.stdout.write(f"Load {loaded - start:.3f}s, dump {written - loaded:.3f}s.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Set SMARTKYC_STORE_FORMAT={options['target_format']} to serve from the new store."
+        ))
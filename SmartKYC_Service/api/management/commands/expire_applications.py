@@ -0,0 +1,25 @@
+# api/management/commands/expire_applications.py
+
+from django.core.management.base import BaseCommand
+
+from api import expiry
+
+
+class Command(BaseCommand):
+    help = (
+        "Expires applications that have been stuck in a non-terminal state longer than its TTL "
+        "(see api/expiry.py). Runs one sweep; the server also sweeps in the background."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only count the applications that are due.")
+
+    def handle(self, *args, **options):
+        for state, ttl in sorted(expiry.TTL_SEC.items()):
+            self.stdout.write(f"  {state}: {ttl / 3600:g}h")
+
+        expired = expiry.sweep(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {len(expired)} application(s) would be expired.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Expired {len(expired)} application(s)."))
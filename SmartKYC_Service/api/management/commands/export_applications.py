@@ -0,0 +1,38 @@
+# api/management/commands/export_applications.py
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import export
+
+
+class Command(BaseCommand):
+    help = "Streams applications as JSONL or CSV to a file or stdout, for reporting."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', default="jsonl", choices=sorted(export.EXPORT_FORMATS))
+        parser.add_argument('--status', default="", help="Comma-separated list of statuses to include.")
+        parser.add_argument('--since', default=None, help="Only applications updated at or after this ISO 8601 time.")
+        parser.add_argument('--output', default="-", help="Output file (default: stdout).")
+
+    def handle(self, *args, **options):
+        statuses = {s.strip() for s in options['status'].split(',') if s.strip()}
+        try:
+            since = export.parse_since(options['since'])
+        except ValueError:
+            raise CommandError("Invalid --since. Use an ISO 8601 date or timestamp.")
+
+        chunks = export.iter_export(options['export_format'], statuses=statuses, since=since)
+        if options['output'] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        self.stderr.write(f"Wrote {written} bytes to {options['output']}.")
@@ -0,0 +1,51 @@
+# api/management/commands/import_applications.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import bulk_import
+from api import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads applications from a JSONL file or an application store file (e.g. applications.json), "
+        "or generates --synthetic N realistic applications across every workflow state."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="JSONL file or store file to import.")
+        parser.add_argument('--synthetic', type=int, default=None, metavar='N',
+                            help="Generate N synthetic applications instead of reading a file.")
+        parser.add_argument('--seed', type=int, default=None, help="Seed for --synthetic.")
+        parser.add_argument('--chunk-size', type=int, default=bulk_import.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--skip-existing', action='store_true',
+                            help="Keep applications that are already in the store instead of overwriting them.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; write nothing.")
+
+    def handle(self, *args, **options):
+        if (options['path'] is None) == (options['synthetic'] is None):
+            raise CommandError("Give either a file to import or --synthetic N.")
+
+        if options['synthetic'] is not None:
+            records = synthetic.generate_applications(options['synthetic'], seed=options['seed'])
+        else:
+            records = bulk_import.iter_source(options['path'])
+
+        try:
+            summary = bulk_import.import_applications(
+                records,
+                chunk_size=options['chunk_size'],
+                overwrite=not options['skip_existing'],
+                dry_run=options['dry_run'],
+                log=self.stdout.write
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Record {error['record']} ({error['application_id']}): {'; '.join(error['problems'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {summary['read']}, invalid {summary['invalid']}, inserted {summary['inserted']}, "
+            f"updated {summary['updated']}, skipped {summary['skipped']}."
+        ))
@@ -0,0 +1,53 @@
+# api/management/commands/rescore_applications.py
+
+import time
+from collections import Counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api import batch_scoring
+from api import data_manager
+
+
+class Command(BaseCommand):
+    help = "Re-scores stored applications in one vectorized pass and writes the results back in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-pending', action='store_true',
+            help="Also score applications waiting in PENDING_RISK_ANALYSIS."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Compute and report the new decisions without writing them."
+        )
+        parser.add_argument('--seed', type=int, default=None, help="Seed for the clean-application base score.")
+
+    def handle(self, *args, **options):
+        statuses = set(batch_scoring.DECIDED_STATUSES)
+        if options['include_pending']:
+            statuses.add("PENDING_RISK_ANALYSIS")
+
+        applications = [app for app in data_manager.read_data().values() if app.get('status') in statuses]
+        if not applications:
+            self.stdout.write("No applications to re-score.")
+            return
+
+        start = time.perf_counter()
+        results = batch_scoring.rescore_applications(applications, rng=np.random.default_rng(options['seed']))
+        elapsed = time.perf_counter() - start
+
+        transitions = Counter(
+            (app['status'], results[app['application_id']]['decision']) for app in applications
+        )
+        self.stdout.write(f"Re-scored {len(results)} application(s) in {elapsed:.3f}s.")
+        for (old, new), count in sorted(transitions.items()):
+            self.stdout.write(f"  {old} -> {new}: {count}")
+
+        if options['dry_run']:
+            self.stdout.write("Dry run: no changes written.")
+            return
+
+        updated = data_manager.save_risk_analyses(results)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {updated} application(s)."))
@@ -0,0 +1,23 @@
+# api/parsers.py
+
+from rest_framework.parsers import FormParser, MultiPartParser
+
+from . import tracing
+
+
+class TracedMultiPartParser(MultiPartParser):
+    """MultiPartParser that records the time spent parsing the upload as a span."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        with tracing.span("http.multipart_parse") as span:
+            result = super().parse(stream, media_type, parser_context)
+            span.set_attribute("http.upload_files", len(result.files))
+            return result
+
+
+class TracedFormParser(FormParser):
+    """FormParser that records the time spent parsing the body as a span."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        with tracing.span("http.form_parse"):
+            return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,332 @@
+# api/preprocessing.py
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import file_lock, tracing
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Input each model needs, as (longest side in pixels, Pillow mode).
+# Variants are never upscaled.
+MODEL_TARGETS = {
+    "ocr": (1600, "L"),
+    "forensics": (1024, "RGB"),
+    "face": (512, "RGB"),
+}
+DOCUMENT_TARGETS = ("ocr", "forensics")
+SELFIE_TARGETS = ("face",)
+
+# Per-channel normalization applied by model_input() (ImageNet statistics)
+MEAN = {"L": np.float32(0.449), "RGB": np.array([0.485, 0.456, 0.406], dtype=np.float32)}
+STD = {"L": np.float32(0.226), "RGB": np.array([0.229, 0.224, 0.225], dtype=np.float32)}
+
+# Larger uploads are refused rather than decoded (decompression bombs)
+MAX_PIXELS = int(os.environ.get('SMARTKYC_PREPROCESS_MAX_PIXELS', str(64_000_000)))
+WORKERS = int(os.environ.get('SMARTKYC_PREPROCESS_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+CACHE_DIR = os.environ.get('SMARTKYC_PREPROCESS_CACHE_DIR', os.path.join(DATA_DIR, 'preprocessed'))
+
+# Cache bounds: uploads unused for longer than the TTL are removed, then the
+# least recently used until the cache fits the size limit. Each worker checks
+# at most every CACHE_PRUNE_SEC, after storing a new upload.
+CACHE_TTL_SEC = float(os.environ.get('SMARTKYC_PREPROCESS_CACHE_TTL_SEC', str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(float(os.environ.get('SMARTKYC_PREPROCESS_CACHE_MAX_MB', '2048')) * 2**20)
+CACHE_PRUNE_SEC = 300.0
+
+logger = logging.getLogger(__name__)
+
+
+class Preprocessed:
+    """The model-ready variants of one upload, keyed by target name (uint8 arrays, H x W[ x 3])."""
+
+    __slots__ = ('content_hash', 'variants', 'source_size', 'cached')
+
+    def __init__(self, content_hash, variants, source_size=None, cached=False):
+        self.content_hash = content_hash
+        self.variants = variants
+        self.source_size = source_size
+        self.cached = cached
+
+    def describe(self):
+        """Summary for the AI result's model_info."""
+        return {
+            "content_hash": self.content_hash,
+            "source_size": list(self.source_size) if self.source_size else None,
+            "variants": {name: list(array.shape[1::-1]) for name, array in self.variants.items()},
+            "cached": self.cached,
+        }
+
+
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def model_input(array, mode):
+    """Scales a uint8 variant to float32 and normalizes it per channel, as the models expect."""
+    return (array.astype(np.float32) / 255.0 - MEAN[mode]) / STD[mode]
+
+
+# --- Variant Cache ---
+#
+# Variants are stored as .npy files named by the upload's content hash and
+# the target spec, so a re-upload of the same image (or any later stage
+# that needs it) memory-maps them instead of decoding again, and changing
+# a target's size or mode never serves an old variant. '<hash>.json' holds
+# the source size; it is written first and its mtime marks the last use.
+
+def _variant_path(digest, target):
+    long_side, mode = MODEL_TARGETS[target]
+    return os.path.join(CACHE_DIR, digest[:2], f"{digest}.{target}-{long_side}{mode}.npy")
+
+
+def load_variants(digest, targets):
+    """
+    Memory-maps the cached variants of an upload by its content hash (as
+    recorded in model_info.input), or returns None if any is missing.
+    """
+    variants = {}
+    for target in targets:
+        path = _variant_path(digest, target)
+        if not os.path.exists(path):
+            return None
+        variants[target] = np.load(path, mmap_mode='r')
+    return variants
+
+
+def _meta_path(digest):
+    return os.path.join(CACHE_DIR, digest[:2], f"{digest}.json")
+
+
+def _load_source_size(digest):
+    try:
+        with open(_meta_path(digest), 'r') as f:
+            return tuple(json.load(f)["source_size"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _touch(digest):
+    try:
+        os.utime(_meta_path(digest))
+    except OSError:
+        pass
+
+
+def _store_cached(digest, variants, source_size):
+    meta_path = _meta_path(digest)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    tmp_file = file_lock.tmp_path(meta_path)
+    with open(tmp_file, 'w') as f:
+        json.dump({"source_size": list(source_size)}, f)
+    os.replace(tmp_file, meta_path)
+    for target, array in variants.items():
+        path = _variant_path(digest, target)
+        tmp_file = file_lock.tmp_path(path)
+        with open(tmp_file, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_file, path)
+
+
+def purge(digests):
+    """
+    Removes the cached variants of uploads by content hash (e.g. of deleted
+    applications, see api/retention.py). Returns the number of files removed.
+    """
+    removed = 0
+    for digest in set(digests):
+        shard = os.path.join(CACHE_DIR, digest[:2])
+        try:
+            names = os.listdir(shard)
+        except OSError:
+            continue
+        for name in names:
+            if name.startswith(f"{digest}."):
+                try:
+                    os.remove(os.path.join(shard, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+def _cache_entries():
+    """Returns {digest: [last_used, total_bytes]} for every cached upload."""
+    entries = {}
+    try:
+        shards = [entry.path for entry in os.scandir(CACHE_DIR) if entry.is_dir()]
+    except OSError:
+        return entries
+    for shard in shards:
+        try:
+            files = list(os.scandir(shard))
+        except OSError:
+            continue
+        for entry in files:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            digest = entry.name.split('.', 1)[0]
+            info = entries.setdefault(digest, [0.0, 0])
+            info[1] += st.st_size
+            if entry.name == f"{digest}.json" or not info[0]:
+                info[0] = st.st_mtime
+    return entries
+
+
+def prune_cache(now=None, ttl_sec=None, max_bytes=None):
+    """
+    Applies the cache bounds: drops uploads unused for longer than the TTL,
+    then the least recently used ones until the cache fits the size limit.
+    Returns the number of uploads removed.
+    """
+    now = time.time() if now is None else now
+    ttl_sec = CACHE_TTL_SEC if ttl_sec is None else ttl_sec
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = sorted(_cache_entries().items(), key=lambda item: item[1][0])
+    total = sum(size for _, (_, size) in entries)
+    expired = []
+    for digest, (last_used, size) in entries:
+        if last_used >= now - ttl_sec and total <= max_bytes:
+            break
+        expired.append(digest)
+        total -= size
+    purge(expired)
+    return len(expired)
+
+
+_prune = {"last": 0.0, "running": False}
+_prune_lock = threading.Lock()
+
+
+def _maybe_prune():
+    with _prune_lock:
+        if _prune["running"] or time.monotonic() - _prune["last"] < CACHE_PRUNE_SEC:
+            return
+        _prune["running"] = True
+        _prune["last"] = time.monotonic()
+
+    def run():
+        try:
+            removed = prune_cache()
+            if removed:
+                logger.info("Preprocessing cache pruned", extra={"stage": "preprocess", "removed": removed})
+        except Exception:
+            logger.exception("Preprocessing cache prune failed", extra={"stage": "preprocess"})
+        finally:
+            with _prune_lock:
+                _prune["running"] = False
+
+    _executor().submit(run)
+
+
+# --- Decoding ---
+
+def _decode_variants(image_bytes, targets):
+    """
+    Decodes the image once and derives every target from that decode.
+
+    JPEGs are decoded with draft(), which scales in the DCT domain to the
+    smallest power-of-two reduction still at least as large as the
+    biggest target, so a 12 MP photo is never fully decompressed. EXIF
+    orientation is applied, and the variants are bare pixel arrays, so no
+    metadata (EXIF, GPS, ICC, comments) reaches the models.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        source_size = image.size
+        if source_size[0] * source_size[1] > MAX_PIXELS:
+            raise ValueError(f"Image of {source_size[0]}x{source_size[1]} pixels exceeds the limit.")
+
+        largest = max(MODEL_TARGETS[target][0] for target in targets)
+        scale = largest / max(source_size)
+        if scale < 1:
+            image.draft('RGB', (int(source_size[0] * scale) + 1, int(source_size[1] * scale) + 1))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    variants = {}
+    # Largest first, each derived from the previous (smaller) one where possible
+    for target in sorted(targets, key=lambda t: -MODEL_TARGETS[t][0]):
+        long_side, mode = MODEL_TARGETS[target]
+        variant = image.copy()
+        variant.thumbnail((long_side, long_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if mode != 'RGB':
+            variant = variant.convert(mode)
+        variants[target] = np.asarray(variant)
+        image = variant if mode == 'RGB' else image
+    return variants, source_size
+
+
+_pool = {"executor": None}
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    if _pool["executor"] is None:
+        with _pool_lock:
+            if _pool["executor"] is None:
+                _pool["executor"] = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="smartkyc-preprocess")
+    return _pool["executor"]
+
+
+# --- Core Preprocessing Function ---
+
+def preprocess(image_bytes, targets, app_id=None):
+    """
+    Returns the Preprocessed variants of an uploaded image for `targets`,
+    from the cache or by decoding it on the preprocessing pool.
+
+    Returns None when the upload is not a decodable image (or Pillow is
+    not installed); callers then fall back to the raw upload.
+
+    Decoding runs on a thread pool of SMARTKYC_PREPROCESS_WORKERS: Pillow
+    releases the GIL while decoding and resampling, so concurrent uploads
+    are preprocessed in parallel, and the pool bounds how many decoded
+    images are held in memory at once.
+    """
+    if Image is None or not image_bytes:
+        return None
+
+    digest = content_hash(image_bytes)
+    with tracing.span("preprocess", **{"preprocess.targets": ",".join(targets)}) as span:
+        variants = load_variants(digest, targets)
+        source_size = _load_source_size(digest) if variants is not None else None
+        # Without its source size a cached upload would skip the resolution check; decode it again
+        if source_size is not None:
+            _touch(digest)
+            span.set_attribute("preprocess.cached", True)
+            return Preprocessed(digest, variants, source_size=source_size, cached=True)
+
+        start = time.perf_counter()
+        try:
+            variants, source_size = _executor().submit(
+                tracing.propagate(_decode_variants), image_bytes, targets
+            ).result()
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.info("Upload not preprocessed", extra={
+                "application_id": app_id, "stage": "preprocess", "reason": str(e)
+            })
+            return None
+
+        _store_cached(digest, variants, source_size)
+        _maybe_prune()
+        span.set_attribute("preprocess.cached", False)
+        logger.debug("Upload preprocessed", extra={
+            "application_id": app_id, "stage": "preprocess", "source_size": source_size,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+        return Preprocessed(digest, variants, source_size=source_size)
@@ -0,0 +1,423 @@
+# api/profiling.py
+
+import glob
+import hmac
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.http import JsonResponse
+
+# Per-request profiling is only available when a token is configured; the
+# caller must present it in the X-SmartKYC-Profile header (never the query
+# string, which ends up in access logs).
+PROFILING_TOKEN = os.environ.get('SMARTKYC_PROFILING_TOKEN', '')
+PROFILE_HEADER = 'X-SmartKYC-Profile'
+# 'cprofile' (deterministic, default) or 'sample' (statistical, low overhead)
+MODE_QUERY_PARAM = '_profile_mode'
+MODES = ("cprofile", "sample")
+PROFILED_PREFIX = '/api/v1/'
+
+# Always-on, low-rate sampler of request threads. Each worker flushes its
+# aggregated stacks to its own file; reads merge every worker's file.
+SAMPLER_ENABLED = os.environ.get('SMARTKYC_PROFILING_SAMPLER', '0') == '1'
+SAMPLER_INTERVAL_SEC = float(os.environ.get('SMARTKYC_PROFILING_SAMPLER_INTERVAL_MS', '50')) / 1000
+SAMPLER_FLUSH_SEC = 10.0
+# A worker file not rewritten for this long (or whose process has exited) is removed on read
+SAMPLER_STALE_SEC = 6 * SAMPLER_FLUSH_SEC
+REQUEST_SAMPLE_INTERVAL_SEC = 0.001
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+MAX_PROFILES = 50
+MAX_STACKS = 20000
+MAX_DEPTH = 128
+# Bounds on approximating collapsed stacks from cProfile's call graph
+MIN_PATH_US = 20
+MAX_PATHS = 50000
+
+
+# --- Stack Helpers ---
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_frame(frame):
+    """Formats a frame's stack, root first, as one collapsed-stack line (without the count)."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code).replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def format_collapsed(counts):
+    """Renders {stack: count} as flamegraph.pl / speedscope collapsed-stack text."""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def parse_collapsed(text, into=None):
+    counts = into if into is not None else Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            counts[stack] += int(count)
+    return counts
+
+
+def _add_sample(counts, stack):
+    if stack in counts or len(counts) < MAX_STACKS:
+        counts[stack] += 1
+    else:
+        counts["[truncated]"] += 1
+
+
+def pstats_to_collapsed(stats):
+    """
+    Approximates collapsed stacks from a cProfile run.
+
+    cProfile only records caller -> callee edges, so each function's own
+    time is spread over the paths leading to it in proportion to the
+    cumulative time each caller spent in it. Weights are in microseconds.
+    The call graph can have exponentially many paths, so paths worth less
+    than MIN_PATH_US are dropped and the walk stops after MAX_PATHS.
+    """
+    entries = stats.stats  # {func: (cc, nc, tt, ct, callers)}
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ':')
+
+    counts = Counter()
+    budget = [MAX_PATHS]
+
+    def walk(func, path, share):
+        tottime = entries[func][2]
+        path = path + [label(func)]
+        budget[0] -= 1
+        own = int(tottime * share * 1_000_000)
+        if own > 0:
+            counts[';'.join(path)] += own
+        if len(path) >= MAX_DEPTH:
+            return
+        for callee, edge_cumtime in callees.get(func, ()):
+            if budget[0] <= 0:
+                return
+            if callee in visiting or callee not in entries:
+                continue
+            callee_cumtime = entries[callee][3]
+            if callee_cumtime <= 0:
+                continue
+            callee_share = share * min(edge_cumtime / callee_cumtime, 1.0)
+            if callee_share * callee_cumtime * 1_000_000 < MIN_PATH_US:
+                continue
+            visiting.add(callee)
+            walk(callee, path, callee_share)
+            visiting.discard(callee)
+
+    # Roots were entered at least once from outside the profile: they have
+    # more calls than their callers account for (Django's middleware chain
+    # re-enters the same 'inner' wrapper, so "no callers" is not enough)
+    roots = [func for func, entry in entries.items()
+             if entry[1] > sum(edge[0] for edge in entry[4].values())]
+    for root in roots:
+        visiting = {root}
+        walk(root, [], 1.0)
+    return counts
+
+
+# --- Per-request Profiles ---
+
+class ProfilerBusy(Exception):
+    """Raised when cProfile cannot be started because another profile is running."""
+
+
+def is_authorized(request):
+    """True if the request carries the profiling token in the X-SmartKYC-Profile header."""
+    if not PROFILING_TOKEN:
+        return False
+    supplied = request.headers.get(PROFILE_HEADER) or ''
+    return hmac.compare_digest(supplied.encode('utf-8'), PROFILING_TOKEN.encode('utf-8'))
+
+
+def _profile_path(profile_id, extension):
+    return os.path.join(PROFILE_DIR, f"request-{profile_id}.{extension}")
+
+
+def _prune_profiles():
+    files = sorted(glob.glob(os.path.join(PROFILE_DIR, 'request-*')), key=os.path.getmtime)
+    for path in files[:-MAX_PROFILES * 2]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# cProfile hooks the whole interpreter: only one profile can run per process
+# (Python 3.12+ refuses a second one with "Another profiling tool is already active")
+_cprofile_lock = threading.Lock()
+
+_switch_lock = threading.Lock()
+_switch = {"users": 0, "saved": None}
+
+
+class _ThreadSampler:
+    """
+    Samples one thread's stack at a fixed interval until stopped.
+
+    The sampler needs the GIL to take a sample, so while it runs the
+    interpreter's switch interval (5 ms by default) is lowered to the
+    sampling interval; otherwise a busy request thread would starve it.
+    """
+
+    def __init__(self, thread_id, interval_sec):
+        self.thread_id = thread_id
+        self.interval_sec = interval_sec
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="smartkyc-request-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                _add_sample(self.counts, collapse_frame(frame))
+
+    def __enter__(self):
+        with _switch_lock:
+            if _switch["users"] == 0:
+                _switch["saved"] = sys.getswitchinterval()
+                sys.setswitchinterval(min(_switch["saved"], self.interval_sec))
+            _switch["users"] += 1
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            _switch["users"] -= 1
+            if _switch["users"] == 0:
+                sys.setswitchinterval(_switch["saved"])
+        return False
+
+
+def profile_call(mode, func, *args, **kwargs):
+    """
+    Runs func under the chosen profiler and saves the result under data/profiles.
+    Returns (result, profile_id). Raises ProfilerBusy, before calling func,
+    if a cProfile run is already in progress.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = uuid.uuid4().hex[:16]
+
+    if mode == "sample":
+        with _ThreadSampler(threading.get_ident(), REQUEST_SAMPLE_INTERVAL_SEC) as sampler:
+            result = func(*args, **kwargs)
+        with open(_profile_path(profile_id, 'collapsed'), 'w') as f:
+            f.write(format_collapsed(sampler.counts))
+    else:
+        import cProfile
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusy("Another request is being profiled.")
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Another tool (a debugger, coverage) holds the profiling hook
+                raise ProfilerBusy(str(e))
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _cprofile_lock.release()
+        profiler.dump_stats(_profile_path(profile_id, 'prof'))
+
+    _prune_profiles()
+    return result, profile_id
+
+
+def load_profile(profile_id, output="collapsed"):
+    """
+    Returns a saved request profile as text: collapsed stacks (any mode) or,
+    for cProfile runs, a pstats report. Returns None if it doesn't exist.
+    """
+    if not profile_id.isalnum():
+        return None
+
+    collapsed_path = _profile_path(profile_id, 'collapsed')
+    if os.path.exists(collapsed_path):
+        if output != "collapsed":
+            return None
+        with open(collapsed_path, 'r') as f:
+            return f.read()
+
+    prof_path = _profile_path(profile_id, 'prof')
+    if not os.path.exists(prof_path):
+        return None
+    # The profiler modules are only needed once a profile is requested
+    import io
+    import pstats
+
+    stats = pstats.Stats(prof_path)
+    if output == "pstats":
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats('cumulative').print_stats(60)
+        return buffer.getvalue()
+    return format_collapsed(pstats_to_collapsed(stats))
+
+
+# --- Always-on Sampler ---
+
+_active_requests = {}  # thread id -> request path
+_sampler = {"thread": None, "pid": None, "counts": Counter()}
+_sampler_lock = threading.Lock()
+
+
+def _sampler_file():
+    return os.path.join(PROFILE_DIR, f"samples-{socket.gethostname()}-{os.getpid()}.collapsed")
+
+
+def _flush_samples():
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _sampler_lock:
+        text = format_collapsed(_sampler["counts"])
+    tmp_file = f"{_sampler_file()}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+    os.replace(tmp_file, _sampler_file())
+
+
+def _run_sampler():
+    last_flush = time.monotonic()
+    while True:
+        time.sleep(SAMPLER_INTERVAL_SEC)
+        frames = sys._current_frames()
+        with _sampler_lock:
+            for thread_id in list(_active_requests):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    _add_sample(_sampler["counts"], collapse_frame(frame))
+        if time.monotonic() - last_flush >= SAMPLER_FLUSH_SEC:
+            try:
+                _flush_samples()
+            except OSError:
+                pass
+            last_flush = time.monotonic()
+
+
+def start_sampler():
+    """
+    Starts the background sampler once per process. A forked worker starts
+    its own (the parent's thread did not survive the fork) and drops the
+    samples it inherited, which the parent still reports.
+    """
+    with _sampler_lock:
+        if _sampler["pid"] != os.getpid():
+            _sampler["counts"] = Counter()
+            _sampler["pid"] = os.getpid()
+            _sampler["thread"] = threading.Thread(target=_run_sampler, name="smartkyc-sampler", daemon=True)
+            _sampler["thread"].start()
+
+
+def _is_stale_sampler_file(path, now):
+    """True for the file of a worker of this host that has exited, or one no longer flushed."""
+    try:
+        if now - os.path.getmtime(path) > SAMPLER_STALE_SEC:
+            return True
+    except OSError:
+        return False
+    host, _, pid = os.path.basename(path)[len('samples-'):-len('.collapsed')].rpartition('-')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def aggregated_samples():
+    """
+    Merges the sampled stacks of every worker (this one's live, others'
+    from their last flush). Files left by exited workers are removed.
+    """
+    counts = Counter()
+    own_file = _sampler_file()
+    now = time.time()
+    for path in glob.glob(os.path.join(PROFILE_DIR, 'samples-*.collapsed')):
+        if path == own_file:
+            continue
+        if _is_stale_sampler_file(path, now):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, 'r') as f:
+                parse_collapsed(f.read(), counts)
+        except OSError:
+            continue
+    with _sampler_lock:
+        counts.update(_sampler["counts"])
+    return counts
+
+
+# --- Middleware ---
+
+class ProfilingMiddleware:
+    """
+    Profiles single /api/v1/ requests on demand and marks request threads
+    for the background sampler.
+
+    A request with the profiling token runs under cProfile (or the
+    per-request sampler with _profile_mode=sample); the response carries
+    X-Profile-Id, and the profile is served by
+    GET /api/v1/profiling/<id>/?output=collapsed|pstats. cProfile runs one
+    request at a time; a request asking for one while another runs gets
+    409 without being processed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(PROFILED_PREFIX):
+            return self.get_response(request)
+
+        thread_id = threading.get_ident()
+        if SAMPLER_ENABLED:
+            if _sampler["pid"] != os.getpid():
+                start_sampler()
+            _active_requests[thread_id] = request.path
+        try:
+            if is_authorized(request) and not request.path.startswith(PROFILED_PREFIX + 'profiling/'):
+                mode = request.headers.get('X-SmartKYC-Profile-Mode') or request.GET.get(MODE_QUERY_PARAM)
+                mode = mode if mode in MODES else "cprofile"
+                try:
+                    response, profile_id = profile_call(mode, self.get_response, request)
+                except ProfilerBusy as e:
+                    response = JsonResponse({"error": f"{e} Retry shortly."}, status=409)
+                    response['Retry-After'] = '1'
+                    return response
+                response['X-Profile-Id'] = profile_id
+                response['X-Profile-Mode'] = mode
+                return response
+            return self.get_response(request)
+        finally:
+            _active_requests.pop(thread_id, None)
@@ -0,0 +1,147 @@
+# api/projection.py
+
+import functools
+import re
+
+# Representations of an application for GET /applications/<id>/?view=
+# 'summary' is what a polling client needs: the state, the decision and
+# why, and the status of each step, without forensics, model_info or the
+# selfie's ai_analysis.
+SUMMARY_FIELDS = (
+    "application_id",
+    "status",
+    "created_at",
+    "updated_at",
+    "risk_score",
+    "explanations",
+    "documents.*.document_type",
+    "documents.*.status",
+    "selfie.status",
+)
+VIEWS = ("full", "summary")
+
+MAX_FIELDS = 50
+_FIELD_PATH = re.compile(r'^(\*|\w+)(\.(\*|\w+))*$')
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+# --- Compilation ---
+#
+# A projection is compiled once into nested closures: each level keeps
+# only the keys it needs and hands nested values to the closure compiled
+# for that subtree, so applying it is a few dict lookups per field with
+# no path parsing. A '*' segment applies the rest of the path to every
+# key at that level.
+
+def _build_tree(paths):
+    tree = {}
+    for path in paths:
+        node = tree
+        segments = path.split('.')
+        for i, segment in enumerate(segments):
+            if node.get(segment, {}) is None:
+                # A shorter path already selects this whole subtree
+                break
+            if i == len(segments) - 1:
+                node[segment] = None
+            else:
+                node = node.setdefault(segment, {})
+    return tree
+
+
+def _merge(first, second):
+    if first is None or second is None:
+        return None
+    merged = dict(first)
+    for key, sub in second.items():
+        merged[key] = _merge(merged[key], sub) if key in merged else sub
+    return merged
+
+
+def _compile_tree(tree):
+    if '*' in tree:
+        star = tree['*']
+        if star is None:
+            return lambda value: value
+        project_each = _compile_tree(star)
+        # Named keys next to '*' get both their own fields and the '*' fields
+        named = {key: _compile_tree(_merge(star, sub)) if sub is not None else (lambda item: item)
+                 for key, sub in tree.items() if key != '*'}
+        if not named:
+            return lambda value: (
+                {key: project_each(item) for key, item in value.items()} if isinstance(value, dict) else value
+            )
+        return lambda value: (
+            {key: named.get(key, project_each)(item) for key, item in value.items()}
+            if isinstance(value, dict) else value
+        )
+
+    whole = tuple(key for key, sub in tree.items() if sub is None)
+    nested = tuple((key, _compile_tree(sub)) for key, sub in tree.items() if sub is not None)
+
+    if not nested:
+        def project(value):
+            if not isinstance(value, dict):
+                return value
+            return {key: value[key] for key in whole if key in value}
+        return project
+
+    def project(value):
+        if not isinstance(value, dict):
+            return value
+        out = {key: value[key] for key in whole if key in value}
+        for key, project_sub in nested:
+            if key in value:
+                out[key] = project_sub(value[key])
+        return out
+    return project
+
+
+@functools.lru_cache(maxsize=256)
+def compile_projection(paths):
+    """
+    Compiles a tuple of dotted field paths (e.g. ("status",
+    "documents.*.status")) into a function that returns the projected
+    copy of a record. Missing fields are left out. Compiled projections
+    are cached, so repeated ?fields= values cost one lookup.
+    """
+    return _compile_tree(_build_tree(paths))
+
+
+SUMMARY = compile_projection(SUMMARY_FIELDS)
+
+
+def parse_fields(value):
+    """
+    Parses a ?fields= value ("status,explanations,selfie.status") into a
+    normalized tuple of paths. Raises InvalidFields.
+    """
+    # Duplicates are dropped; the caller's order is kept for the response
+    paths = list(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+    if not paths:
+        raise InvalidFields("fields must list at least one field.")
+    if len(paths) > MAX_FIELDS:
+        raise InvalidFields(f"fields may list at most {MAX_FIELDS} fields.")
+    for path in paths:
+        if not _FIELD_PATH.match(path):
+            raise InvalidFields(f"Invalid field '{path}'. Use dotted names, with * for any key.")
+    return tuple(paths)
+
+
+def projection_for(query_params):
+    """
+    Returns (representation, project) for ?fields= or ?view= (fields wins
+    if both are given). representation names the output, e.g. for caching;
+    project is None for the full record. Raises InvalidFields.
+    """
+    fields = query_params.get('fields')
+    if fields is not None:
+        paths = parse_fields(fields)
+        return f"fields:{','.join(paths)}", compile_projection(paths)
+    view = query_params.get('view', 'full')
+    if view not in VIEWS:
+        raise InvalidFields(f"Invalid view. Must be one of: {', '.join(VIEWS)}")
+    return view, SUMMARY if view == "summary" else None
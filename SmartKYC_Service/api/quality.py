@@ -0,0 +1,140 @@
+# api/quality.py
+
+import os
+
+import numpy as np
+
+# Capture-quality thresholds per upload kind. Sharpness is the variance of
+# the Laplacian of the model-input variant (see api/preprocessing.py);
+# glare is the share of the image covered by clipped patches that are
+# brighter than the page around them; resolution is checked on the
+# original upload.
+THRESHOLDS = {
+    "document": {"min_sharpness": 60.0, "max_glare_ratio": 0.12, "min_short_side": 600},
+    "selfie": {"min_sharpness": 30.0, "max_glare_ratio": 0.20, "min_short_side": 240},
+}
+# The variant each kind is measured on
+GATED_VARIANT = {"document": "ocr", "selfie": "face"}
+
+GLARE_LEVEL = 250
+# Glare is measured on a grid of this many tiles along the longer side. A
+# tile is saturated when this share of its pixels is at GLARE_LEVEL or
+# above, and glare when its median gray level is also at least this much
+# above the page background's.
+GLARE_TILES = 32
+GLARE_TILE_SATURATED = 0.5
+GLARE_CONTRAST = 8
+
+# The gate can be switched off
+ENABLED = os.environ.get('SMARTKYC_QUALITY_GATE', '1') == '1'
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class QualityReport:
+    """The outcome of the gate: status is CLEAR, LOW_RESOLUTION, BLURRY or GLARE."""
+
+    __slots__ = ('status', 'reason', 'metrics')
+
+    def __init__(self, status, reason, metrics):
+        self.status = status
+        self.reason = reason
+        self.metrics = metrics
+
+    @property
+    def passed(self):
+        return self.status == "CLEAR"
+
+    def as_dict(self):
+        return {"status": self.status, "reason": self.reason, **self.metrics}
+
+
+# --- Measurements ---
+
+def _grayscale(array):
+    if array.ndim == 2:
+        return array
+    return (array.astype(np.float32) @ _LUMA).astype(np.uint8)
+
+
+def sharpness(gray):
+    """
+    Variance of the 4-neighbour Laplacian. Sharp edges (text, facial
+    features) give a high variance; defocus and motion blur flatten it.
+    """
+    image = np.asarray(gray, dtype=np.int16)
+    # Built in place in one int16 buffer (|value| <= 4 * 255)
+    laplacian = image[:-2, 1:-1] + image[2:, 1:-1]
+    laplacian += image[1:-1, :-2]
+    laplacian += image[1:-1, 2:]
+    laplacian -= 4 * image[1:-1, 1:-1]
+    return float(laplacian.var())
+
+
+def glare_ratio(gray):
+    """
+    Share of the image covered by glare: saturated tiles brighter than
+    the page background (the median of the tiles' median levels, so text
+    does not darken it). A white page scanned or photographed clipped is
+    itself saturated, so its background is not glare; a reflection on a
+    card or on paper under normal exposure is.
+    """
+    image = np.asarray(gray)
+    height, width = image.shape
+    tile = max(1, max(height, width) // GLARE_TILES)
+    rows, columns = height // tile, width // tile
+    if not rows or not columns:
+        return 0.0
+    tiles = image[:rows * tile, :columns * tile].reshape(rows, tile, columns, tile)
+
+    # Median level of each tile, over every other pixel in both directions
+    level = np.median(tiles[:, ::2, :, ::2].transpose(0, 2, 1, 3).reshape(rows, columns, -1), axis=2)
+    saturated = np.count_nonzero(tiles >= GLARE_LEVEL, axis=(1, 3)) >= GLARE_TILE_SATURATED * tile * tile
+    background = float(np.median(level))
+    glare = saturated & (level >= background + GLARE_CONTRAST)
+    return float(np.count_nonzero(glare)) / glare.size
+
+
+# --- Core Gate Function ---
+
+def check(model_inputs, kind):
+    """
+    Runs the gate on an upload's preprocessed variants. Checks run
+    cheapest first and stop at the first failure; the reason says what
+    to fix. Costs a few milliseconds, against seconds of inference.
+    """
+    limits = THRESHOLDS[kind]
+    metrics = {}
+
+    source_size = model_inputs.source_size
+    if source_size:
+        metrics["resolution"] = list(source_size)
+        if min(source_size) < limits["min_short_side"]:
+            return QualityReport(
+                "LOW_RESOLUTION",
+                f"Image resolution {source_size[0]}x{source_size[1]} is too low; "
+                f"the shorter side must be at least {limits['min_short_side']} pixels.",
+                metrics
+            )
+
+    gray = _grayscale(model_inputs.variants[GATED_VARIANT[kind]])
+
+    metrics["glare_ratio"] = round(glare_ratio(gray), 4)
+    if metrics["glare_ratio"] > limits["max_glare_ratio"]:
+        return QualityReport(
+            "GLARE",
+            f"Glare covers {metrics['glare_ratio']:.0%} of the image. "
+            "Retake the photo without direct light or reflections.",
+            metrics
+        )
+
+    metrics["sharpness"] = round(sharpness(gray), 1)
+    if metrics["sharpness"] < limits["min_sharpness"]:
+        return QualityReport(
+            "BLURRY",
+            f"Image is too blurry to read (sharpness {metrics['sharpness']:.1f}, "
+            f"minimum {limits['min_sharpness']:.0f}). Retake the photo in focus.",
+            metrics
+        )
+
+    return QualityReport("CLEAR", None, metrics)
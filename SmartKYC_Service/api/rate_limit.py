@@ -0,0 +1,187 @@
+# api/rate_limit.py
+
+import hashlib
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from rest_framework.throttling import BaseThrottle
+
+# Rate limiting is on unless disabled with SMARTKYC_RATE_LIMIT=0
+ENABLED = os.environ.get('SMARTKYC_RATE_LIMIT', '1') == '1'
+
+# Token buckets per scope and client dimension, as (burst capacity, period
+# in seconds): a bucket holds up to `capacity` tokens and refills at
+# capacity/period tokens per second. 'expensive' covers the endpoints that
+# call the AI layer (document, selfie, analyze) and is limited by default.
+# 'cheap' covers status reads and application starts; it has no buckets
+# unless SMARTKYC_RATE_LIMITS configures some (e.g. "cheap.ip=120/60"), so
+# status polls never write to the bucket store.
+DEFAULT_LIMITS = {
+    "expensive": {"ip": (20, 60), "api_key": (100, 60), "application": (10, 60)},
+}
+
+# Clients identify themselves with this header; without it only the IP
+# and application buckets apply.
+API_KEY_HEADER = 'X-API-Key'
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DB_FILE = os.environ.get('SMARTKYC_RATE_LIMIT_DB', os.path.join(DATA_DIR, 'rate_limits.sqlite3'))
+# Buckets untouched for this long are full again and are deleted
+IDLE_SEC = 3600
+CLEANUP_PROBABILITY = 0.001
+
+
+def _load_limits():
+    """
+    DEFAULT_LIMITS, overridden by SMARTKYC_RATE_LIMITS, e.g.
+    "expensive.ip=10/60,cheap.application=30/60". A capacity of 0 disables that bucket.
+    """
+    limits = {scope: dict(buckets) for scope, buckets in DEFAULT_LIMITS.items()}
+    for item in os.environ.get('SMARTKYC_RATE_LIMITS', '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            scope, dimension = name.strip().split('.', 1)
+            capacity, period = value.split('/', 1)
+            limits.setdefault(scope, {})[dimension] = (float(capacity), float(period))
+    return {
+        scope: {dimension: (capacity, capacity / period) for dimension, (capacity, period) in buckets.items()
+                if capacity > 0}
+        for scope, buckets in limits.items()
+    }
+
+
+LIMITS = _load_limits()
+
+
+# --- Shared Bucket Store ---
+
+class TokenBucketStore:
+    """
+    Token buckets in a SQLite database shared by every worker process.
+
+    A request takes one token from each of its buckets in a single
+    IMMEDIATE transaction: either every bucket has a token and all are
+    charged, or none is. Buckets are refilled lazily from the time of
+    their last update, so idle buckets cost nothing. WAL mode keeps reads
+    concurrent, and the state is not fsynced (losing it only refills the
+    buckets).
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets, now=None):
+        """
+        buckets: (key, capacity, refill_per_sec) triples. Returns
+        (allowed, retry_after_sec); retry_after_sec is 0 when allowed.
+        """
+        if not buckets:
+            return True, 0.0
+        now = time.time() if now is None else now
+        conn = self._connection()
+        keys = [key for key, _, _ in buckets]
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT key, tokens, updated FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            stored = {key: (tokens, updated) for key, tokens, updated in rows}
+
+            levels = []
+            retry_after = 0.0
+            for key, capacity, rate in buckets:
+                tokens, updated = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(now - updated, 0.0) * rate)
+                if tokens < 1.0:
+                    retry_after = max(retry_after, (1.0 - tokens) / rate)
+                levels.append((key, tokens - 1.0))
+
+            if retry_after == 0.0:
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    [(key, tokens, now) for key, tokens in levels]
+                )
+            if random.random() < CLEANUP_PROBABILITY:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - IDLE_SEC,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after == 0.0, retry_after
+
+
+_store = TokenBucketStore()
+
+
+# --- DRF Throttles ---
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Charges one token per request to the client IP, API key and
+    application_id buckets of the throttle's scope (see LIMITS). DRF
+    answers a rejection with 429 and a Retry-After header. A scope with
+    no buckets lets every request through without touching the store.
+
+    The client IP honours REST_FRAMEWORK['NUM_PROXIES'] like DRF's own throttles.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self._wait = None
+
+    def get_buckets(self, request, view):
+        limits = LIMITS.get(self.scope, {})
+        identities = {"ip": self.get_ident(request)}
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key:
+            # Only a digest of the key is stored
+            identities["api_key"] = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+        app_id = getattr(view, 'kwargs', {}).get('app_id')
+        if app_id is not None:
+            identities["application"] = str(app_id)
+
+        return [
+            (f"{self.scope}:{dimension}:{identity}", *limits[dimension])
+            for dimension, identity in identities.items() if identity and dimension in limits
+        ]
+
+    def allow_request(self, request, view):
+        if not ENABLED or not LIMITS.get(self.scope):
+            # Unthrottled scope: no identity hashing and no transaction
+            return True
+        allowed, retry_after = _store.take(self.get_buckets(request, view))
+        self._wait = math.ceil(retry_after) if not allowed else None
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class CheapRateThrottle(TokenBucketThrottle):
+    scope = "cheap"
+
+
+class ExpensiveRateThrottle(TokenBucketThrottle):
+    scope = "expensive"
@@ -0,0 +1,36 @@
+# api/records.py
+
+# Copy-on-write updates for application records.
+#
+# Records stay plain JSON dicts (the store formats, renderers and caches
+# all take them as they are), but the workflow never changes one in
+# place: each step returns a new record that shares every untouched
+# section with the old one and copies only the dicts on the changed
+# path. A step that fails halfway therefore leaves the stored record
+# exactly as it was, and a record someone else still holds (a cached
+# response, a batch's change list) never changes under them.
+#
+# Records and their sections must be treated as read-only; build changed
+# versions with evolve() and assoc_in().
+
+
+def evolve(record, **changes):
+    """Returns a copy of record with top-level keys replaced. Sections not named are shared."""
+    updated = dict(record)
+    updated.update(changes)
+    return updated
+
+
+def assoc_in(record, path, value):
+    """
+    Returns a copy of record with the value at `path` (a tuple of keys)
+    replaced. Only the dicts along the path are copied; missing or None
+    levels become new dicts.
+    """
+    key = path[0]
+    updated = dict(record) if record else {}
+    if len(path) == 1:
+        updated[key] = value
+    else:
+        updated[key] = assoc_in(updated.get(key), path[1:], value)
+    return updated
@@ -0,0 +1,46 @@
+# api/renderers.py
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types neither encoder handles natively (Decimal, lazy translation
+# strings, querysets, ...) go through DRF's encoder, as with JSONRenderer
+_drf_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """
+    Encodes data as compact UTF-8 JSON bytes: with orjson when it is
+    installed, otherwise with the stdlib json module and DRF's encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_drf_encoder.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONRenderer(BaseRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer (see REST_FRAMEWORK in
+    settings). Always compact; the ?indent media type parameter is ignored.
+
+    With orjson, datetimes are written in full ISO 8601 rather than DRF's
+    millisecond precision; the KYC records store timestamps as strings,
+    so their output is the same either way.
+    """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
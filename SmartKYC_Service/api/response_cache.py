@@ -0,0 +1,158 @@
+# api/response_cache.py
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Upper bounds on the cache; least recently used applications are evicted first
+MAX_ENTRIES = int(os.environ.get('SMARTKYC_RESPONSE_CACHE_ENTRIES', '10000'))
+MAX_BYTES = int(float(os.environ.get('SMARTKYC_RESPONSE_CACHE_MB', '64')) * 1024 * 1024)
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = int(os.environ.get('SMARTKYC_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class _AppEntry:
+    """The encoded bodies of one application version, per representation and encoding."""
+
+    __slots__ = ('version', 'bodies', 'size')
+
+    def __init__(self, version):
+        self.version = version
+        self.bodies = {}  # (representation, encoding) -> bytes
+        self.size = 0
+
+
+def _compress(raw, encoding):
+    if encoding == 'br':
+        return brotli.compress(raw, quality=BROTLI_QUALITY)
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class ResponseCache:
+    """
+    Encoded response bodies of GET /applications/<id>/, keyed by
+    application and tagged with the record version (updated_at) they were
+    encoded from.
+
+    A poll of an unchanged application returns the stored bytes: no JSON
+    encoding and no compression. A lookup with a different version misses
+    and drops the stale entry, so workers never serve an outdated body
+    even though only this process's commits invalidate entries directly
+    (see data_manager._record_changes).
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_or_encode(self, app_id, version, representation, accept_encoding, encode):
+        """
+        Returns (body, encoding, hit). On a miss, encode() produces the
+        uncompressed JSON; it and the negotiated compressed variant are
+        stored for the next poll.
+        """
+        raw = self._lookup(app_id, version, (representation, None))
+        hit = raw is not None
+        if raw is None:
+            raw = encode()
+
+        encoding = negotiate_encoding(accept_encoding, len(raw))
+        body = raw
+        if encoding is not None:
+            body = self._lookup(app_id, version, (representation, encoding)) if hit else None
+            if body is None:
+                hit = False
+                body = _compress(raw, encoding)
+
+        if hit:
+            with self._lock:
+                self.hits += 1
+            return body, encoding, True
+
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.get(app_id)
+            if entry is None or entry.version != version:
+                if entry is not None:
+                    self.size -= entry.size
+                entry = self._entries[app_id] = _AppEntry(version)
+            for key, variant in (((representation, None), raw), ((representation, encoding), body)):
+                if key not in entry.bodies:
+                    entry.bodies[key] = variant
+                    entry.size += len(variant)
+                    self.size += len(variant)
+            self._entries.move_to_end(app_id)
+            self._evict()
+        return body, encoding, False
+
+    def _lookup(self, app_id, version, key):
+        with self._lock:
+            entry = self._entries.get(app_id)
+            if entry is None:
+                return None
+            if entry.version != version:
+                # Written since it was cached (possibly by another worker)
+                del self._entries[app_id]
+                self.size -= entry.size
+                return None
+            body = entry.bodies.get(key)
+            if body is not None:
+                self._entries.move_to_end(app_id)
+            return body
+
+    def invalidate(self, app_ids):
+        with self._lock:
+            for app_id in app_ids:
+                entry = self._entries.pop(app_id, None)
+                if entry is not None:
+                    self.size -= entry.size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry.size
+
+
+_cache = ResponseCache()
+
+
+def negotiate_encoding(accept_encoding, size):
+    """
+    Picks 'br' or 'gzip' from an Accept-Encoding header for a body of
+    `size` bytes, or None to send it uncompressed.
+    """
+    if size < MIN_COMPRESS_BYTES or not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q=') and params[2:].strip('0.') == '':
+            continue  # q=0: explicitly refused
+        accepted.add(name.strip().lower())
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def get_or_encode(app_id, version, representation, accept_encoding, encode):
+    return _cache.get_or_encode(app_id, version, representation, accept_encoding, encode)
+
+
+def invalidate(app_ids):
+    _cache.invalidate(app_ids)
@@ -0,0 +1,304 @@
+# api/retention.py
+
+import glob
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from . import data_manager
+from . import face_index
+from . import identity_index
+from . import idempotency
+from . import preprocessing
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archive layout: data/archive/<YYYY>/<MM>/<DD>/<run_id>-<batch>.jsonl.<ext>
+ARCHIVE_DIR = os.path.join(data_manager.DATA_DIR, 'archive')
+CHECKPOINT_FILE = os.path.join(ARCHIVE_DIR, '_checkpoint.json')
+
+# Uploaded blobs (documents, selfies) are stored relative to this directory
+BLOB_ROOT = os.path.dirname(data_manager.DATA_DIR)
+
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+COMPRESSIONS = {"gzip": "gz"}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = "zst"
+
+logger = logging.getLogger(__name__)
+
+
+# --- Helper Functions ---
+
+def _parse_timestamp(value):
+    """Parses the store's ISO 8601 'Z' timestamps into naive UTC datetimes."""
+    try:
+        return datetime.fromisoformat(str(value).rstrip('Z'))
+    except ValueError:
+        return None
+
+
+def is_expired(app, cutoff):
+    """True if the application is in a terminal state and was last updated before cutoff."""
+    if not data_manager.is_terminal_status(app.get('status')):
+        return False
+    updated_at = _parse_timestamp(app.get('updated_at') or app.get('created_at'))
+    return updated_at is not None and updated_at < cutoff
+
+
+def _write_checkpoint(state):
+    tmp_file = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+
+def load_checkpoint():
+    """Returns the checkpoint of an unfinished run, or None."""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    with open(CHECKPOINT_FILE, 'r') as f:
+        state = json.load(f)
+    return None if state.get('phase') == 'completed' else state
+
+
+def _open_compressed(path, compression):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb', compresslevel=6)
+
+
+def _archive_batch(batch, run_id, batch_number, compression):
+    """
+    Writes one batch to its date partitions.
+
+    Each (partition, batch) pair gets its own file, written to a temp name
+    and renamed, so re-running a half-finished batch simply replaces it.
+    """
+    partitions = {}
+    for app in batch:
+        updated_at = _parse_timestamp(app.get('updated_at') or app.get('created_at')) or datetime.utcnow()
+        partitions.setdefault(updated_at.strftime('%Y/%m/%d'), []).append(app)
+
+    written = []
+    for partition, apps in partitions.items():
+        directory = os.path.join(ARCHIVE_DIR, partition)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{run_id}-{batch_number:06d}.jsonl.{COMPRESSIONS[compression]}")
+
+        tmp_file = f"{path}.tmp"
+        with _open_compressed(tmp_file, compression) as f:
+            for app in apps:
+                f.write(json.dumps(app, separators=(',', ':')).encode('utf-8') + b'\n')
+        with open(tmp_file, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        written.append(path)
+
+    return written
+
+
+def _remove_batch_files(run_id, batch_number):
+    """
+    Deletes every partition file (and temp file) of one batch, so a batch
+    interrupted while archiving can be written again from scratch.
+    """
+    pattern = os.path.join(ARCHIVE_DIR, '*', '*', '*', f"{run_id}-{batch_number:06d}.jsonl.*")
+    for path in glob.glob(pattern):
+        os.remove(path)
+
+
+def _blob_paths(app):
+    documents = app.get('documents') or {}
+    entries = [documents.get('id_document'), documents.get('address_proof'), app.get('selfie')]
+    return [entry['file_path'] for entry in entries if entry and entry.get('file_path')]
+
+
+def purge_blobs(app):
+    """Deletes the document and selfie files of an application. Returns the number deleted."""
+    deleted = 0
+    root = os.path.realpath(BLOB_ROOT)
+    for relative_path in _blob_paths(app):
+        path = os.path.realpath(os.path.join(root, relative_path))
+        # Never follow a stored path outside the blob root
+        if not path.startswith(root + os.sep):
+            continue
+        if os.path.isfile(path):
+            os.remove(path)
+            deleted += 1
+    return deleted
+
+
+def _content_hashes(app):
+    """Content hashes of the preprocessed uploads (model_info.input) of an application."""
+    documents = app.get('documents') or {}
+    model_infos = [(entry or {}).get('model_info') for entry in documents.values()]
+    model_infos.append(((app.get('selfie') or {}).get('ai_analysis') or {}).get('model_info'))
+    return [
+        info['input']['content_hash'] for info in model_infos
+        if info and (info.get('input') or {}).get('content_hash')
+    ]
+
+
+def purge_removed(apps, purge_files):
+    """
+    Drops what the service still holds about applications removed from
+    the store: their identity and face index keys and their stored
+    idempotent responses. With purge_files, their document and selfie
+    files and preprocessed variants are deleted too.
+    Returns the number of blobs deleted.
+    """
+    app_ids = [app['application_id'] for app in apps]
+    identity_index.unregister_applications(app_ids)
+    face_index.remove_applications(app_ids)
+    idempotency.purge_applications(app_ids)
+    if not purge_files:
+        return 0
+    preprocessing.purge(digest for app in apps for digest in _content_hashes(app))
+    return sum(purge_blobs(app) for app in apps)
+
+
+# --- Core Retention Function ---
+
+def run_retention(max_age_days=DEFAULT_MAX_AGE_DAYS, batch_size=DEFAULT_BATCH_SIZE, compression="gzip",
+                  purge=False, dry_run=False, log=None):
+    """
+    Archives terminal applications older than max_age_days and removes them
+    from the hot store, batch by batch.
+
+    Each batch is written to the archive, removed from the store in one
+    commit, dropped from the indexes and the idempotency store, has its
+    blobs and preprocessed variants purged (purge=True), and is then
+    checkpointed. An interrupted run is resumed from
+    data/archive/_checkpoint.json with the same run id and cutoff.
+
+    Progress goes to log (e.g. a management command's stdout.write), or to
+    the module logger.
+
+    Returns a summary dict.
+    """
+    log = log or _log
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}'. Available: {', '.join(COMPRESSIONS)}")
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    state = load_checkpoint()
+
+    if state:
+        log(f"Resuming retention run {state['run_id']} at batch {state['batch_number']}.")
+        # A batch may have been partly written: drop its partition files and
+        # archive the saved batch again under the same batch number
+        if state['phase'] == 'archiving' and not dry_run:
+            _remove_batch_files(state['run_id'], state['batch_number'])
+            wanted = set(state['batch_ids'])
+            apps = [app for app in data_manager.iter_applications() if app['application_id'] in wanted]
+            state['batch_ids'] = [app['application_id'] for app in apps]
+            state['batch_files'] = _archive_batch(apps, state['run_id'], state['batch_number'],
+                                                  state['compression'])
+            state['phase'] = 'archived'
+            _write_checkpoint(state)
+        # A batch may have been archived but not yet removed from the store
+        if state['phase'] == 'archived' and not dry_run:
+            data_manager.delete_applications(state['batch_ids'])
+            for path in state['batch_files']:
+                state['blobs_purged'] += purge_removed(list(iter_archive(path)), state['purge'])
+            state['archived'] += len(state['batch_ids'])
+            state['phase'] = 'removed'
+            _write_checkpoint(state)
+    else:
+        cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+        state = {
+            "run_id": datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8],
+            "cutoff": cutoff.isoformat() + "Z",
+            "compression": compression,
+            "purge": purge,
+            "batch_number": 0,
+            "batch_ids": [],
+            "batch_files": [],
+            "phase": "started",
+            "archived": 0,
+            "blobs_purged": 0
+        }
+
+    cutoff = _parse_timestamp(state['cutoff'])
+
+    if dry_run:
+        count = sum(1 for app in data_manager.iter_applications() if is_expired(app, cutoff))
+        log(f"Dry run: {count} application(s) older than {state['cutoff']} would be archived.")
+        return {**state, "would_archive": count}
+
+    def process(batch):
+        state['batch_number'] += 1
+        state['batch_ids'] = [app['application_id'] for app in batch]
+
+        state['phase'] = 'archiving'
+        _write_checkpoint(state)
+        state['batch_files'] = _archive_batch(batch, state['run_id'], state['batch_number'], state['compression'])
+
+        state['phase'] = 'archived'
+        _write_checkpoint(state)
+        removed = data_manager.delete_applications(state['batch_ids'])
+        state['blobs_purged'] += purge_removed(batch, state['purge'])
+
+        state['archived'] += len(removed)
+        state['phase'] = 'removed'
+        _write_checkpoint(state)
+        log(f"Batch {state['batch_number']}: archived {len(removed)} application(s) "
+            f"to {len(state['batch_files'])} file(s).")
+
+    # One streaming pass. Removals replace the store file, which does not
+    # disturb the snapshot (or the already-loaded dict) being iterated.
+    batch = []
+    for app in data_manager.iter_applications():
+        if is_expired(app, cutoff):
+            batch.append(app)
+            if len(batch) >= batch_size:
+                process(batch)
+                batch = []
+    if batch:
+        process(batch)
+
+    state['phase'] = 'completed'
+    state['batch_ids'] = []
+    state['batch_files'] = []
+    _write_checkpoint(state)
+    return state
+
+
+def _log(message):
+    logger.info(message, extra={"stage": "retention"})
+
+
+def iter_archive(path):
+    """Yields the applications stored in one archive file."""
+    if path.endswith('.zst'):
+        with open(path, 'rb') as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            buffer = b''
+            while True:
+                chunk = reader.read(1 << 16)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        return
+
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
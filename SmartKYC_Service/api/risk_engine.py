@@ -0,0 +1,618 @@
+# api/risk_engine.py
+
+import bisect
+import json
+import logging
+import operator
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from . import identity_index
+from . import tracing
+from . import watchlist
+
+# Rules are looked up in this order; the first file found wins.
+# Files under data/ let operators override the bundled defaults without a deploy.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+RULES_FILES = [
+    os.path.join(DATA_DIR, 'risk_rules.yaml'),
+    os.path.join(DATA_DIR, 'risk_rules.yml'),
+    os.path.join(DATA_DIR, 'risk_rules.json'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_rules.json'),
+]
+
+# How often (seconds) to check the rules file for changes
+RELOAD_CHECK_SEC = 2.0
+
+# Score given when no application can be scored safely (no usable rules
+# file, unreadable identity index): the decision is always MANUAL_REVIEW
+FAIL_CLOSED_SCORE = 50
+
+logger = logging.getLogger(__name__)
+
+
+class RuleError(ValueError):
+    """Raised when a rules file is malformed."""
+
+
+# --- Feature Extraction ---
+
+def extract_features(app, duplicates=None, hits=None):
+    """
+    Extracts the named risk features of one application.
+    Every feature a rule can reference is produced here.
+
+    duplicates / hits: the identity index and watchlist lookups, when the
+    caller already made them for a whole batch (see extract_features_batch).
+    """
+    documents = app.get('documents') or {}
+    id_doc = documents.get('id_document') or {}
+    addr_doc = documents.get('address_proof') or {}
+    id_status = (id_doc.get('forensics') or {}).get('status')
+    addr_status = (addr_doc.get('forensics') or {}).get('status')
+
+    selfie_analysis = (app.get('selfie') or {}).get('ai_analysis')
+    face_match = (selfie_analysis or {}).get('face_match') or {}
+
+    extracted = app.get('extracted_data')
+    fused = extracted or {}
+    id_name = f"{fused.get('first_name', '')} {fused.get('last_name', '')}".strip()
+    addr_name = fused.get('name', '') or ''
+    screened_name = id_name or addr_name
+
+    if duplicates is None:
+        duplicates = identity_index.find_duplicates(app.get('application_id'), extracted)
+    if hits is None:
+        hits = watchlist.screen_name(screened_name) if screened_name else []
+
+    return {
+        "id_status": id_status,
+        "addr_status": addr_status,
+        "documents_missing": id_status is None or addr_status is None,
+        "selfie_missing": selfie_analysis is None,
+        "selfie_status": (selfie_analysis or {}).get('status'),
+        "selfie_failed": selfie_analysis is not None and selfie_analysis.get('status') != 'CLEAR',
+        "selfie_reason": (selfie_analysis or {}).get('reason'),
+        "match_score": face_match.get('match_score', 0) if selfie_analysis is not None else None,
+        "duplicate_faces": len(face_match.get('duplicate_faces') or []),
+        "extracted_missing": extracted is None,
+        "id_name": id_name,
+        "addr_name": addr_name,
+        "name_mismatch": bool(id_name and addr_name and id_name.lower() != addr_name.lower()),
+        "duplicate_documents": len(duplicates['document_number']),
+        "duplicate_dob_names": len(duplicates['dob_name']),
+        "screened_name": screened_name,
+        "watchlist_hits": hits,
+        "watchlist_hit": bool(hits),
+        "sanctions_hit": any(hit['list_type'] == "SANCTIONS" for hit in hits),
+    }
+
+
+def _screened_name(app):
+    fused = app.get('extracted_data') or {}
+    id_name = f"{fused.get('first_name', '')} {fused.get('last_name', '')}".strip()
+    return id_name or fused.get('name', '') or ''
+
+
+def extract_features_batch(applications):
+    """
+    extract_features for many applications. The identity index keys of the
+    whole batch are looked up together, and each distinct name is screened
+    against the watchlist once; the rest is per application.
+    """
+    duplicates = identity_index.find_duplicates_batch(
+        (app.get('application_id'), app.get('extracted_data')) for app in applications
+    )
+    index = watchlist.get_index()
+    screened = {}
+    rows = []
+    for app, app_duplicates in zip(applications, duplicates):
+        name = _screened_name(app)
+        if name not in screened:
+            screened[name] = index.screen(name) if name else []
+        rows.append(extract_features(app, duplicates=app_duplicates, hits=screened[name]))
+    return rows
+
+
+def feature_columns(rows):
+    """
+    Converts a list of feature dicts into NumPy columns.
+
+    bool features become bool arrays, numeric features become float64
+    (None -> NaN) and everything else stays an object array.
+    """
+    columns = {}
+    for name in rows[0] if rows else ():
+        values = [row[name] for row in rows]
+        if all(isinstance(v, bool) for v in values):
+            columns[name] = np.array(values, dtype=bool)
+        elif all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+            columns[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            columns[name] = column
+    return columns
+
+
+# --- Rule Compilation ---
+
+_COMPARISONS = {
+    "eq": operator.eq, "ne": operator.ne,
+    "lt": operator.lt, "le": operator.le,
+    "gt": operator.gt, "ge": operator.ge,
+}
+
+
+def _compile_condition(spec):
+    """
+    Compiles a condition into a pair of closures:
+    (scalar: features -> bool, vector: columns -> bool array).
+    """
+    if 'all' in spec or 'any' in spec:
+        combine_all = 'all' in spec
+        parts = [_compile_condition(part) for part in spec['all' if combine_all else 'any']]
+        scalar_parts = [part[0] for part in parts]
+        vector_parts = [part[1] for part in parts]
+
+        if combine_all:
+            if len(scalar_parts) == 2:
+                first, second = scalar_parts
+                scalar = lambda f: first(f) and second(f)  # noqa: E731
+            else:
+                scalar = lambda f: all(part(f) for part in scalar_parts)  # noqa: E731
+
+            def vector(c):
+                mask = vector_parts[0](c)
+                for part in vector_parts[1:]:
+                    mask = mask & part(c)
+                return mask
+        else:
+            if len(scalar_parts) == 2:
+                first, second = scalar_parts
+                scalar = lambda f: first(f) or second(f)  # noqa: E731
+            else:
+                scalar = lambda f: any(part(f) for part in scalar_parts)  # noqa: E731
+
+            def vector(c):
+                mask = vector_parts[0](c)
+                for part in vector_parts[1:]:
+                    mask = mask | part(c)
+                return mask
+
+        return scalar, vector
+
+    if 'not' in spec:
+        inner_scalar, inner_vector = _compile_condition(spec['not'])
+        return (lambda f: not inner_scalar(f)), (lambda c: ~inner_vector(c))
+
+    try:
+        name, op = spec['feature'], spec['op']
+    except (KeyError, TypeError):
+        raise RuleError(f"Invalid condition: {spec!r}")
+    value = spec.get('value')
+
+    if op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+
+        if op == "eq":
+            scalar = lambda f: f[name] == value  # noqa: E731
+        elif op == "ne":
+            scalar = lambda f: f[name] != value  # noqa: E731
+        else:
+            # Missing values never satisfy an ordering comparison
+            def scalar(f):
+                current = f[name]
+                return current is not None and compare(current, value)
+
+        def vector(c):
+            column = c[name]
+            if column.dtype == object and op not in ("eq", "ne"):
+                return np.fromiter((v is not None and compare(v, value) for v in column), bool, len(column))
+            return np.asarray(compare(column, value), dtype=bool)
+
+        return scalar, vector
+
+    if op in ("in", "not_in"):
+        members = frozenset(value or ())
+        negate = op == "not_in"
+        return (
+            lambda f: (f[name] in members) != negate,
+            lambda c: np.fromiter(((v in members) != negate for v in c[name]), bool, len(c[name]))
+        )
+
+    if op in ("present", "missing"):
+        want = op == "present"
+
+        def vector(c):
+            column = c[name]
+            if column.dtype == object:
+                mask = np.fromiter((v is not None for v in column), bool, len(column))
+            elif column.dtype == np.float64:
+                mask = ~np.isnan(column)
+            else:
+                mask = np.ones(len(column), dtype=bool)
+            return mask if want else ~mask
+
+        return (lambda f: (f[name] is not None) == want), vector
+
+    if op in ("truthy", "falsy"):
+        want = op == "truthy"
+
+        def vector(c):
+            column = c[name]
+            if column.dtype == bool:
+                mask = column
+            elif column.dtype == np.float64:
+                mask = (column != 0) & ~np.isnan(column)
+            else:
+                mask = np.fromiter((bool(v) for v in column), bool, len(column))
+            return mask if want else ~mask
+
+        return (lambda f: bool(f[name]) == want), vector
+
+    raise RuleError(f"Unknown operator '{op}' in condition {spec!r}")
+
+
+def _compile_points(spec):
+    """
+    Compiles a rule's points into (scalar, vector) closures.
+
+    Points are either a constant or a linear function of one feature:
+    {"feature": name, "origin": o, "scale": s} -> (value - o) * s
+    """
+    if isinstance(spec, (int, float)):
+        return (lambda f: spec), (lambda c, n: np.full(n, spec, dtype=np.float64))
+
+    try:
+        name = spec['feature']
+        origin = spec.get('origin', 0)
+        scale = spec.get('scale', 1)
+    except (KeyError, TypeError, AttributeError):
+        raise RuleError(f"Invalid points: {spec!r}")
+
+    return (
+        lambda f: (f[name] - origin) * scale,
+        lambda c, n: (c[name] - origin) * scale
+    )
+
+
+def _compile_explanation(rule):
+    """Compiles a rule's explanation into a closure returning a list of strings."""
+    template = rule.get('explanation')
+    if not template:
+        return lambda f: []
+
+    each = rule.get('explanation_each')
+    if each:
+        return lambda f: [template.format_map({**f, "item": item}) for item in f[each]]
+    return lambda f: [template.format_map(f)]
+
+
+_ORDERINGS = ("lt", "le", "gt", "ge")
+
+
+def _plan_conditions(rules, specs):
+    """
+    Groups the rules' conditions so the scalar path tests each distinct
+    condition once per application: identical conditions are shared, and
+    ordering comparisons of one feature against constant thresholds are
+    answered with a single bisect over the sorted thresholds.
+
+    Returns a list of closures: features -> indices of the rules that fire.
+    """
+    thresholds = {}  # (feature, op) -> [(value, rule index)]
+    shared = {}  # canonical condition -> [rule indices]
+    for index, spec in enumerate(specs):
+        when = spec['when']
+        value = when.get('value')
+        if when.get('op') in _ORDERINGS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            thresholds.setdefault((when['feature'], when['op']), []).append((value, index))
+        else:
+            shared.setdefault(json.dumps(when, sort_keys=True), []).append(index)
+
+    groups = []
+    for indices in shared.values():
+        groups.append(_shared_group(rules[indices[0]].test, tuple(indices)))
+    for (name, op), entries in thresholds.items():
+        entries.sort()
+        groups.append(_threshold_group(name, op, [value for value, _ in entries], [index for _, index in entries]))
+    return groups
+
+
+def _shared_group(test, indices):
+    return lambda f: indices if test(f) else ()
+
+
+def _threshold_group(name, op, values, indices):
+    # values ascending; 'lt'/'le' fire for the thresholds above the feature, 'gt'/'ge' for those below
+    if op == "lt":
+        return lambda f: () if f[name] is None else indices[bisect.bisect_right(values, f[name]):]
+    if op == "le":
+        return lambda f: () if f[name] is None else indices[bisect.bisect_left(values, f[name]):]
+    if op == "gt":
+        return lambda f: () if f[name] is None else indices[:bisect.bisect_left(values, f[name])]
+    return lambda f: () if f[name] is None else indices[:bisect.bisect_right(values, f[name])]
+
+
+class CompiledRule:
+    """One rule compiled into closures."""
+
+    __slots__ = ('id', 'test', 'test_vector', 'points', 'points_vector', 'explain', 'flags')
+
+    def __init__(self, spec):
+        if 'id' not in spec or 'when' not in spec:
+            raise RuleError(f"Rule is missing 'id' or 'when': {spec!r}")
+
+        self.id = spec['id']
+        self.test, self.test_vector = _compile_condition(spec['when'])
+        self.points, self.points_vector = _compile_points(spec.get('points', 0))
+        self.explain = _compile_explanation(spec)
+        # A rule that fires with points or an explanation means the application is not "clean"
+        self.flags = bool(spec.get('explanation')) or spec.get('points', 0) != 0
+
+
+class RuleSet:
+    """
+    A compiled rules file: a flat list of rules plus the decision bands.
+
+    evaluate() is the scalar path used per application, evaluate_columns()
+    is the vectorized path used by the batch re-scorer. Both apply the
+    rules in file order so their scores are identical. The scalar path
+    tests grouped conditions (see _plan_conditions) except on the sampled
+    evaluations that time every rule.
+    """
+
+    # True for the rule set that sends everything to manual review
+    fail_closed = False
+
+    def __init__(self, config, source=None):
+        self.source = source
+        self.version = config.get('version')
+        specs = config.get('rules', [])
+        self.rules = [CompiledRule(spec) for spec in specs]
+        self._groups = _plan_conditions(self.rules, specs)
+        self.timing_sample_rate = float(config.get('timing_sample_rate', 0))
+
+        clean = config.get('clean', {})
+        self.clean_score = tuple(clean.get('base_score', (5, 15)))
+        self.clean_explanations = list(clean.get('explanations', []))
+
+        self.bands = []
+        for band in config.get('decision_bands', []):
+            self.bands.append((band.get('below'), band['decision']))
+        if not self.bands or self.bands[-1][0] is not None:
+            raise RuleError("The last decision band must have no 'below' limit.")
+
+        ids = [rule.id for rule in self.rules]
+        if len(ids) != len(set(ids)):
+            raise RuleError("Rule ids must be unique.")
+
+        # rule_id -> [evaluations, total_ns]
+        self._timings = {rule_id: [0, 0] for rule_id in ids}
+        self._timings_lock = threading.Lock()
+
+    # --- Scalar Path ---
+
+    def decide(self, risk_score):
+        for below, decision in self.bands:
+            if below is None or risk_score < below:
+                return decision
+
+    def evaluate(self, features, timed=None, rng=None):
+        """
+        Evaluates every rule against one feature dict.
+        Returns (risk_score, decision, explanations). rng (a random.Random)
+        draws the score of a clean application; the module's by default.
+        """
+        if timed is None:
+            timed = self.timing_sample_rate > 0 and random.random() < self.timing_sample_rate
+
+        risk_score = 0
+        explanations = []
+        flagged = False
+
+        if timed:
+            timings = []
+            clock = time.perf_counter_ns
+            for rule in self.rules:
+                start = clock()
+                if rule.test(features):
+                    risk_score += rule.points(features)
+                    explanations += rule.explain(features)
+                    flagged = flagged or rule.flags
+                timings.append(clock() - start)
+            self._record_timings(timings)
+        else:
+            fired = []
+            for group in self._groups:
+                fired += group(features)
+            fired.sort()
+            rules = self.rules
+            for index in fired:
+                rule = rules[index]
+                risk_score += rule.points(features)
+                explanations += rule.explain(features)
+                flagged = flagged or rule.flags
+
+        if not flagged:
+            risk_score = (rng or random).randint(*self.clean_score)
+            explanations = list(self.clean_explanations)
+
+        risk_score = min(max(int(risk_score), 0), 100)  # Clamp score between 0 and 100
+        return risk_score, self.decide(risk_score), explanations
+
+    def _record_timings(self, timings):
+        with self._timings_lock:
+            for rule, elapsed in zip(self.rules, timings):
+                entry = self._timings[rule.id]
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def rule_timings(self):
+        """Returns {rule_id: {'evaluations', 'mean_us'}} from the sampled evaluations."""
+        with self._timings_lock:
+            return {
+                rule_id: {
+                    "evaluations": count,
+                    "mean_us": round(total / count / 1000, 3) if count else None
+                }
+                for rule_id, (count, total) in self._timings.items()
+            }
+
+    # --- Vectorized Path ---
+
+    def evaluate_columns(self, columns, rows, rng=None):
+        """
+        Evaluates every rule over columnar features in one pass per rule.
+        Returns (risk_scores, decisions, explanations_per_row).
+        """
+        rng = rng or np.random.default_rng()
+        n = len(rows)
+
+        risk_scores = np.zeros(n, dtype=np.float64)
+        flagged = np.zeros(n, dtype=bool)
+        masks = []
+        for rule in self.rules:
+            mask = rule.test_vector(columns)
+            masks.append(mask)
+            if mask.any():
+                risk_scores += np.where(mask, rule.points_vector(columns, n), 0)
+                if rule.flags:
+                    flagged |= mask
+
+        low, high = self.clean_score
+        risk_scores = np.where(flagged, risk_scores, rng.integers(low, high + 1, size=n))
+        risk_scores = np.clip(np.trunc(risk_scores), 0, 100).astype(np.int64)
+
+        decisions = np.empty(n, dtype=object)
+        remaining = np.ones(n, dtype=bool)
+        for below, decision in self.bands:
+            band = remaining if below is None else remaining & (risk_scores < below)
+            decisions[band] = decision
+            remaining &= ~band
+
+        explanations = []
+        fired = np.column_stack(masks) if masks else np.zeros((n, 0), dtype=bool)
+        for i in range(n):
+            if not flagged[i]:
+                explanations.append(list(self.clean_explanations))
+                continue
+            row_explanations = []
+            for rule_index in np.flatnonzero(fired[i]):
+                row_explanations.extend(self.rules[rule_index].explain(rows[i]))
+            explanations.append(row_explanations)
+
+        return risk_scores, decisions, explanations
+
+
+# --- Loading & Hot Reload ---
+
+def load_rules_file(path):
+    """Parses a JSON or YAML rules file into a dict."""
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml  # Optional dependency, only needed for YAML rules
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+_state = {"rules": None, "path": None, "mtime": None, "checked_at": 0.0}
+_lock = threading.Lock()
+
+
+def _current_file():
+    for path in RULES_FILES:
+        if os.path.exists(path):
+            return path, os.path.getmtime(path)
+    raise RuleError("No risk rules file found.")
+
+
+def fail_closed_rules(reason):
+    """
+    A rule set with no rules that sends every application to MANUAL_REVIEW,
+    explaining why it could not be scored.
+    """
+    rules = RuleSet({
+        "clean": {
+            "base_score": [FAIL_CLOSED_SCORE, FAIL_CLOSED_SCORE],
+            "explanations": [f"Automated risk scoring unavailable ({reason}); sent to manual review."]
+        },
+        "decision_bands": [{"decision": "MANUAL_REVIEW"}]
+    })
+    rules.fail_closed = True
+    return rules
+
+
+def get_rules():
+    """
+    Returns the compiled rule set, recompiling it when the rules file changes.
+
+    A malformed file is reported and the previous rule set keeps serving,
+    so an edit never takes workers down. With no usable rules at all
+    (missing or malformed file on first load) the fail-closed rule set
+    serves until the file changes.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _state["rules"] is not None and now - _state["checked_at"] < RELOAD_CHECK_SEC:
+            return _state["rules"]
+        _state["checked_at"] = now
+
+        try:
+            path, mtime = _current_file()
+        except RuleError:
+            path = mtime = None
+        if _state["rules"] is None or (path, mtime) != (_state["path"], _state["mtime"]):
+            try:
+                if path is None:
+                    raise RuleError("No risk rules file found.")
+                rules = RuleSet(load_rules_file(path), source=path)
+            except Exception as e:
+                if _state["rules"] is None or _state["rules"].fail_closed:
+                    logger.error("No usable risk rules, sending applications to manual review",
+                                 extra={"stage": "risk", "path": path, "error": str(e)})
+                    _state["rules"] = fail_closed_rules("risk rules unavailable")
+                else:
+                    logger.warning("Keeping previous risk rules", extra={"stage": "risk", "path": path, "error": str(e)})
+            else:
+                _state["rules"] = rules
+            _state["path"] = path
+            _state["mtime"] = mtime
+
+        return _state["rules"]
+
+
+@tracing.traced("risk_engine.evaluate")
+def evaluate(app, rules=None):
+    """
+    Scores one application. Returns (risk_score, decision, explanations).
+    Pass the RuleSet the caller reports the version of, so a reload in
+    between cannot mix two rule sets. An unreadable identity index sends
+    the application to MANUAL_REVIEW.
+    """
+    try:
+        features = extract_features(app)
+    except identity_index.CorruptIndexError:
+        # Logged by identity_index; without the duplicate check nothing is approved
+        return fail_closed_rules("duplicate check unavailable").evaluate({})
+    return (rules or get_rules()).evaluate(features)
+
+
+def evaluate_batch(applications, rng=None, rules=None):
+    """
+    Scores many applications with the vectorized path: batched lookups
+    (extract_features_batch), then every rule applied to whole columns.
+    Scores, decisions and explanations match evaluate() for every
+    application; only the score drawn for a clean application differs.
+    """
+    try:
+        rows = extract_features_batch(applications)
+    except identity_index.CorruptIndexError:
+        rows = [{} for _ in applications]
+        return fail_closed_rules("duplicate check unavailable").evaluate_columns({}, rows, rng=rng)
+    return (rules or get_rules()).evaluate_columns(feature_columns(rows), rows, rng=rng)
@@ -0,0 +1,484 @@
+# api/stats.py
+
+import atexit
+import glob
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from . import file_lock
+
+# Define the path to our checkpoint file (kept next to applications.json)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+CHECKPOINT_FILE = os.path.join(DATA_DIR, 'stats_checkpoint.json')
+
+# Counters are written to the checkpoint at most this often
+CHECKPOINT_INTERVAL_SEC = float(os.environ.get('SMARTKYC_STATS_CHECKPOINT_SEC', '30'))
+
+# AI layers whose processing time is tracked
+LAYERS = ("document", "biometric", "risk")
+
+# Funnel stages, and the statuses that mean an application has reached them
+FUNNEL_STAGES = {
+    "documents_done": ("PENDING_SELFIE", "PENDING_RISK_ANALYSIS", "APPROVED", "MANUAL_REVIEW", "REJECTED",
+                       "REJECTED_REJECTED_MISMATCH", "REJECTED_REJECTED_LIVENESS"),
+    "selfie_done": ("PENDING_RISK_ANALYSIS", "APPROVED", "MANUAL_REVIEW", "REJECTED"),
+    "decided": ("APPROVED", "MANUAL_REVIEW", "REJECTED"),
+}
+DECISIONS = ("APPROVED", "MANUAL_REVIEW", "REJECTED")
+
+
+class QuantileSketch:
+    """
+    A log-bucketed streaming quantile sketch (DDSketch style).
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is returned within `relative_accuracy` of the true value, in
+    constant memory (a few hundred buckets cover microseconds to hours).
+    Sketches are plain dicts on disk and merge by adding counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        if value is None:
+            return
+        value = float(value)
+        if value <= 1e-9:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket, in relative terms
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else None,
+            "p50": _round(self.quantile(0.5)),
+            "p90": _round(self.quantile(0.9)),
+            "p99": _round(self.quantile(0.99)),
+        }
+
+    def merge(self, other):
+        """Adds another sketch's counts (same relative_accuracy) to this one."""
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): v for k, v in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('relative_accuracy', 0.01))
+        sketch.buckets = {int(k): v for k, v in data.get('buckets', {}).items()}
+        sketch.zero_count = data.get('zero_count', 0)
+        sketch.count = data.get('count', 0)
+        sketch.total = data.get('total', 0.0)
+        return sketch
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+# --- Checkpoints ---
+#
+# Every worker process counts the commits it makes itself, so no single
+# process can write the totals. stats_checkpoint.json is the shared base
+# (written by a rebuild); each worker writes only its own changes since
+# it started to stats-<host>-<pid>-<token>.json, and reads add all of them
+# to the base, as the profiling sampler's per-worker files are merged.
+# Files of workers that have exited are folded into the base under a file
+# lock. A rebuild starts a new generation, which makes the worker files of
+# the previous one obsolete.
+
+WORKER_FILE_GLOB = 'stats-*.json'
+LOCK_FILE = os.path.join(DATA_DIR, 'stats.lock')
+
+# Tokens of folded worker files remembered by the base (guards against a
+# crash between writing the base and removing the file)
+ABSORBED_KEEP = 1000
+
+_lock = threading.Lock()
+_state = {
+    "base": None,           # the shared base: generation, statuses, sketches, rebuilt_at, absorbed
+    "base_version": None,
+    "pid": None,
+    "token": None,
+    "generation": None,     # the base generation this worker's changes apply to
+    "statuses": {},         # this worker's status count changes (may be negative)
+    "sketches": {},
+    "last_checkpoint": 0.0,
+    "dirty": False
+}
+
+
+def _empty_sketches():
+    return {layer: QuantileSketch() for layer in LAYERS}
+
+
+def _parse_counts(data):
+    statuses = dict(data.get('statuses', {}))
+    sketches = {layer: QuantileSketch.from_dict(data.get('sketches', {}).get(layer, {})) for layer in LAYERS}
+    return statuses, sketches
+
+
+def _dump_counts(statuses, sketches):
+    return {
+        "statuses": statuses,
+        "sketches": {layer: sketch.to_dict() for layer, sketch in sketches.items()}
+    }
+
+
+def _add_statuses(target, source):
+    for status, count in source.items():
+        total = target.get(status, 0) + count
+        if total:
+            target[status] = total
+        else:
+            target.pop(status, None)
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_file = file_lock.tmp_path(path)
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_file, path)
+
+
+def _worker_files():
+    """Yields (path, data) for every readable worker file."""
+    for path in glob.glob(os.path.join(DATA_DIR, WORKER_FILE_GLOB)):
+        data = _read_json(path)
+        if data is not None:
+            yield path, data
+
+
+def _is_alive(data):
+    """False only for a worker of this host whose process has exited."""
+    if data.get('host') != socket.gethostname():
+        return True
+    try:
+        os.kill(data.get('pid'), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, TypeError):
+        pass
+    return True
+
+
+def _ensure_loaded():
+    """
+    (Re)loads the base when it changed on disk, or rebuilds from the store
+    if there is none, and resets this worker's changes when it is a new
+    process (after a fork) or the base is a new generation. Returns True if
+    it rebuilt, i.e. the counters already reflect everything committed so far.
+    """
+    rebuilt = False
+    version = _file_version(CHECKPOINT_FILE)
+    if version is None or version != _state['base_version']:
+        data = _read_json(CHECKPOINT_FILE) if version is not None else None
+        if data is None or 'generation' not in data:
+            # No usable checkpoint: fall back to one full scan
+            from . import data_manager
+            _rebuild_locked(data_manager.iter_applications())
+            rebuilt = True
+        else:
+            statuses, sketches = _parse_counts(data)
+            _state['base'] = {
+                "generation": data['generation'],
+                "statuses": statuses,
+                "sketches": sketches,
+                "rebuilt_at": data.get('rebuilt_at'),
+                "absorbed": set(data.get('absorbed', ()))
+            }
+            _state['base_version'] = version
+
+    if _state['pid'] != os.getpid() or _state['generation'] != _state['base']['generation']:
+        _state['pid'] = os.getpid()
+        _state['token'] = uuid.uuid4().hex[:12]
+        _state['generation'] = _state['base']['generation']
+        _state['statuses'] = {}
+        _state['sketches'] = _empty_sketches()
+        _state['dirty'] = False
+    return rebuilt
+
+
+def _worker_file():
+    return os.path.join(DATA_DIR, f"stats-{socket.gethostname()}-{_state['pid']}-{_state['token']}.json")
+
+
+def _fold_exited_workers():
+    """
+    Adds the files of exited workers to the base and removes them, along
+    with files of older generations. Runs under the file lock, on the base
+    as it is on disk.
+    """
+    with file_lock.locked(LOCK_FILE):
+        base = _read_json(CHECKPOINT_FILE)
+        if base is None or 'generation' not in base:
+            return
+        absorbed = list(base.get('absorbed', ()))
+        statuses, sketches = _parse_counts(base)
+        folded = []
+        for path, data in _worker_files():
+            if data.get('generation') != base['generation'] or data.get('token') in absorbed:
+                folded.append(path)
+            elif not _is_alive(data):
+                worker_statuses, worker_sketches = _parse_counts(data)
+                _add_statuses(statuses, worker_statuses)
+                for layer in LAYERS:
+                    sketches[layer].merge(worker_sketches[layer])
+                absorbed.append(data.get('token'))
+                folded.append(path)
+        if not folded:
+            return
+        if len(absorbed) != len(base.get('absorbed', ())):
+            _write_json(CHECKPOINT_FILE, {
+                "generation": base['generation'],
+                **_dump_counts(statuses, sketches),
+                "rebuilt_at": base.get('rebuilt_at'),
+                "absorbed": absorbed[-ABSORBED_KEEP:],
+                "checkpointed_at": datetime.utcnow().isoformat() + "Z"
+            })
+        for path in folded:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _write_checkpoint_locked():
+    """Writes this worker's changes to its own file, then folds in the files of exited workers."""
+    _write_json(_worker_file(), {
+        "generation": _state['generation'],
+        "host": socket.gethostname(),
+        "pid": _state['pid'],
+        "token": _state['token'],
+        **_dump_counts(_state['statuses'], _state['sketches']),
+        "checkpointed_at": datetime.utcnow().isoformat() + "Z"
+    })
+    _state['last_checkpoint'] = time.monotonic()
+    _state['dirty'] = False
+    _fold_exited_workers()
+
+
+def _maybe_checkpoint_locked():
+    _state['dirty'] = True
+    if time.monotonic() - _state['last_checkpoint'] >= CHECKPOINT_INTERVAL_SEC:
+        _write_checkpoint_locked()
+
+
+def checkpoint():
+    """Writes this worker's counters to disk now if anything changed since the last checkpoint."""
+    with _lock:
+        if _state['pid'] == os.getpid() and _state['dirty']:
+            _write_checkpoint_locked()
+
+
+atexit.register(checkpoint)
+
+
+# --- Recording (called by data_manager after each commit) ---
+
+def _move_status(statuses, previous, current):
+    if previous:
+        _add_statuses(statuses, {previous: -1})
+    if current:
+        _add_statuses(statuses, {current: 1})
+
+
+def record_transitions(transitions):
+    """
+    Records committed status changes as (previous, current) pairs.
+    previous=None is a new application; current=None is a removal.
+    """
+    with _lock:
+        if _ensure_loaded():
+            return
+        for previous, current in transitions:
+            if previous != current:
+                _move_status(_state['statuses'], previous, current)
+        _maybe_checkpoint_locked()
+
+
+def record_transition(previous, current):
+    record_transitions([(previous, current)])
+
+
+def record_processing_time(layer, ai_result):
+    """Adds one AI layer's processing time (from its model_info) to that layer's sketch."""
+    seconds = ((ai_result or {}).get('model_info') or {}).get('processing_time_sec')
+    if seconds is None:
+        return
+    with _lock:
+        if _ensure_loaded():
+            return
+        _state['sketches'][layer].add(seconds)
+        _maybe_checkpoint_locked()
+
+
+# --- Rebuild ---
+
+def _processing_times(app):
+    documents = app.get('documents') or {}
+    for key in ("id_document", "address_proof"):
+        entry = documents.get(key)
+        if entry:
+            yield "document", (entry.get('model_info') or {}).get('processing_time_sec')
+    selfie = app.get('selfie')
+    if selfie:
+        yield "biometric", ((selfie.get('ai_analysis') or {}).get('model_info') or {}).get('processing_time_sec')
+    analysis = app.get('risk_analysis')
+    model_info = (analysis or {}).get('model_info') or {}
+    if analysis and 'batch_size' not in model_info:
+        # Batch re-scores record the batch's per-application share, not a request latency
+        yield "risk", model_info.get('processing_time_sec')
+
+
+def _rebuild_locked(applications):
+    statuses = {}
+    sketches = _empty_sketches()
+    for app in applications:
+        _move_status(statuses, None, app.get('status'))
+        for layer, seconds in _processing_times(app):
+            sketches[layer].add(seconds)
+    base = {
+        "generation": uuid.uuid4().hex,
+        "statuses": statuses,
+        "sketches": sketches,
+        "rebuilt_at": datetime.utcnow().isoformat() + "Z",
+        "absorbed": set()
+    }
+    with file_lock.locked(LOCK_FILE):
+        _write_json(CHECKPOINT_FILE, {
+            "generation": base['generation'],
+            **_dump_counts(statuses, sketches),
+            "rebuilt_at": base['rebuilt_at'],
+            "absorbed": [],
+            "checkpointed_at": base['rebuilt_at']
+        })
+        # Counted by the scan; workers still running start over on their next access
+        for path, _ in _worker_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    _state['base'] = base
+    _state['base_version'] = _file_version(CHECKPOINT_FILE)
+
+
+def rebuild(applications):
+    """
+    Recomputes every counter and sketch from a full scan of the given
+    applications (normally data_manager.iter_applications()) and writes a
+    new base checkpoint for every worker.
+
+    The live sketches include every analysis run, re-analyses included;
+    a rebuild counts the latest result stored on each application.
+    """
+    with _lock:
+        _rebuild_locked(applications)
+    return get_stats()
+
+
+# --- Read ---
+
+def get_stats():
+    """
+    Returns the funnel, status counts, decision mix and AI processing times
+    over the applications currently in the store (archived ones drop out),
+    summed over the base checkpoint and every worker's changes.
+    """
+    with _lock:
+        _ensure_loaded()
+        base = _state['base']
+        statuses = dict(base['statuses'])
+        sketches = {layer: QuantileSketch().merge(sketch) for layer, sketch in base['sketches'].items()}
+        workers = [({"statuses": _state['statuses']}, _state['sketches'])]
+        for _, data in _worker_files():
+            if (data.get('generation') == base['generation'] and data.get('token') != _state['token']
+                    and data.get('token') not in base['absorbed']):
+                workers.append((data, _parse_counts(data)[1]))
+        for data, worker_sketches in workers:
+            _add_statuses(statuses, data.get('statuses', {}))
+            for layer in LAYERS:
+                sketches[layer].merge(worker_sketches[layer])
+        rebuilt_at = base['rebuilt_at']
+
+    statuses = {status: count for status, count in statuses.items() if count > 0}
+    processing = {layer: sketch.summary() for layer, sketch in sketches.items()}
+    funnel = {"started": sum(statuses.values())}
+    for stage, stage_statuses in FUNNEL_STAGES.items():
+        funnel[stage] = sum(statuses.get(status, 0) for status in stage_statuses)
+    for decision in DECISIONS:
+        funnel[decision.lower()] = statuses.get(decision, 0)
+
+    decided = funnel['decided']
+    decision_mix = {
+        decision.lower(): round(statuses.get(decision, 0) / decided, 4) if decided else None
+        for decision in DECISIONS
+    }
+
+    return {
+        "funnel": funnel,
+        "statuses": statuses,
+        "decision_mix": decision_mix,
+        "processing_time_sec": processing,
+        "rebuilt_at": rebuilt_at
+    }
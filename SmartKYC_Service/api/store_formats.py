@@ -0,0 +1,375 @@
+# api/store_formats.py
+
+import abc
+import gc
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+# Optional fast/binary codecs. Each format is only registered when its
+# library is installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class StoreFormat(abc.ABC):
+    """
+    A serializer for the application store.
+
+    name:      the value used in SMARTKYC_STORE_FORMAT
+    extension: the file extension of the store file
+    """
+
+    name = None
+    extension = None
+    decode_errors = (ValueError,)
+
+    @abc.abstractmethod
+    def dumps(self, data):
+        """Encodes the whole store to bytes."""
+
+    @abc.abstractmethod
+    def loads(self, raw):
+        """Decodes bytes back into the store dict."""
+
+    def iter_items(self, path):
+        """
+        Yields the (app_id, application) pairs of a store file. Formats that
+        can be parsed incrementally override this to hold one record at a
+        time; by default the whole file is decoded first.
+        """
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if raw:
+            yield from self.decode(raw).items()
+
+    def decode(self, raw):
+        """
+        Decodes the store with the cyclic garbage collector paused.
+
+        Decoding allocates millions of small containers, which otherwise
+        triggers repeated full collections that find nothing to free.
+        """
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.loads(raw)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+
+def iter_json_object(f, chunk_size=1 << 20):
+    """
+    Yields the (key, value) pairs of the top-level JSON object in the text
+    file f, decoding one value at a time with json's raw_decode. Memory use
+    is bounded by the largest value (plus one chunk), not by the file.
+    Raises ValueError for anything but a well-formed object.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                raise ValueError("Unexpected end of JSON object.")
+            fill()
+
+    def next_value():
+        # A value is complete once something follows it; each is followed
+        # by at least a ',', ':' or '}' in a well-formed object
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    def expect(*chars):
+        nonlocal pos
+        char = next_char()
+        if char not in chars:
+            raise ValueError(f"Expected {' or '.join(chars)} in JSON object, found {char!r}.")
+        pos += 1
+        return char
+
+    fill()
+    expect('{')
+    if next_char() == '}':
+        return
+    while True:
+        if next_char() != '"':
+            raise ValueError("Expected a string key in JSON object.")
+        key = next_value()
+        expect(':')
+        yield key, next_value()
+        if expect(',', '}') == '}':
+            return
+
+
+def _iter_json_file(path):
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_object(f)
+
+
+class CompactJSONFormat(StoreFormat):
+    """JSON without indentation. Uses orjson when it is available."""
+
+    name = "json"
+    extension = "json"
+
+    def dumps(self, data):
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, raw):
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+    def iter_items(self, path):
+        return _iter_json_file(path)
+
+
+class PrettyJSONFormat(StoreFormat):
+    """The original indented format. Kept for debugging and as a baseline."""
+
+    name = "json-pretty"
+    extension = "json"
+
+    def dumps(self, data):
+        return json.dumps(data, indent=4).encode('utf-8')
+
+    def loads(self, raw):
+        return json.loads(raw)
+
+    def iter_items(self, path):
+        return _iter_json_file(path)
+
+
+class MessagePackFormat(StoreFormat):
+    """MessagePack binary format (requires the 'msgpack' package)."""
+
+    name = "msgpack"
+    extension = "msgpack"
+
+    def __init__(self):
+        self.decode_errors = (ValueError, msgpack.exceptions.ExtraData, msgpack.exceptions.FormatError,
+                              msgpack.exceptions.StackError)
+
+    def dumps(self, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, raw):
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+    def iter_items(self, path):
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f:
+            unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False)
+            for _ in range(unpacker.read_map_header()):
+                yield unpacker.unpack(), unpacker.unpack()
+
+
+class CBORFormat(StoreFormat):
+    """CBOR binary format (requires the 'cbor2' package)."""
+
+    name = "cbor"
+    extension = "cbor"
+
+    def __init__(self):
+        self.decode_errors = (ValueError, cbor2.CBORDecodeError)
+
+    def dumps(self, data):
+        return cbor2.dumps(data)
+
+    def loads(self, raw):
+        return cbor2.loads(raw)
+
+
+class SnapshotFormat(StoreFormat):
+    """
+    An indexed snapshot that supports reading a single record via mmap.
+
+    Layout (little-endian):
+      header  magic 'SKYCSNP1', version u32, slot_count u64, record_count u64, record codec (16 bytes)
+      index   slot_count fixed-width slots of (key digest 16 bytes, offset u64, length u32)
+      data    the encoded records, back to back
+
+    The index is an open-addressing hash table (load factor <= 0.5, linear
+    probing) keyed by a 16-byte BLAKE2b digest of the application id, so a
+    lookup touches one or two slots and then decodes only that record.
+    """
+
+    name = "snapshot"
+    extension = "snap"
+
+    MAGIC = b'SKYCSNP1'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIQQ16s')
+    SLOT = struct.Struct('<16sQI')
+
+    def __init__(self, record_format=None):
+        self.record_format = record_format or CompactJSONFormat()
+
+    @staticmethod
+    def key_digest(app_id):
+        return hashlib.blake2b(str(app_id).encode('utf-8'), digest_size=16).digest()
+
+    def dumps(self, data):
+        slot_count = 8
+        while slot_count < len(data) * 2:
+            slot_count *= 2
+
+        data_offset = self.HEADER.size + slot_count * self.SLOT.size
+        index = bytearray(slot_count * self.SLOT.size)
+        records = []
+        offset = data_offset
+        mask = slot_count - 1
+
+        for app_id, app in data.items():
+            record = self.record_format.dumps(app)
+            digest = self.key_digest(app_id)
+            slot = int.from_bytes(digest[:8], 'little') & mask
+            while self.SLOT.unpack_from(index, slot * self.SLOT.size)[2]:
+                slot = (slot + 1) & mask
+            self.SLOT.pack_into(index, slot * self.SLOT.size, digest, offset, len(record))
+            records.append(record)
+            offset += len(record)
+
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, slot_count, len(data),
+                                  self.record_format.name.encode('ascii'))
+        return b''.join([header, bytes(index)] + records)
+
+    def loads(self, raw):
+        view = memoryview(raw)
+        return {app['application_id']: app for app in self._iter_records(view, self._header(view))}
+
+    def _header(self, buffer):
+        magic, version, slot_count, record_count, codec = self.HEADER.unpack_from(buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a SmartKYC snapshot file.")
+        record_format = get_format(codec.rstrip(b'\0').decode('ascii'))
+        return slot_count, record_count, record_format
+
+    def _iter_records(self, buffer, header):
+        slot_count, _, record_format = header
+        for slot in range(slot_count):
+            _, offset, length = self.SLOT.unpack_from(buffer, self.HEADER.size + slot * self.SLOT.size)
+            if length:
+                yield record_format.loads(bytes(buffer[offset:offset + length]))
+
+
+class SnapshotReader:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+
+    Opening only maps the file and parses the header, so cold start does
+    not depend on store size. The mapping is re-opened when the file is
+    replaced (writes use os.replace, so readers never see a partial file).
+    Pages are mapped read-only and shared between forked workers through
+    the page cache.
+    """
+
+    def __init__(self, path, snapshot_format=None):
+        self.path = path
+        self.format = snapshot_format or FORMATS[SnapshotFormat.name]
+        self._lock = threading.Lock()
+        self._identity = None
+        self._mmap = None
+        self._header = None
+
+    def _current(self):
+        stat = os.stat(self.path)
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if identity != self._identity:
+                with open(self.path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._header = self.format._header(mapped)
+                self._mmap = mapped
+                self._identity = identity
+            return self._mmap, self._header
+
+    def __len__(self):
+        return self._current()[1][1]
+
+    def get(self, app_id):
+        """Decodes and returns one record, or None if the id is not in the snapshot."""
+        mapped, (slot_count, _, record_format) = self._current()
+        digest = self.format.key_digest(app_id)
+        mask = slot_count - 1
+        slot = int.from_bytes(digest[:8], 'little') & mask
+        slot_size, index_start = self.format.SLOT.size, self.format.HEADER.size
+
+        while True:
+            key, offset, length = self.format.SLOT.unpack_from(mapped, index_start + slot * slot_size)
+            if not length:
+                return None
+            if key == digest:
+                return record_format.loads(mapped[offset:offset + length])
+            slot = (slot + 1) & mask
+
+    def iter_records(self):
+        """Yields every record, decoding one at a time."""
+        mapped, header = self._current()
+        return self.format._iter_records(mapped, header)
+
+
+# --- Registry ---
+
+FORMATS = {
+    CompactJSONFormat.name: CompactJSONFormat(),
+    PrettyJSONFormat.name: PrettyJSONFormat(),
+    SnapshotFormat.name: SnapshotFormat(),
+}
+if msgpack is not None:
+    FORMATS[MessagePackFormat.name] = MessagePackFormat()
+if cbor2 is not None:
+    FORMATS[CBORFormat.name] = CBORFormat()
+
+
+def get_format(name):
+    """Looks up a registered store format by name."""
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown or unavailable store format '{name}'. Available: {', '.join(sorted(FORMATS))}"
+        )
@@ -0,0 +1,120 @@
+# api/structured_log.py
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has. Anything else on a record came from
+# `extra=` and is written out as a field.
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line:
+
+      {"ts": ..., "level": "INFO", "logger": "api.ai_mocks", "event": "...",
+       "application_id": ..., "stage": ..., "duration_ms": ...}
+
+    Fields passed with `extra=` are included as-is.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class DebugSampler(logging.Filter):
+    """Keeps a `rate` fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class AsyncJsonHandler(QueueHandler):
+    """
+    A QueueHandler whose QueueListener writes JSON lines to a stream.
+
+    Request threads only sample the record and put it on an in-memory
+    queue. JSON encoding and the write to stdout happen on the listener
+    thread, so a slow or blocked stdout never stalls a request, and lines
+    from different threads never interleave.
+
+    The listener thread is started by the first record a process logs,
+    and started again in a forked worker, like the trace exporter's.
+
+    Used from settings.LOGGING; `debug_sample_rate` is the fraction of
+    DEBUG records kept.
+    """
+
+    def __init__(self, stream=None, debug_sample_rate=1.0):
+        super().__init__(queue.SimpleQueue())
+        self.addFilter(DebugSampler(debug_sample_rate))
+
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.target.setFormatter(JsonFormatter())
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self._stop)
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            # First record, or the first in a forked worker (the parent's listener thread did not survive the fork)
+            self._start()
+        super().enqueue(record)
+
+    def _start(self):
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                self.queue = queue.SimpleQueue()
+                self.listener = QueueListener(self.queue, self.target)
+                self.listener.start()
+                self._pid = pid
+
+    def _stop(self):
+        """Drains the queue on exit, in the process that started the listener."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                self.listener.stop()
+                self._pid = None
+
+    def prepare(self, record):
+        # Resolve the message and exception text on the calling thread
+        # (arguments may change after the call, tracebacks can't be
+        # pickled), but leave the JSON encoding to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
@@ -0,0 +1,335 @@
+# api/synthetic.py
+
+import random
+import string
+import uuid
+from datetime import datetime, timedelta
+
+from . import expiry
+from . import risk_engine
+from .ai_mocks import RISK_MODEL_NAMES
+
+# Share of generated applications in each workflow state. Selfie
+# rejections are stored as REJECTED_<selfie status>, exactly as
+# data_manager._apply_selfie writes them.
+# Decided applications are scored by the risk rules (api/risk_engine.py)
+# from one of these scenarios, so their scores and explanations are the
+# ones the engine would write.
+RISK_SCENARIOS = {
+    "APPROVED": ("clean",),
+    "MANUAL_REVIEW": ("duplicate_dob_name", "pep_hit"),
+    "REJECTED": ("duplicate_document", "sanctions_hit", "pep_and_duplicate_dob_name"),
+}
+# Scenarios that match another application in the identity index. The
+# generator emits that application too (a partner in PENDING_SELFIE), so
+# re-scoring finds the same duplicate the stored analysis reports.
+PARTNER_SCENARIOS = ("duplicate_document", "duplicate_dob_name", "pep_and_duplicate_dob_name")
+
+STATE_WEIGHTS = {
+    "PENDING_DOCUMENTS": 8,
+    "PENDING_ID_DOCUMENT": 2,
+    "PENDING_ADDRESS_PROOF": 5,
+    "REJECTED_ID_DOCUMENT": 3,
+    "REJECTED_ADDRESS_PROOF": 2,
+    "PENDING_SELFIE": 7,
+    "REJECTED_REJECTED_MISMATCH": 3,
+    "REJECTED_REJECTED_LIVENESS": 2,
+    "PENDING_RISK_ANALYSIS": 5,
+    "APPROVED": 45,
+    "MANUAL_REVIEW": 12,
+    "REJECTED": 8,
+    "EXPIRED": 4,
+}
+
+FIRST_NAMES = ["JANE", "JOHN", "AISHA", "WEI", "CARLOS", "PRIYA", "OLGA", "KENJI", "FATIMA", "LIAM",
+               "SOFIA", "ARJUN", "MEI", "DAVID", "AMARA", "LUCAS", "NINA", "OMAR", "HANNA", "RAVI"]
+LAST_NAMES = ["DOE", "SMITH", "KHAN", "ZHANG", "GARCIA", "SHARMA", "IVANOVA", "TANAKA", "HASSAN", "MURPHY",
+              "ROSSI", "REDDY", "CHEN", "COHEN", "OKAFOR", "SILVA", "MULLER", "ALI", "NOVAK", "IYER"]
+NATIONALITIES = ["USA", "IND", "GBR", "DEU", "BRA", "JPN", "NGA", "CHN", "FRA", "CAN"]
+PROVIDERS = ["City Electric & Gas", "Metro Water Board", "Northline Telecom", "Sunrise Power Co."]
+STREETS = ["MAIN ST", "OAK AVE", "PARK RD", "LAKE VIEW DR", "STATION RD", "HILL ST"]
+
+_OCR_MODEL = {"ocr_model": "mock-trocr-transformer-v1.2", "forensics_model": "mock-cnn-tamper-v2.1"}
+_FACE_MODEL = {"face_match_model": "mock-cnn-facenet-v3.0", "liveness_model": "mock-antispoof-v1.8"}
+
+
+# --- Helper Functions ---
+
+def _timestamp(moment):
+    return moment.isoformat() + "Z"
+
+
+def _person(rng, i, prefix):
+    return {
+        "first_name": rng.choice(FIRST_NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "document_number": f"{prefix}{i:08d}",
+        "dob": f"{rng.randint(1950, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "nationality": rng.choice(NATIONALITIES),
+    }
+
+
+def _id_document(rng, app_id, person, moment, tampered=False):
+    extracted = {**person, "expiry_date": (moment + timedelta(days=rng.randint(200, 3650))).strftime('%Y-%m-%d')}
+    if tampered:
+        forensics = {"status": "TAMPERED", "confidence_score": round(rng.uniform(0.98, 0.99), 4),
+                     "reason": "Digital alteration detected in Date of Birth field.",
+                     "checks_failed": ["pixel_analysis", "font_analysis"]}
+    else:
+        forensics = {"status": "CLEAR", "confidence_score": round(rng.uniform(0.95, 0.99), 4),
+                     "checks_passed": ["hologram_check", "font_analysis", "template_match"]}
+    return {
+        "file_path": f"uploads/{app_id}/passport.jpg",
+        "uploaded_at": _timestamp(moment),
+        "status": "PROCESSED" if not tampered else "REJECTED_TAMPERED",
+        "document_type": "PASSPORT" if not tampered else "TAMPERED_EXAMPLE",
+        "forensics": forensics,
+        "extracted_data": extracted,
+        "model_info": {**_OCR_MODEL, "processing_time_sec": round(rng.uniform(1.5, 3.0), 2)}
+    }
+
+
+def _address_proof(rng, app_id, person, moment, suspicious=False):
+    if suspicious:
+        forensics = {"status": "SUSPICIOUS", "confidence_score": round(rng.uniform(0.85, 0.95), 4),
+                     "reason": "Address not found in the postal database.",
+                     "checks_failed": ["address_database_crosscheck"]}
+    else:
+        forensics = {"status": "CLEAR", "confidence_score": round(rng.uniform(0.92, 0.98), 4),
+                     "checks_passed": ["logo_match", "address_database_crosscheck", "date_check"]}
+    return {
+        "file_path": f"uploads/{app_id}/bill.jpg",
+        "uploaded_at": _timestamp(moment),
+        "status": "PROCESSED" if not suspicious else "REJECTED_SUSPICIOUS",
+        "document_type": "UTILITY_BILL",
+        "forensics": forensics,
+        "extracted_data": {
+            "name": f"{person['first_name']} {person['last_name']}",
+            "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}, ANYTOWN, {person['nationality']} "
+                       f"{rng.randint(10000, 99999)}",
+            "issue_date": (moment - timedelta(days=rng.randint(5, 80))).strftime('%Y-%m-%d'),
+            "provider": rng.choice(PROVIDERS)
+        },
+        "model_info": {**_OCR_MODEL, "processing_time_sec": round(rng.uniform(1.5, 3.0), 2)}
+    }
+
+
+def _selfie(rng, app_id, moment, status):
+    if status == "REJECTED_MISMATCH":
+        liveness, face_match, score = "REAL", "MISMATCH", round(rng.uniform(0.30, 0.60), 4)
+        reason = "Selfie does not match the photo on the ID document."
+    elif status == "REJECTED_LIVENESS":
+        liveness, face_match, score = "FAKE", "NOT_ATTEMPTED", 0.0
+        reason = "Liveness check failed. Suspected spoof attempt."
+    else:
+        liveness, face_match, score = "REAL", "MATCH", round(rng.uniform(0.95, 0.99), 4)
+        reason = "Biometric verification successful."
+
+    return {
+        "file_path": f"uploads/{app_id}/selfie.jpg",
+        "uploaded_at": _timestamp(moment),
+        "status": status,
+        "ai_analysis": {
+            "status": status,
+            "reason": reason,
+            "liveness_check": {"status": liveness, "confidence": round(rng.uniform(0.97, 0.99), 4)},
+            "face_match": {"status": face_match, "match_score": score,
+                           "id_document_face_ref": f"doc_{app_id}_face.jpg",
+                           "selfie_face_ref": f"selfie_{app_id}_face.jpg", "duplicate_faces": []},
+            "model_info": {**_FACE_MODEL, "processing_time_sec": round(rng.uniform(1.0, 2.5), 2)}
+        }
+    }
+
+
+def _risk_features(rng, scenario, person, selfie):
+    """The feature dict (as risk_engine.extract_features builds it) of a risk scenario."""
+    name = f"{person['first_name']} {person['last_name']}"
+    hits = []
+    if scenario in ("pep_hit", "pep_and_duplicate_dob_name", "sanctions_hit"):
+        list_type = "SANCTIONS" if scenario == "sanctions_hit" else "PEP"
+        hits = [{"list_type": list_type, "name": f"{person['last_name']}, {person['first_name']}",
+                 "similarity": round(rng.uniform(0.93, 1.0), 4)}]
+    analysis = selfie['ai_analysis']
+    return {
+        "id_status": "CLEAR",
+        "addr_status": "CLEAR",
+        "documents_missing": False,
+        "selfie_missing": False,
+        "selfie_status": analysis['status'],
+        "selfie_failed": analysis['status'] != "CLEAR",
+        "selfie_reason": analysis['reason'],
+        "match_score": analysis['face_match']['match_score'],
+        "duplicate_faces": 0,
+        "extracted_missing": False,
+        "id_name": name,
+        "addr_name": name,
+        "name_mismatch": False,
+        "duplicate_documents": 1 if scenario == "duplicate_document" else 0,
+        "duplicate_dob_names": 1 if scenario in ("duplicate_dob_name", "pep_and_duplicate_dob_name") else 0,
+        "screened_name": name,
+        "watchlist_hits": hits,
+        "watchlist_hit": bool(hits),
+        "sanctions_hit": scenario == "sanctions_hit",
+    }
+
+
+def _risk_analysis(rng, scenario, moment, person, selfie):
+    rules = risk_engine.get_rules()
+    score, decision, explanations = rules.evaluate(
+        _risk_features(rng, scenario, person, selfie), timed=False, rng=rng
+    )
+    return {
+        "decision": decision,
+        "risk_score": score,
+        "xai_explanations": explanations,
+        "model_info": {**RISK_MODEL_NAMES, "rules_version": rules.version,
+                       "processing_time_sec": round(rng.uniform(0.5, 1.5), 2)},
+        "analyzed_at": _timestamp(moment)
+    }
+
+
+# --- Core Generator Functions ---
+
+def _partner_person(person, scenario):
+    """The identity of the application a duplicate scenario matches."""
+    if scenario == "duplicate_document":
+        return dict(person)
+    # Same name and date of birth on a different document
+    return {**person, "document_number": f"{person['document_number']}D"}
+
+
+def _expired(i, rng, now, spread_days, prefix):
+    """An application that sat in a state with a TTL (api/expiry.py) until it expired."""
+    states = [state for state in STATE_WEIGHTS if state in expiry.TTL_SEC]
+    status = rng.choices(states, weights=[STATE_WEIGHTS[state] for state in states])[0]
+    ttl = timedelta(seconds=expiry.TTL_SEC[status])
+    app = generate_application(i, rng, status=status, now=now - ttl, spread_days=spread_days, prefix=prefix)
+    expired_at = datetime.fromisoformat(app['updated_at'].rstrip('Z')) + ttl
+    app['status'] = "EXPIRED"
+    app['explanations'] = app['explanations'] + [
+        f"Application expired after {expiry.TTL_SEC[status] / 3600:g} hours in {status}."
+    ]
+    app['updated_at'] = _timestamp(expired_at)
+    return app
+
+
+def generate_application(i, rng, status=None, now=None, spread_days=180, prefix="P", person=None,
+                         partners=None):
+    """
+    Builds one realistic application in the given workflow state (drawn
+    from STATE_WEIGHTS when not given). Everything is drawn from rng, so
+    a seeded generation is reproducible.
+
+    Document numbers are `prefix` followed by i. A decided application
+    whose risk scenario duplicates another identity appends that other
+    application to `partners`; with partners=None only scenarios without
+    one are drawn.
+    """
+    status = status or rng.choices(list(STATE_WEIGHTS), weights=list(STATE_WEIGHTS.values()))[0]
+    now = now or datetime.utcnow()
+    if status == "EXPIRED":
+        return _expired(i, rng, now, spread_days, prefix)
+
+    app_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    created = now - timedelta(days=rng.uniform(0, spread_days))
+    step = created
+
+    def next_step():
+        nonlocal step
+        step = step + timedelta(seconds=rng.uniform(20, 600))
+        return step
+
+    person = person or _person(rng, i, prefix)
+    app = {
+        "application_id": app_id,
+        "status": status,
+        "created_at": _timestamp(created),
+        "updated_at": _timestamp(created),
+        "risk_score": None,
+        "explanations": [],
+        "documents": {"id_document": None, "address_proof": None},
+        "selfie": None,
+        "extracted_data": None
+    }
+    if status == "PENDING_DOCUMENTS":
+        return app
+
+    documents = app['documents']
+    if status == "REJECTED_ID_DOCUMENT":
+        documents['id_document'] = _id_document(rng, app_id, person, next_step(), tampered=True)
+        app['explanations'] = ["id_document was rejected. Reason: Digital alteration detected in Date of Birth field."]
+    elif status == "REJECTED_ADDRESS_PROOF":
+        documents['id_document'] = _id_document(rng, app_id, person, next_step())
+        documents['address_proof'] = _address_proof(rng, app_id, person, next_step(), suspicious=True)
+        app['explanations'] = ["address_proof was rejected. Reason: Address not found in the postal database."]
+    else:
+        if status != "PENDING_ID_DOCUMENT":
+            documents['id_document'] = _id_document(rng, app_id, person, next_step())
+        if status != "PENDING_ADDRESS_PROOF":
+            documents['address_proof'] = _address_proof(rng, app_id, person, next_step())
+
+    # Fused data, as merge_extracted_data builds it
+    extracted = {}
+    if documents['id_document']:
+        extracted.update(documents['id_document']['extracted_data'])
+    if documents['address_proof']:
+        address = documents['address_proof']['extracted_data']
+        extracted.update({"name": address['name'], "address": address['address'],
+                          "address_issue_date": address['issue_date'], "address_provider": address['provider']})
+    app['extracted_data'] = extracted
+
+    if status == "PENDING_ADDRESS_PROOF":
+        app['explanations'] = ["ID document processed. Please upload proof of address."]
+    elif status == "PENDING_ID_DOCUMENT":
+        app['explanations'] = ["Proof of address processed. Please upload an ID document."]
+    elif status == "PENDING_SELFIE":
+        app['explanations'] = ["All documents processed. Please proceed to liveness check."]
+    elif status.startswith("REJECTED_REJECTED_"):
+        selfie = _selfie(rng, app_id, next_step(), status[len("REJECTED_"):])
+        app['selfie'] = selfie
+        app['explanations'] = ["All documents processed. Please proceed to liveness check.",
+                               selfie['ai_analysis']['reason']]
+    elif status not in ("REJECTED_ID_DOCUMENT", "REJECTED_ADDRESS_PROOF"):
+        app['selfie'] = _selfie(rng, app_id, next_step(), "CLEAR")
+        app['explanations'] = ["ID document processed.", "Address proof processed.",
+                               "Biometric verification successful.", "Proceeding to final risk analysis."]
+        if status in RISK_SCENARIOS:
+            scenarios = RISK_SCENARIOS[status]
+            if partners is None:
+                scenarios = [scenario for scenario in scenarios if scenario not in PARTNER_SCENARIOS]
+            scenario = rng.choice(scenarios)
+            if scenario in PARTNER_SCENARIOS:
+                partners.append(generate_application(
+                    i, rng, status="PENDING_SELFIE", now=now, spread_days=spread_days,
+                    person=_partner_person(person, scenario)
+                ))
+            analysis = _risk_analysis(rng, scenario, next_step(), person, app['selfie'])
+            app['risk_analysis'] = analysis
+            app['risk_score'] = analysis['risk_score']
+            app['explanations'] = analysis['xai_explanations']
+            # Operator rules (data/risk_rules.*) may band a scenario differently
+            app['status'] = analysis['decision']
+
+    app['updated_at'] = _timestamp(step)
+    return app
+
+
+def generate_applications(count, seed=None, spread_days=180):
+    """
+    Yields `count` synthetic applications spread across every workflow
+    state, including the partners of duplicate scenarios. Each run draws
+    its own document number prefix, so separate runs loaded into one
+    store do not match each other's documents.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    prefix = ''.join(rng.choice(string.ascii_uppercase) for _ in range(4))
+    produced = i = 0
+    while produced < count:
+        # The last slot has no room for a partner
+        partners = [] if count - produced > 1 else None
+        app = generate_application(i, rng, now=now, spread_days=spread_days, prefix=prefix, partners=partners)
+        for record in [app] + (partners or []):
+            yield record
+            produced += 1
+        i += 1
@@ -1,3 +1,1220 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from unittest import mock
+
+from . import bulk_import
+from . import data_manager
+from . import expiry
+from . import export
+from . import face_index
+from . import identity_index
+from . import quality
+from . import rate_limit
+from . import preprocessing
+from . import profiling
+from . import projection
+from . import records
+from . import response_cache
+from . import retention
+from . import risk_engine
+from . import stats
+from . import store_formats
+from . import synthetic
+from . import tracing
+from . import watchlist
+from . import views
+from .group_commit import GroupCommitter, _Pending
+from .idempotency import IdempotencyStore
+from .preprocessing import Preprocessed
+from .structured_log import AsyncJsonHandler
+
+
+class GroupCommitTests(SimpleTestCase):
+    def setUp(self):
+        self.stored = {"a": {"status": "PENDING_DOCUMENTS"}, "b": {"status": "PENDING_SELFIE"}}
+        self.committer = GroupCommitter(
+            load=lambda: dict(self.stored),
+            store=lambda data: setattr(self, 'stored', dict(data)),
+            window_sec=0
+        )
+
+    def test_failing_mutation_is_rolled_back(self):
+        def half_done(applications):
+            applications["a"] = {"status": "APPROVED"}
+            del applications["b"]
+            applications["c"] = {"status": "PENDING_DOCUMENTS"}
+            raise ValueError("failed after three changes")
+
+        with self.assertRaises(ValueError):
+            self.committer.submit(half_done)
+        self.assertEqual(self.stored, {"a": {"status": "PENDING_DOCUMENTS"}, "b": {"status": "PENDING_SELFIE"}})
+
+    def test_other_mutations_in_the_batch_are_kept(self):
+        def succeed(applications):
+            applications["d"] = {"status": "PENDING_DOCUMENTS"}
+            return "ok"
+
+        def fail(applications):
+            applications.pop("a")
+            raise ValueError("failed")
+
+        # Commit both in one batch, as the leader would
+        batch = [_Pending(succeed), _Pending(fail)]
+        self.committer._commit_batch(batch)
+
+        self.assertEqual(batch[0].result, "ok")
+        self.assertIsInstance(batch[1].error, ValueError)
+        self.assertEqual(set(self.stored), {"a", "b", "d"})
+
+
+class GroupCommitWindowTests(SimpleTestCase):
+    def test_lone_commit_does_not_wait_for_the_window(self):
+        stored = {}
+        committer = GroupCommitter(load=lambda: dict(stored), store=stored.update, window_sec=30)
+        committer.submit(lambda applications: applications.__setitem__("a", {"status": "PENDING_DOCUMENTS"}))
+        self.assertEqual(stored, {"a": {"status": "PENDING_DOCUMENTS"}})
+
+    def test_lock_file_is_created_and_released(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lock_file = os.path.join(tmp, "store.lock")
+            committer = GroupCommitter(load=dict, store=lambda data: None, window_sec=0, lock_file=lock_file)
+            for _ in range(2):
+                self.assertEqual(committer.submit(lambda applications: "done"), "done")
+            self.assertTrue(os.path.exists(lock_file))
+
+
+class RecordsTests(SimpleTestCase):
+    def setUp(self):
+        self.record = {
+            "status": "PENDING_ADDRESS_PROOF",
+            "documents": {"id_document": {"status": "PROCESSED"}, "address_proof": None},
+            "selfie": None,
+            "extracted_data": {"name": "JOHN SMITH"}
+        }
+
+    def test_assoc_in_copies_only_the_changed_path(self):
+        entry = {"status": "PROCESSED"}
+        updated = records.assoc_in(self.record, ("documents", "address_proof"), entry)
+
+        self.assertIsNone(self.record["documents"]["address_proof"])
+        self.assertIs(updated["documents"]["address_proof"], entry)
+        self.assertIs(updated["documents"]["id_document"], self.record["documents"]["id_document"])
+        self.assertIs(updated["extracted_data"], self.record["extracted_data"])
+
+    def test_assoc_in_creates_missing_levels(self):
+        updated = records.assoc_in(self.record, ("selfie", "ai_analysis", "status"), "CLEAR")
+        self.assertEqual(updated["selfie"], {"ai_analysis": {"status": "CLEAR"}})
+        self.assertIsNone(self.record["selfie"])
+
+    def test_evolve_shares_untouched_sections(self):
+        updated = records.evolve(self.record, status="PENDING_SELFIE")
+        self.assertEqual(self.record["status"], "PENDING_ADDRESS_PROOF")
+        self.assertIs(updated["documents"], self.record["documents"])
+
+
+class IdempotencyStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'idempotency.sqlite3')
+        self.store = IdempotencyStore(self.path, max_entries=10)
+
+    def count(self):
+        return self.store._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def test_capacity_is_kept_with_a_claim_in_flight(self):
+        in_flight, _ = self.store.claim("POST /first", "fp")
+        for i in range(30):
+            entry, _ = self.store.claim(f"POST /{i}", "fp")
+            self.store.complete(f"POST /{i}", entry, 200, {"i": i})
+        self.assertLessEqual(self.count(), 10)
+        entry, is_owner = self.store.claim("POST /first", "fp")
+        self.assertFalse(is_owner)
+        self.assertEqual(entry.owner, in_flight.owner)
+
+    def test_duplicate_replays_from_another_connection(self):
+        entry, _ = self.store.claim("POST /x", "fp", app_id="app-1")
+        self.store.complete("POST /x", entry, 201, {"application_id": "app-1"})
+
+        other = IdempotencyStore(self.path)
+        replay, is_owner = other.claim("POST /x", "fp")
+        self.assertFalse(is_owner)
+        self.assertEqual((replay.status_code, replay.data), (201, {"application_id": "app-1"}))
+
+        self.assertEqual(other.purge_applications(["app-1"]), 1)
+        self.assertTrue(other.claim("POST /x", "fp")[1])
+
+
+class GlareTests(SimpleTestCase):
+    def document(self, background):
+        """A 1600x1200 OCR variant: rows of dark text and a photo block on the given background."""
+        page = np.full((1200, 1600), background, dtype=np.uint8)
+        for top in range(120, 1080, 48):
+            page[top:top + 20, 130:1000:3] = 25
+        page[150:600, 1070:1440] = 120
+        return page
+
+    def check(self, page):
+        return quality.check(Preprocessed("digest", {"ocr": page}, source_size=(3200, 2400)), "document")
+
+    def add_glare(self, page):
+        rows, columns = np.ogrid[:page.shape[0], :page.shape[1]]
+        page[(rows - 500) ** 2 / 300 ** 2 + (columns - 700) ** 2 / 400 ** 2 <= 1] = 255
+        return page
+
+    def test_white_background_document_is_clear(self):
+        report = self.check(self.document(255))
+        self.assertEqual(report.status, "CLEAR")
+        self.assertEqual(report.metrics["glare_ratio"], 0.0)
+
+    def test_glare_spot_is_rejected(self):
+        for background in (226, 238):
+            report = self.check(self.add_glare(self.document(background)))
+            self.assertEqual(report.status, "GLARE", background)
+            self.assertGreater(report.metrics["glare_ratio"], quality.THRESHOLDS["document"]["max_glare_ratio"])
+
+
+class IdentityIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = identity_index.IdentityIndex(os.path.join(self.directory, 'identity.sqlite3'))
+        self.passport = {"document_number": "p0123 4567", "first_name": "John", "last_name": "Smith",
+                         "dob": "1990-01-01"}
+
+    def test_duplicates_match_normalized_keys(self):
+        self.index.register([("app-1", self.passport)])
+        self.index.register([("app-2", {"document_number": "P01234567"})])
+
+        self.assertEqual(self.index.lookup("doc:P01234567", exclude="app-1"), ["app-2"])
+        self.assertEqual(self.index.lookup("dob_name:1990-01-01|JOHN SMITH", exclude="app-1"), [])
+
+    def test_register_replaces_previous_keys(self):
+        self.index.register([("app-1", self.passport)])
+        self.index.register([("app-1", {**self.passport, "document_number": "X999"})])
+        self.assertEqual(self.index.lookup("doc:P01234567"), [])
+        self.assertEqual(self.index.lookup("doc:X999"), ["app-1"])
+
+        self.index.register([("app-1", None)])
+        self.assertEqual(self.index.lookup("doc:X999"), [])
+
+    def test_unregister_and_legacy_import(self):
+        legacy = os.path.join(self.directory, 'identity_index.json')
+        with open(legacy, 'w') as f:
+            f.write('{"doc:A1": ["app-1", "app-2"]}')
+        index = identity_index.IdentityIndex(os.path.join(self.directory, 'imported.sqlite3'), legacy_file=legacy)
+
+        self.assertEqual(sorted(index.lookup("doc:A1")), ["app-1", "app-2"])
+        self.assertFalse(os.path.exists(legacy))
+        self.assertEqual(index.unregister(["app-2"]), 1)
+        self.assertEqual(index.lookup("doc:A1"), ["app-1"])
+
+    def test_unreadable_database_raises_corrupt_index_error(self):
+        path = os.path.join(self.directory, 'broken.sqlite3')
+        with open(path, 'wb') as f:
+            f.write(b"not a database" * 100)
+        with self.assertRaises(identity_index.CorruptIndexError):
+            identity_index.IdentityIndex(path).lookup("doc:A1")
+
+
+class FaceIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.rng = np.random.default_rng(0)
+
+    def vectors(self, count):
+        return self.rng.standard_normal((count, face_index.EMBEDDING_DIM)).astype(np.float32)
+
+    def test_other_worker_reads_only_the_appended_tail(self):
+        writer = face_index.FaceIndex(self.path)
+        reader = face_index.FaceIndex(self.path, approx_threshold=0)
+        first = self.vectors(10)
+        writer.add_batch([f"a{i}" for i in range(10)], first)
+        self.assertEqual(reader.search(first[3], k=1)[0][0][0], "a3")
+        lsh = reader._lsh
+
+        second = self.vectors(5)
+        writer.add_batch([f"b{i}" for i in range(5)], second)
+        self.assertEqual(reader.search(second[4], k=1)[0][0][0], "b4")
+        # The LSH tables were extended, not rebuilt
+        self.assertIs(reader._lsh, lsh)
+        self.assertEqual(len(lsh.rows), 15)
+
+    def test_removed_rows_are_compacted_away(self):
+        writer = face_index.FaceIndex(self.path)
+        reader = face_index.FaceIndex(self.path)
+        vectors = self.vectors(20)
+        writer.add_batch([f"a{i}" for i in range(20)], vectors)
+
+        with mock.patch.object(face_index, 'COMPACT_MIN_ROWS', 5):
+            self.assertEqual(writer.remove([f"a{i}" for i in range(10)]), 10)
+        self.assertEqual(len(writer), 10)
+        self.assertEqual(reader.search(vectors[15], k=1)[0][0][0], "a15")
+        self.assertEqual(len(reader), 10)
+        self.assertNotIn("a2", [app_id for app_id, _ in reader.search(vectors[2], k=3)[0]])
+
+
+class WatchlistTests(SimpleTestCase):
+    def setUp(self):
+        self.index = watchlist.WatchlistIndex([
+            {"entry_id": "1", "name": "Doe, Jane", "list_type": "SANCTIONS", "country": None},
+            {"entry_id": "2", "name": "Robert Smith", "list_type": "PEP", "country": "GB"},
+            {"entry_id": "3", "name": "Maria Garcia Lopez", "list_type": "SANCTIONS", "country": "ES"},
+        ])
+
+    def test_reordered_and_misspelled_names_match(self):
+        self.assertEqual(self.index.screen("JANE DOE")[0]["entry_id"], "1")
+        hit = self.index.screen("Robrt Smith")[0]
+        self.assertEqual((hit["entry_id"], hit["distance"]), ("2", 1))
+
+    def test_unrelated_names_do_not_match(self):
+        self.assertEqual(self.index.screen("John Appleseed"), [])
+        self.assertEqual(self.index.screen(""), [])
+
+    def test_index_agrees_with_a_full_scan(self):
+        for query in ("Maria Garcia", "Mariah Garcia Lopes", "Rupert Smith", "Jane Do"):
+            normalized = watchlist.normalize_name(query)
+            budget = watchlist.max_distance_for(normalized)
+            expected = {entry["entry_id"] for entry, name in zip(self.index.entries, self.index.names)
+                        if watchlist.bounded_edit_distance(normalized, name, budget) <= budget}
+            self.assertEqual({hit["entry_id"] for hit in self.index.screen(query)}, expected, query)
+
+
+def _scored_app(app_id, first_name="JANE", last_name="DOE", document_number="P100", id_status="CLEAR",
+                addr_status="CLEAR", address_name=None, selfie_status="CLEAR", match_score=0.97,
+                extracted=True):
+    """An application record as the workflow leaves it before risk analysis."""
+    documents = {}
+    if id_status:
+        documents["id_document"] = {"forensics": {"status": id_status}}
+    if addr_status:
+        documents["address_proof"] = {"forensics": {"status": addr_status}}
+    selfie = {}
+    if selfie_status:
+        selfie["ai_analysis"] = {"status": selfie_status, "reason": "Liveness check failed",
+                                 "face_match": {"match_score": match_score, "duplicate_faces": []}}
+    return {
+        "application_id": app_id,
+        "documents": documents,
+        "selfie": selfie,
+        "extracted_data": {
+            "first_name": first_name, "last_name": last_name, "dob": "1990-01-01",
+            "document_number": document_number, "name": address_name or f"{first_name} {last_name}"
+        } if extracted else None,
+    }
+
+
+class RiskEngineParityTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index = identity_index.IdentityIndex(os.path.join(tmp.name, "identity.sqlite3"))
+        patcher = mock.patch.object(identity_index, "_index", index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        screening = watchlist.WatchlistIndex([
+            {"entry_id": "1", "name": "Olga Ivanova", "list_type": "SANCTIONS", "country": None},
+            {"entry_id": "2", "name": "Liam Murphy", "list_type": "PEP", "country": "IE"},
+        ])
+        patcher = mock.patch.object(watchlist, "get_index", return_value=screening)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.applications = [
+            _scored_app("clean"),
+            _scored_app("no-docs", first_name="JOHN", document_number="P110", id_status=None, addr_status=None),
+            _scored_app("no-selfie", first_name="WEI", document_number="P200", selfie_status=None),
+            _scored_app("no-data", first_name="FATIMA", extracted=False),
+            _scored_app("tampered", first_name="AISHA", document_number="P300", id_status="TAMPERED"),
+            _scored_app("low-match", first_name="KENJI", document_number="P400", match_score=0.7),
+            _scored_app("mismatch", first_name="PRIYA", document_number="P500", address_name="P SHARMA"),
+            _scored_app("dup-1", first_name="CARLOS", document_number="X 900"),
+            _scored_app("dup-2", first_name="CARLOS", document_number="x900"),
+            _scored_app("sanctioned", first_name="OLGA", last_name="IVANOVA", document_number="P600"),
+            _scored_app("pep", first_name="Liam", last_name="Murphy", document_number="P700",
+                        selfie_status="FAILED"),
+        ]
+        identity_index.register_applications(
+            (app["application_id"], app["extracted_data"]) for app in self.applications
+        )
+
+    def test_vector_path_matches_scalar_path(self):
+        rules = risk_engine.get_rules()
+        scores, decisions, explanations = risk_engine.evaluate_batch(
+            self.applications, rng=np.random.default_rng(0), rules=rules
+        )
+        low, high = rules.clean_score
+        for i, app in enumerate(self.applications):
+            score, decision, explanation = risk_engine.evaluate(app, rules=rules)
+            with self.subTest(app["application_id"]):
+                self.assertEqual(explanations[i], explanation)
+                self.assertEqual(str(decisions[i]), decision)
+                if explanation == rules.clean_explanations:
+                    self.assertTrue(low <= int(scores[i]) <= high and low <= score <= high)
+                else:
+                    self.assertEqual(int(scores[i]), score)
+
+    def test_mixed_records_hit_the_expected_rules(self):
+        _, decisions, explanations = risk_engine.evaluate_batch(self.applications, rng=np.random.default_rng(0))
+        outcome = dict(zip((app["application_id"] for app in self.applications), zip(decisions, explanations)))
+        self.assertEqual(str(outcome["clean"][0]), "APPROVED")
+        self.assertEqual(str(outcome["sanctioned"][0]), "REJECTED")
+        self.assertTrue(any("document" in line.lower() for line in outcome["dup-1"][1]))
+        self.assertTrue(any("watchlist" in line.lower() or "pep" in line.lower() for line in outcome["pep"][1]))
+
+    def test_batch_duplicate_lookup_matches_single_lookups(self):
+        items = [(app["application_id"], app["extracted_data"]) for app in self.applications]
+        self.assertEqual(identity_index.find_duplicates_batch(items),
+                         [identity_index.find_duplicates(app_id, data) for app_id, data in items])
+
+
+def _baseline_risk(app):
+    """The hard-coded scoring the rules file replaced, minus the clean score draw."""
+    score, explanations = 0, []
+    documents = app["documents"]
+    if "id_document" in documents and "address_proof" in documents:
+        if documents["id_document"]["forensics"]["status"] != "CLEAR":
+            score += 70
+            explanations.append(f"ID Document flagged for: {documents['id_document']['forensics']['status']}.")
+        if documents["address_proof"]["forensics"]["status"] != "CLEAR":
+            score += 40
+            explanations.append(f"Address Document flagged for: {documents['address_proof']['forensics']['status']}.")
+    else:
+        score += 90
+        explanations.append("Critical error: Missing document forensics data.")
+    selfie = app["selfie"].get("ai_analysis")
+    if selfie:
+        if selfie["status"] != "CLEAR":
+            score += 90
+            explanations.append(f"Biometric verification failed: {selfie['reason']}.")
+        match_score = selfie["face_match"]["match_score"]
+        if match_score < 0.9:
+            score += (1 - match_score) * 50
+            explanations.append(f"Low biometric match score ({match_score}).")
+    else:
+        score += 90
+        explanations.append("Critical error: Missing biometric data.")
+    extracted = app["extracted_data"]
+    if extracted is None:
+        explanations.append("Could not perform data cross-reference.")
+    else:
+        id_name = f"{extracted['first_name']} {extracted['last_name']}".strip()
+        if id_name.lower() != extracted["name"].lower():
+            score += 25
+            explanations.append(f"Name mismatch: ID says '{id_name}', Address proof says '{extracted['name']}'.")
+    return min(max(int(score), 0), 100), explanations
+
+
+class RiskRulesTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        index = identity_index.IdentityIndex(os.path.join(tmp.name, "identity.sqlite3"))
+        for target, attribute, value in (
+            (identity_index, "_index", index),
+            (watchlist, "get_index", lambda: watchlist.WatchlistIndex([])),
+            (risk_engine, "RELOAD_CHECK_SEC", 0),
+        ):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(risk_engine._state, {"rules": None, "path": None, "mtime": None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _use_rules_file(self, content):
+        path = os.path.join(self.dir, "risk_rules.json")
+        with open(path, "w") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        self.edits = getattr(self, "edits", 0) + 1
+        os.utime(path, (1000 + self.edits,) * 2)
+        patcher = mock.patch.object(risk_engine, "RULES_FILES", [path])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return path
+
+    def test_bundled_rules_reproduce_the_baseline_scoring(self):
+        rules = risk_engine.get_rules()
+        for i, kwargs in enumerate([
+            {"id_status": "TAMPERED"},
+            {"addr_status": "EDITED"},
+            {"id_status": "TAMPERED", "addr_status": "EDITED", "match_score": 0.5},
+            {"id_status": None, "addr_status": None},
+            {"selfie_status": None},
+            {"selfie_status": "FAILED", "match_score": 0.42},
+            {"match_score": 0.8},
+            {"address_name": "JANE Q DOE"},
+            {"extracted": False},
+            {"match_score": 0.8, "address_name": "J DOE", "selfie_status": None},
+        ]):
+            app = _scored_app(f"app-{i}", document_number=f"P{i}", **kwargs)
+            score, explanations = _baseline_risk(app)
+            with self.subTest(**kwargs):
+                self.assertEqual(risk_engine.evaluate(app, rules=rules)[::2], (score, explanations))
+
+    def test_bundled_decision_bands_match_the_baseline_thresholds(self):
+        rules = risk_engine.get_rules()
+        self.assertEqual([rules.decide(score) for score in (0, 19, 20, 69, 70, 100)],
+                         ["APPROVED", "APPROVED", "MANUAL_REVIEW", "MANUAL_REVIEW", "REJECTED", "REJECTED"])
+        self.assertEqual(rules.clean_score, (5, 15))
+
+    def test_missing_rules_file_fails_closed(self):
+        with mock.patch.object(risk_engine, "RULES_FILES", [os.path.join(self.dir, "absent.json")]):
+            with self.assertLogs("api.risk_engine", "ERROR"):
+                rules = risk_engine.get_rules()
+        score, decision, explanations = risk_engine.evaluate(_scored_app("clean"), rules=rules)
+        self.assertEqual((score, decision), (risk_engine.FAIL_CLOSED_SCORE, "MANUAL_REVIEW"))
+        self.assertIn("risk rules unavailable", explanations[0])
+
+    def test_malformed_rules_file_on_first_load_fails_closed(self):
+        self._use_rules_file('{"rules": [')
+        with self.assertLogs("api.risk_engine", "ERROR"):
+            self.assertTrue(risk_engine.get_rules().fail_closed)
+
+    def test_invalid_rules_are_rejected(self):
+        for config in (
+            {"rules": [], "decision_bands": [{"below": 20, "decision": "APPROVED"}]},
+            {"rules": [{"id": "a", "when": {"feature": "x", "op": "truthy"}, "points": 1}] * 2,
+             "decision_bands": [{"decision": "REJECTED"}]},
+            {"rules": [{"id": "a", "when": {"feature": "x", "op": "nearly"}, "points": 1}],
+             "decision_bands": [{"decision": "REJECTED"}]},
+        ):
+            with self.subTest(config=config), self.assertRaises(risk_engine.RuleError):
+                risk_engine.RuleSet(config)
+
+    def test_bad_edit_keeps_the_previous_rules(self):
+        self._use_rules_file({"version": 7, "rules": [], "decision_bands": [{"decision": "APPROVED"}]})
+        self.assertEqual(risk_engine.get_rules().version, 7)
+        self._use_rules_file({"version": 8, "rules": [], "decision_bands": [{"below": 5, "decision": "APPROVED"}]})
+        with self.assertLogs("api.risk_engine", "WARNING"):
+            self.assertEqual(risk_engine.get_rules().version, 7)
+
+    def test_unreadable_identity_index_fails_closed(self):
+        broken = os.path.join(self.dir, "broken.sqlite3")
+        with open(broken, "wb") as f:
+            f.write(b"not a database" * 100)
+        with mock.patch.object(identity_index, "_index", identity_index.IdentityIndex(broken)), \
+                self.assertLogs("api.identity_index", "ERROR"):
+            self.assertEqual(risk_engine.evaluate(_scored_app("clean"))[:2],
+                             (risk_engine.FAIL_CLOSED_SCORE, "MANUAL_REVIEW"))
+            _, decisions, _ = risk_engine.evaluate_batch([_scored_app("a"), _scored_app("b", first_name="JOHN")])
+            self.assertEqual(list(decisions), ["MANUAL_REVIEW", "MANUAL_REVIEW"])
+
+
+class StoreFormatTests(SimpleTestCase):
+    store = {
+        f"app-{i}": {"application_id": f"app-{i}", "status": "APPROVED", "risk_score": i,
+                     "extracted_data": {"name": "JOSÉ ÁLVAREZ", "dob": None}, "flags": [True, 0.5]}
+        for i in range(20)
+    }
+
+    def test_every_registered_format_round_trips(self):
+        for name, store_format in store_formats.FORMATS.items():
+            with self.subTest(name):
+                self.assertEqual(store_format.decode(store_format.dumps(self.store)), self.store)
+                self.assertEqual(store_format.decode(store_format.dumps({})), {})
+
+    def test_formats_must_implement_dumps_and_loads(self):
+        class Partial(store_formats.StoreFormat):
+            def dumps(self, data):
+                return b""
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            store_formats.get_format("xml")
+
+
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "applications.snap")
+        self.format = store_formats.SnapshotFormat()
+
+    def _write(self, store):
+        staging = f"{self.path}.tmp"
+        with open(staging, "wb") as f:
+            f.write(self.format.dumps(store))
+        os.replace(staging, self.path)
+
+    def test_reader_finds_every_record_through_the_hash_index(self):
+        store = {f"app-{i}": {"application_id": f"app-{i}", "risk_score": i} for i in range(500)}
+        self._write(store)
+        reader = store_formats.SnapshotReader(self.path, self.format)
+        self.assertEqual(len(reader), 500)
+        for app_id, app in store.items():
+            self.assertEqual(reader.get(app_id), app)
+        self.assertIsNone(reader.get("app-500"))
+        self.assertEqual({app["application_id"] for app in reader.iter_records()}, set(store))
+
+    def test_reader_sees_a_replaced_snapshot(self):
+        self._write({"a": {"application_id": "a", "status": "PENDING_SELFIE"}})
+        reader = store_formats.SnapshotReader(self.path, self.format)
+        self.assertEqual(reader.get("a")["status"], "PENDING_SELFIE")
+        self._write({"a": {"application_id": "a", "status": "APPROVED"}, "b": {"application_id": "b"}})
+        self.assertEqual((reader.get("a")["status"], len(reader)), ("APPROVED", 2))
+
+    def test_records_use_the_codec_named_in_the_header(self):
+        store = {"a": {"application_id": "a", "documents": {}}}
+        codecs = [name for name in ("msgpack", "cbor") if name in store_formats.FORMATS]
+        for codec in codecs:
+            with self.subTest(codec):
+                raw = store_formats.SnapshotFormat(store_formats.get_format(codec)).dumps(store)
+                self.assertEqual(self.format.loads(raw), store)
+
+    def test_other_files_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.format.loads(b"{}" * 40)
+
+
+def _use_temp_store(test, directory):
+    """Points data_manager at an empty JSON store in directory for the duration of test."""
+    app_file = os.path.join(directory, "applications.json")
+    committer = GroupCommitter(load=lambda: data_manager.read_data(), store=lambda data: data_manager.write_data(data),
+                               window_sec=0, lock_file=f"{app_file}.lock")
+    for attribute, value in (("APP_FILE", app_file), ("STORE_FORMAT", "json"), ("_committer", committer),
+                             ("_record_changes", lambda changes: None)):
+        patcher = mock.patch.object(data_manager, attribute, value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class RetentionTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        _use_temp_store(self, tmp.name)
+        archive_dir = os.path.join(tmp.name, "archive")
+        for attribute, value in (("ARCHIVE_DIR", archive_dir),
+                                 ("CHECKPOINT_FILE", os.path.join(archive_dir, "_checkpoint.json")),
+                                 ("purge_removed", lambda apps, purge_files: 0)):
+            patcher = mock.patch.object(retention, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.store = {
+            f"app-{i}": {"application_id": f"app-{i}", "status": "APPROVED",
+                         "updated_at": f"2020-01-0{i + 1}T10:00:00Z"}
+            for i in range(5)
+        }
+        self.store["open"] = {"application_id": "open", "status": "PENDING_SELFIE",
+                              "updated_at": "2020-01-01T10:00:00Z"}
+        data_manager.write_data(self.store)
+
+    def _archived_ids(self):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(retention.ARCHIVE_DIR)
+                 for name in names if name.endswith(".gz")]
+        return sorted(app["application_id"] for path in paths for app in retention.iter_archive(path))
+
+    def test_archives_and_removes_terminal_applications(self):
+        state = retention.run_retention(max_age_days=30, batch_size=2, log=lambda message: None)
+        self.assertEqual((state["archived"], state["batch_number"]), (5, 3))
+        self.assertEqual(self._archived_ids(), [f"app-{i}" for i in range(5)])
+        self.assertEqual(list(data_manager.read_data()), ["open"])
+
+    def test_resuming_an_interrupted_batch_does_not_duplicate_it(self):
+        run_id = "20240101T000000-deadbeef"
+        os.makedirs(os.path.join(retention.ARCHIVE_DIR, "2020", "01", "02"))
+        # Batch 1 crashed after writing one of its partitions and part of another
+        retention._archive_batch([self.store["app-0"]], run_id, 1, "gzip")
+        open(os.path.join(retention.ARCHIVE_DIR, "2020", "01", "02", f"{run_id}-000001.jsonl.gz.tmp"), "wb").close()
+        retention._write_checkpoint({
+            "run_id": run_id, "cutoff": "2021-01-01T00:00:00Z", "compression": "gzip", "purge": False,
+            "batch_number": 1, "batch_ids": ["app-0", "app-1"], "batch_files": [], "phase": "archiving",
+            "archived": 0, "blobs_purged": 0
+        })
+
+        state = retention.run_retention(batch_size=2, log=lambda message: None)
+        self.assertEqual((state["archived"], state["batch_number"]), (5, 3))
+        self.assertEqual(self._archived_ids(), [f"app-{i}" for i in range(5)])
+        leftovers = [name for _, _, names in os.walk(retention.ARCHIVE_DIR) for name in names if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+
+class ExportTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        _use_temp_store(self, tmp.name)
+
+    def test_json_store_is_parsed_record_by_record(self):
+        store = {
+            f"app-{i}": {"application_id": f"app-{i}", "name": 'Zoë "Z" O\'Brien, Jr.', "score": i / 3,
+                         "flags": [None, True, {"nested": "}{,:"}]}
+            for i in range(50)
+        }
+        for name in ("json", "json-pretty"):
+            path = os.path.join(self.dir, f"{name}.json")
+            with open(path, "wb") as f:
+                f.write(store_formats.get_format(name).dumps(store))
+            with self.subTest(name), open(path, encoding="utf-8") as f:
+                # Chunks far smaller than a record cross every token boundary
+                self.assertEqual(dict(store_formats.iter_json_object(f, chunk_size=7)), store)
+
+    def test_truncated_json_store_is_an_error(self):
+        path = os.path.join(self.dir, "broken.json")
+        with open(path, "w") as f:
+            f.write('{"a": {"application_id": "a"}, "b": {"applic')
+        with self.assertRaises(ValueError), open(path) as f:
+            list(store_formats.iter_json_object(f, chunk_size=4))
+
+    def test_export_filters_and_streams_the_store(self):
+        data_manager.write_data({
+            "a": {"application_id": "a", "status": "APPROVED", "updated_at": "2024-05-01T00:00:00Z"},
+            "b": {"application_id": "b", "status": "REJECTED", "updated_at": "2024-05-01T00:00:00Z"},
+            "c": {"application_id": "c", "status": "APPROVED", "updated_at": "2023-01-01T00:00:00Z"},
+        })
+        chunks = export.iter_export("jsonl", statuses={"APPROVED"}, since=export.parse_since("2024-01-01"))
+        lines = b"".join(chunks).splitlines()
+        self.assertEqual([json.loads(line)["application_id"] for line in lines], ["a"])
+
+    def test_csv_cells_cannot_start_a_formula(self):
+        data_manager.write_data({"=1+1": {
+            "application_id": "=1+1", "status": "REJECTED", "risk_score": 80,
+            "explanations": ["@SUM(A1)", "ok"], "risk_analysis": {"decision": "-2+3", "analyzed_at": "+x"}
+        }})
+        rows = b"".join(export.iter_export("csv")).decode("utf-8").splitlines()
+        self.assertEqual(rows[1].split(",")[:6], ["'=1+1", "REJECTED", "", "", "'-2+3", "80"])
+        self.assertIn("'@SUM(A1) | ok", rows[1])
+        self.assertIn("'+x", rows[1])
+
+
+class BulkImportTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        _use_temp_store(self, tmp.name)
+        index = identity_index.IdentityIndex(os.path.join(tmp.name, "identity.sqlite3"))
+        for target, attribute, value in ((identity_index, "_index", index),
+                                         (watchlist, "get_index", lambda: watchlist.WatchlistIndex([]))):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _import(self, records, **kwargs):
+        return bulk_import.import_applications(records, chunk_size=64, log=lambda message: None, **kwargs)
+
+    def test_synthetic_applications_import_in_chunks(self):
+        summary = self._import(synthetic.generate_applications(300, seed=7))
+        self.assertEqual((summary["read"], summary["invalid"], summary["inserted"]), (300, 0, 300))
+        self.assertEqual(len(data_manager.read_data()), 300)
+
+        summary = self._import(synthetic.generate_applications(300, seed=7), overwrite=False)
+        self.assertEqual((summary["inserted"], summary["skipped"]), (0, 300))
+
+    def test_invalid_records_are_reported_and_skipped(self):
+        valid = next(synthetic.generate_applications(1, seed=1))
+        summary = self._import([{"application_id": "x"}, "nope", {**valid, "status": "SHIPPED"}, valid])
+        self.assertEqual((summary["invalid"], summary["inserted"]), (3, 1))
+        self.assertEqual([error["record"] for error in summary["errors"]], [1, 2, 3])
+        self.assertIn("unknown status 'SHIPPED'", summary["errors"][2]["problems"])
+
+    def test_generated_states_and_duplicates_survive_rescoring(self):
+        apps = list(synthetic.generate_applications(400, seed=11))
+        self.assertTrue({"EXPIRED", "REJECTED_ADDRESS_PROOF"} <= {app["status"] for app in apps})
+        self._import(apps)
+
+        duplicates = [app for app in apps if any("other application(s)" in line for line in app["explanations"])
+                      and not any("watchlist" in line for line in app["explanations"])]
+        self.assertTrue(duplicates)
+        _, decisions, explanations = risk_engine.evaluate_batch(duplicates, rng=np.random.default_rng(0))
+        self.assertEqual(list(decisions), [app["status"] for app in duplicates])
+        self.assertEqual(explanations, [app["explanations"] for app in duplicates])
+
+    def test_separate_runs_use_separate_document_numbers(self):
+        numbers = [
+            {(app["extracted_data"] or {}).get("document_number") for app in synthetic.generate_applications(50, seed)}
+            - {None}
+            for seed in (1, 2)
+        ]
+        self.assertFalse(numbers[0] & numbers[1])
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(3).lognormal(0.5, 0.8, 5000).tolist()
+
+    def test_quantiles_are_within_the_relative_accuracy(self):
+        sketch = stats.QuantileSketch(relative_accuracy=0.01)
+        for value in self.values:
+            sketch.add(value)
+        ordered = sorted(self.values)
+        for q in (0.5, 0.9, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, 0.01, q)
+
+    def test_merged_sketches_equal_one_sketch_of_all_values(self):
+        whole, first, second = stats.QuantileSketch(), stats.QuantileSketch(), stats.QuantileSketch()
+        for i, value in enumerate(self.values + [0.0]):
+            whole.add(value)
+            (first if i % 3 else second).add(value)
+        merged = stats.QuantileSketch.from_dict(json.loads(json.dumps(first.to_dict()))).merge(second)
+        self.assertEqual((merged.buckets, merged.zero_count, merged.count), (whole.buckets, whole.zero_count, whole.count))
+        self.assertEqual(merged.summary()["p90"], whole.summary()["p90"])
+
+
+class WorkerStatsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for attribute, value in (("DATA_DIR", tmp.name),
+                                 ("CHECKPOINT_FILE", os.path.join(tmp.name, "stats_checkpoint.json")),
+                                 ("LOCK_FILE", os.path.join(tmp.name, "stats.lock")),
+                                 ("CHECKPOINT_INTERVAL_SEC", 3600)):
+            patcher = mock.patch.object(stats, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(stats._state, {"base": None, "base_version": None, "pid": None, "token": None,
+                                                 "generation": None, "statuses": {}, "sketches": {},
+                                                 "last_checkpoint": 0.0, "dirty": False})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        stats.rebuild([{"status": "APPROVED"}, {"status": "APPROVED"}, {"status": "PENDING_SELFIE"}])
+
+    def _write_worker(self, token, pid, statuses, risk_times=()):
+        sketch = stats.QuantileSketch()
+        for seconds in risk_times:
+            sketch.add(seconds)
+        sketches = {**stats._empty_sketches(), "risk": sketch}
+        stats._write_json(os.path.join(stats.DATA_DIR, f"stats-{socket.gethostname()}-{pid}-{token}.json"), {
+            "generation": stats._state["base"]["generation"], "host": socket.gethostname(), "pid": pid,
+            "token": token, **stats._dump_counts(statuses, sketches)
+        })
+
+    def test_other_workers_changes_are_added_to_the_base(self):
+        stats.record_transitions([("PENDING_SELFIE", "APPROVED")])
+        self._write_worker("other", os.getpid(), {"APPROVED": 1, "MANUAL_REVIEW": 1}, risk_times=[1.0, 1.0])
+        result = stats.get_stats()
+        self.assertEqual(result["statuses"], {"APPROVED": 4, "MANUAL_REVIEW": 1})
+        self.assertEqual(result["processing_time_sec"]["risk"]["count"], 2)
+
+    def test_exited_workers_are_folded_in_once(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        self._write_worker("gone", exited.pid, {"PENDING_SELFIE": -1, "REJECTED": 1})
+        stats.record_transitions([(None, "PENDING_DOCUMENTS")])
+        stats.checkpoint()
+        self.assertEqual(stats._read_json(stats.CHECKPOINT_FILE)["statuses"], {"APPROVED": 2, "REJECTED": 1})
+        self.assertEqual(stats.get_stats()["statuses"], {"APPROVED": 2, "REJECTED": 1, "PENDING_DOCUMENTS": 1})
+
+
+class ExpiryTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        _use_temp_store(self, tmp.name)
+        def record_changes(changes):
+            expiry.track_changes((app_id, app) for app_id, _, app in changes)
+
+        patcher = mock.patch.object(data_manager, "_record_changes", record_changes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(expiry._state, {"built": False, "pending": None, "heap": [], "tracked": {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def ago(hours):
+            return (datetime.utcnow() - timedelta(hours=hours)).isoformat() + "Z"
+
+        self.recent = ago(1)
+        data_manager.write_data({
+            app_id: {"application_id": app_id, "status": status, "updated_at": updated_at, "explanations": []}
+            for app_id, status, updated_at in (
+                ("stale", "PENDING_DOCUMENTS", ago(48)),
+                ("fresh", "PENDING_SELFIE", self.recent),
+                ("review", "MANUAL_REVIEW", ago(24 * 365)),
+                ("done", "APPROVED", ago(24 * 365)),
+            )
+        })
+
+    def test_only_overdue_applications_expire(self):
+        self.assertEqual(expiry.sweep(dry_run=True), ["stale"])
+        self.assertEqual(expiry.sweep(), ["stale"])
+        stored = data_manager.read_data()
+        self.assertEqual({app_id: app["status"] for app_id, app in stored.items()},
+                         {"stale": "EXPIRED", "fresh": "PENDING_SELFIE", "review": "MANUAL_REVIEW", "done": "APPROVED"})
+        self.assertEqual(stored["stale"]["explanations"], ["Application expired after 24 hours in PENDING_DOCUMENTS."])
+        self.assertEqual(expiry.sweep(), [])
+
+    def test_next_deadline_follows_transitions(self):
+        fresh_deadline = expiry._deadline({"status": "PENDING_SELFIE", "updated_at": self.recent})
+        expiry.sweep()
+        self.assertEqual(expiry.next_deadline(), fresh_deadline)
+        data_manager.update_application("fresh", {"status": "MANUAL_REVIEW"})
+        self.assertIsNone(expiry.next_deadline())
+
+    def test_application_changed_since_indexing_is_left_alone(self):
+        expiry.sweep(now=time.time() - 3600 * 24 * 30)
+        data_manager.update_application("stale", {"status": "PENDING_ID_DOCUMENT"})
+        candidates = [("stale", "PENDING_DOCUMENTS", "2000-01-01T00:00:00Z", "expired")]
+        self.assertEqual(data_manager.expire_applications(candidates), [])
+        self.assertEqual(data_manager.get_application("stale")["status"], "PENDING_ID_DOCUMENT")
+        self.assertEqual(expiry.sweep(), [])
+
+
+class AsyncJsonHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = AsyncJsonHandler(stream=self.stream)
+        self.addCleanup(self.handler._stop)
+        self.logger = logging.getLogger("api.tests.structured_log")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_listener_starts_on_the_first_record(self):
+        self.assertIsNone(self.handler.listener)
+        self.logger.warning("Risk analysis complete", extra={"application_id": "a", "risk_score": 5})
+        self.handler._stop()
+        entry = json.loads(self.stream.getvalue())
+        self.assertEqual((entry["event"], entry["application_id"], entry["risk_score"]),
+                         ("Risk analysis complete", "a", 5))
+
+    def test_forked_process_starts_its_own_listener(self):
+        self.logger.warning("parent")
+        parent_listener = self.handler.listener
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            self.logger.warning("child")
+            self.assertIsNot(self.handler.listener, parent_listener)
+            self.handler._stop()
+        parent_listener.stop()
+        self.assertEqual(sorted(json.loads(line)["event"] for line in self.stream.getvalue().splitlines()),
+                         ["child", "parent"])
+
+
+class TracingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.middleware = tracing.TracingMiddleware(lambda request: HttpResponse("ok"))
+        patcher = mock.patch.object(tracing, "_exporter")
+        self.exporter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, **headers):
+        return self.middleware(RequestFactory().get("/api/v1/stats/", headers=headers))
+
+    def test_no_trace_headers_when_tracing_is_disabled(self):
+        with mock.patch.object(tracing, "ENABLED", False):
+            response = self._get(traceparent=f"00-{'a' * 32}-{'b' * 16}-01")
+        self.assertNotIn(tracing.TRACE_ID_HEADER, response)
+        self.assertNotIn(tracing.TRACEPARENT_HEADER, response)
+        self.exporter.export.assert_not_called()
+
+    def test_no_trace_headers_for_unsampled_requests(self):
+        with mock.patch.object(tracing, "ENABLED", True), mock.patch.object(tracing, "SAMPLE_RATE", 0.0):
+            response = self._get()
+        self.assertNotIn(tracing.TRACE_ID_HEADER, response)
+
+    def test_recorded_requests_return_their_trace(self):
+        with mock.patch.object(tracing, "ENABLED", True), mock.patch.object(tracing, "SAMPLE_RATE", 0.0):
+            response = self._get(traceparent=f"00-{'a' * 32}-{'b' * 16}-01")
+        self.assertEqual(response[tracing.TRACE_ID_HEADER], "a" * 32)
+        self.assertTrue(response[tracing.TRACEPARENT_HEADER].startswith(f"00-{'a' * 32}-"))
+        self.exporter.export.assert_called_once()
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for attribute, value in (("PROFILING_TOKEN", "secret"), ("PROFILE_DIR", tmp.name)):
+            patcher = mock.patch.object(profiling, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+
+        def view(request):
+            self.calls.append(request.path)
+            return HttpResponse("ok")
+
+        self.middleware = profiling.ProfilingMiddleware(view)
+
+    def test_token_is_only_accepted_in_the_header(self):
+        factory = RequestFactory()
+        self.assertFalse(profiling.is_authorized(factory.get("/api/v1/stats/", {"_profile": "secret"})))
+        self.assertFalse(profiling.is_authorized(factory.get("/api/v1/stats/", headers={"X-SmartKYC-Profile": "nope"})))
+        self.assertTrue(profiling.is_authorized(factory.get("/api/v1/stats/", headers={"X-SmartKYC-Profile": "secret"})))
+
+    def test_profiled_request_saves_a_profile(self):
+        response = self.middleware(RequestFactory().get("/api/v1/stats/", headers={"X-SmartKYC-Profile": "secret"}))
+        self.assertEqual(response["X-Profile-Mode"], "cprofile")
+        self.assertIn("(view)", profiling.load_profile(response["X-Profile-Id"], "pstats"))
+
+    def test_second_cprofile_run_is_refused(self):
+        with profiling._cprofile_lock:
+            response = self.middleware(RequestFactory().get("/api/v1/stats/", headers={"X-SmartKYC-Profile": "secret"}))
+        self.assertEqual((response.status_code, self.calls), (409, []))
+        response = self.middleware(RequestFactory().get("/api/v1/stats/", headers={"X-SmartKYC-Profile": "secret"}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_forked_worker_starts_its_own_sampler(self):
+        with mock.patch.object(profiling, "_run_sampler", lambda: None), \
+                mock.patch.dict(profiling._sampler, {"thread": None, "pid": None}):
+            profiling.start_sampler()
+            parent_thread = profiling._sampler["thread"]
+            profiling._sampler["counts"]["inherited"] += 1
+            with mock.patch("os.getpid", return_value=os.getpid() + 1):
+                profiling.start_sampler()
+            self.assertIsNot(profiling._sampler["thread"], parent_thread)
+            self.assertEqual(profiling._sampler["counts"], {})
+
+
+class ProjectionTests(SimpleTestCase):
+    app = {
+        "application_id": "app-1",
+        "status": "MANUAL_REVIEW",
+        "risk_score": 40,
+        "explanations": ["Watchlist match."],
+        "model_info": {"version": "v2"},
+        "documents": {
+            "id_card": {"document_type": "ID_CARD", "status": "CLEAR", "forensics": {"ela": 0.1},
+                        "extracted_data": {"first_name": "JANE", "dob": "1990-01-01"}},
+            "address_proof": {"document_type": "UTILITY_BILL", "status": "CLEAR", "forensics": {}},
+        },
+        "selfie": {"status": "CLEAR", "ai_analysis": {"match_score": 0.91}},
+    }
+
+    def test_summary_view_drops_forensics_and_model_info(self):
+        representation, project = projection.projection_for({"view": "summary"})
+        self.assertEqual(representation, "summary")
+        self.assertEqual(project(self.app), {
+            "application_id": "app-1", "status": "MANUAL_REVIEW", "risk_score": 40,
+            "explanations": ["Watchlist match."],
+            "documents": {"id_card": {"document_type": "ID_CARD", "status": "CLEAR"},
+                          "address_proof": {"document_type": "UTILITY_BILL", "status": "CLEAR"}},
+            "selfie": {"status": "CLEAR"},
+        })
+        self.assertEqual(projection.projection_for({}), ("full", None))
+
+    def test_fields_select_nested_paths_and_skip_missing_ones(self):
+        representation, project = projection.projection_for(
+            {"fields": "status, documents.*.status,documents.id_card.extracted_data.dob,nope.x,status"}
+        )
+        self.assertEqual(representation, "fields:status,documents.*.status,documents.id_card.extracted_data.dob,nope.x")
+        self.assertEqual(project(self.app), {
+            "status": "MANUAL_REVIEW",
+            "documents": {"id_card": {"status": "CLEAR", "extracted_data": {"dob": "1990-01-01"}},
+                          "address_proof": {"status": "CLEAR"}},
+        })
+
+    def test_shorter_path_selects_the_whole_subtree(self):
+        project = projection.compile_projection(("selfie.ai_analysis", "selfie"))
+        self.assertEqual(project(self.app), {"selfie": self.app["selfie"]})
+        self.assertIs(projection.compile_projection(("status",)), projection.compile_projection(("status",)))
+
+    def test_invalid_fields_are_rejected(self):
+        for query in ({"fields": ""}, {"fields": "status,documents..status"}, {"fields": "a;b"},
+                      {"fields": ",".join(f"f{i}" for i in range(projection.MAX_FIELDS + 1))},
+                      {"view": "forensics"}):
+            with self.assertRaises(projection.InvalidFields):
+                projection.projection_for(query)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        _use_temp_store(self, tmp.name)
+        self.cache = response_cache.ResponseCache()
+        for target, attribute, value in (
+                (response_cache, "_cache", self.cache),
+                (data_manager, "_record_changes",
+                 lambda changes: response_cache.invalidate(app_id for app_id, _, _ in changes))):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        data_manager.write_data({"app-1": {"application_id": "app-1", "status": "PENDING_SELFIE",
+                                           "updated_at": "2024-01-01T00:00:00Z", "notes": "x" * 2000}})
+        self.factory = RequestFactory()
+
+    def _get(self, query="", **headers):
+        response = views.get_application_status(self.factory.get(f"/api/applications/app-1/{query}", **headers),
+                                                app_id="app-1")
+        content = response.content
+        if response.get("Content-Encoding") == "gzip":
+            content = gzip.decompress(content)
+        return response, json.loads(content)
+
+    def test_unchanged_application_is_served_from_the_cache(self):
+        first, body = self._get()
+        second, cached = self._get()
+        self.assertEqual((first["X-Response-Cache"], second["X-Response-Cache"]), ("miss", "hit"))
+        self.assertEqual(cached, body)
+        summary, _ = self._get("?view=summary")
+        self.assertEqual(summary["X-Response-Cache"], "miss")
+
+    def test_update_invalidates_the_cached_body(self):
+        self._get()
+        data_manager.update_application("app-1", {"status": "MANUAL_REVIEW"})
+        self.assertEqual(self.cache._entries, {})
+        response, body = self._get()
+        self.assertEqual((response["X-Response-Cache"], body["status"]), ("miss", "MANUAL_REVIEW"))
+
+    def test_write_by_another_worker_misses_on_the_new_version(self):
+        self._get()
+        # Written without this process's _record_changes, as another worker would
+        stored = data_manager.read_data()
+        stored["app-1"] = dict(stored["app-1"], status="APPROVED", updated_at="2024-01-02T00:00:00Z")
+        data_manager.write_data(stored)
+        response, body = self._get()
+        self.assertEqual((response["X-Response-Cache"], body["status"]), ("miss", "APPROVED"))
+
+    def test_compressed_variants_are_cached_per_encoding(self):
+        _, plain = self._get()
+        response, body = self._get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual((response["Content-Encoding"], response["X-Response-Cache"]), ("gzip", "miss"))
+        self.assertEqual(body, plain)
+        cached = self.cache.get_or_encode("app-1", "2024-01-01T00:00:00Z", "full", "gzip", lambda: self.fail())
+        self.assertEqual((cached[0], cached[1:]), (response.content, ("gzip", True)))
+        self.assertEqual(response_cache.negotiate_encoding("gzip;q=0, identity", 4096), None)
+        self.assertEqual(response_cache.negotiate_encoding("gzip", 10), None)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = response_cache.ResponseCache(max_entries=2)
+        for app_id in ("a", "b", "a", "c"):
+            cache.get_or_encode(app_id, "v1", "full", None, lambda: b"{}")
+        self.assertEqual(list(cache._entries), ["a", "c"])
+        self.assertEqual(cache.size, 4)
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = rate_limit.TokenBucketStore(os.path.join(tmp.name, "rate_limits.sqlite3"))
+        patcher = mock.patch.object(rate_limit, "_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def _allow(self, throttle_class, app_id="app-1", **headers):
+        throttle = throttle_class()
+        view = mock.Mock(kwargs={"app_id": app_id})
+        return throttle.allow_request(self.factory.get("/", **headers), view), throttle.wait()
+
+    def test_bucket_rejects_when_empty_and_refills_over_time(self):
+        buckets = [("k", 2, 1.0)]
+        self.assertEqual(self.store.take(buckets, now=100.0), (True, 0.0))
+        self.assertEqual(self.store.take(buckets, now=100.0), (True, 0.0))
+        self.assertEqual(self.store.take(buckets, now=100.5), (False, 0.5))
+        self.assertEqual(self.store.take(buckets, now=101.0), (True, 0.0))
+
+    def test_a_rejected_request_charges_no_bucket(self):
+        self.store.take([("full", 1, 0.1)], now=0.0)
+        self.assertFalse(self.store.take([("open", 5, 1.0), ("full", 1, 0.1)], now=0.0)[0])
+        # 'open' was not charged by the rejected request
+        for _ in range(5):
+            self.assertTrue(self.store.take([("open", 5, 1.0)], now=0.0)[0])
+        self.assertFalse(self.store.take([("open", 5, 1.0)], now=0.0)[0])
+
+    def test_expensive_endpoints_are_limited_by_default(self):
+        self.assertTrue(rate_limit.ENABLED)
+        capacity = int(rate_limit.LIMITS["expensive"]["application"][0])
+        for _ in range(capacity):
+            self.assertEqual(self._allow(rate_limit.ExpensiveRateThrottle), (True, None))
+        allowed, wait = self._allow(rate_limit.ExpensiveRateThrottle)
+        self.assertFalse(allowed)
+        self.assertGreaterEqual(wait, 1)
+        # Other applications have their own bucket
+        self.assertTrue(self._allow(rate_limit.ExpensiveRateThrottle, app_id="app-2")[0])
+
+    def test_unconfigured_cheap_scope_does_not_touch_the_store(self):
+        with mock.patch.object(self.store, "take", side_effect=AssertionError("store written")):
+            for _ in range(1000):
+                self.assertTrue(self._allow(rate_limit.CheapRateThrottle)[0])
+
+    def test_configured_limits_override_the_defaults(self):
+        with mock.patch.dict(os.environ, {"SMARTKYC_RATE_LIMITS": "cheap.ip=2/60,expensive.application=0/60"}):
+            limits = rate_limit._load_limits()
+        self.assertEqual(limits["cheap"], {"ip": (2.0, 2.0 / 60)})
+        self.assertNotIn("application", limits["expensive"])
+        self.assertIn("ip", limits["expensive"])
+        with mock.patch.object(rate_limit, "LIMITS", limits):
+            self.assertTrue(self._allow(rate_limit.CheapRateThrottle, HTTP_X_API_KEY="k")[0])
+            self.assertTrue(self._allow(rate_limit.CheapRateThrottle)[0])
+            self.assertFalse(self._allow(rate_limit.CheapRateThrottle)[0])
+
+
+def _jpeg(size, orientation=None):
+    from PIL import Image
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+class PreprocessingTests(SimpleTestCase):
+    def setUp(self):
+        if preprocessing.Image is None:
+            self.skipTest("Pillow is not installed")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for attribute, value in (("CACHE_DIR", tmp.name), ("_maybe_prune", lambda: None)):
+            patcher = mock.patch.object(preprocessing, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_variants_are_downscaled_oriented_and_cached(self):
+        # Orientation 6: stored landscape, displayed portrait
+        image_bytes = _jpeg((3000, 2000), orientation=6)
+        first = preprocessing.preprocess(image_bytes, preprocessing.DOCUMENT_TARGETS)
+        self.assertFalse(first.cached)
+        self.assertEqual(first.source_size, (3000, 2000))
+        self.assertEqual(first.variants["ocr"].shape, (1600, 1067))
+        self.assertEqual(first.variants["forensics"].shape, (1024, 683, 3))
+
+        second = preprocessing.preprocess(image_bytes, preprocessing.DOCUMENT_TARGETS)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.describe(), dict(first.describe(), cached=True))
+        np.testing.assert_array_equal(second.variants["ocr"], first.variants["ocr"])
+        # A target not cached yet decodes the upload again
+        self.assertFalse(preprocessing.preprocess(image_bytes, preprocessing.SELFIE_TARGETS).cached)
+
+    def test_small_images_are_not_upscaled(self):
+        result = preprocessing.preprocess(_jpeg((300, 200)), preprocessing.SELFIE_TARGETS)
+        self.assertEqual(result.variants["face"].shape, (200, 300, 3))
+        face = preprocessing.model_input(result.variants["face"], "RGB")
+        self.assertEqual((face.dtype, face.shape), (np.float32, (200, 300, 3)))
+
+    def test_undecodable_or_oversized_uploads_are_refused(self):
+        self.assertIsNone(preprocessing.preprocess(b"", preprocessing.SELFIE_TARGETS))
+        with self.assertLogs("api.preprocessing", "INFO") as logs, \
+                mock.patch.object(preprocessing, "MAX_PIXELS", 1000):
+            self.assertIsNone(preprocessing.preprocess(b"not an image", preprocessing.SELFIE_TARGETS))
+            self.assertIsNone(preprocessing.preprocess(_jpeg((100, 100)), preprocessing.SELFIE_TARGETS))
+        self.assertEqual([record.getMessage() for record in logs.records], ["Upload not preprocessed"] * 2)
+
+    def test_prune_drops_expired_then_least_recently_used_uploads(self):
+        digests = []
+        for i, width in enumerate((100, 110, 120)):
+            image_bytes = _jpeg((width, 100))
+            preprocessing.preprocess(image_bytes, preprocessing.SELFIE_TARGETS)
+            digest = preprocessing.content_hash(image_bytes)
+            os.utime(preprocessing._meta_path(digest), (1000.0 * (i + 1), 1000.0 * (i + 1)))
+            digests.append(digest)
+        self.assertEqual(preprocessing.prune_cache(now=3500.0, ttl_sec=2000.0, max_bytes=1 << 30), 1)
+        self.assertIsNone(preprocessing.load_variants(digests[0], preprocessing.SELFIE_TARGETS))
+        sizes = preprocessing._cache_entries()
+        self.assertEqual(preprocessing.prune_cache(now=3500.0, ttl_sec=1e9, max_bytes=sizes[digests[2]][1]), 1)
+        self.assertEqual(list(preprocessing._cache_entries()), [digests[2]])
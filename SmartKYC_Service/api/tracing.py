@@ -0,0 +1,334 @@
+# api/tracing.py
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+
+# Tracing is off unless enabled; disabled spans are shared no-op objects.
+ENABLED = os.environ.get('SMARTKYC_TRACING', '0') == '1'
+# Fraction of new traces that are recorded (an incoming sampled traceparent is always recorded)
+SAMPLE_RATE = float(os.environ.get('SMARTKYC_TRACE_SAMPLE_RATE', '1.0'))
+
+# Spans are appended to a rotating file per worker process
+# (trace-<host>-<pid>.json) in the Chrome trace event format, which loads
+# directly into Perfetto (ui.perfetto.dev) or chrome://tracing.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+TRACE_DIR = os.environ.get('SMARTKYC_TRACE_DIR', os.path.join(DATA_DIR, 'traces'))
+MAX_FILE_BYTES = int(os.environ.get('SMARTKYC_TRACE_MAX_BYTES', str(50 * 1024 * 1024)))
+BACKUP_COUNT = int(os.environ.get('SMARTKYC_TRACE_BACKUPS', '5'))
+
+# W3C Trace Context (what OpenTelemetry propagates), plus a plain trace id header
+TRACEPARENT_HEADER = 'traceparent'
+TRACE_ID_HEADER = 'X-Trace-Id'
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_current = contextvars.ContextVar('smartkyc_span', default=None)
+
+
+class Span:
+    """
+    One timed operation, with OpenTelemetry semantics: a 128-bit trace id
+    shared by the whole request, a 64-bit span id, the parent span id,
+    a kind (SERVER for the request, INTERNAL otherwise), attributes and a
+    status of OK or ERROR.
+
+    Use as a context manager; the span becomes the current span inside it.
+    """
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'kind', 'attributes', 'status',
+                 'start_us', '_start_ns', 'duration_us', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, kind="INTERNAL", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = "OK"
+        self.start_us = None
+        self.duration_us = None
+        self._start_ns = None
+        self._token = None
+
+    sampled = True
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_us = time.time_ns() // 1000
+        self._start_ns = time.perf_counter_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_us = (time.perf_counter_ns() - self._start_ns) // 1000
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+            self.attributes['exception.type'] = exc_type.__name__
+            self.attributes['exception.message'] = str(exc)
+        _exporter.export(self)
+        return False
+
+
+class _UnsampledSpan:
+    """
+    Carries the trace id of an unsampled (or disabled) trace so it still
+    propagates, without timing or exporting anything.
+    """
+
+    __slots__ = ('trace_id', 'span_id', '_token')
+    sampled = False
+
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self._token = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+    sampled = False
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+# --- Span API ---
+
+def _new_trace_id():
+    return '%032x' % random.getrandbits(128)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_trace_id():
+    active = _current.get()
+    return active.trace_id if active is not None else None
+
+
+def span(name, **attributes):
+    """
+    Starts a child of the current span (or a new trace when there is none).
+    Nothing is recorded when tracing is disabled or the trace is unsampled.
+    """
+    if not ENABLED:
+        return _NOOP
+    parent = _current.get()
+    if parent is None:
+        if random.random() >= SAMPLE_RATE:
+            return _UnsampledSpan(_new_trace_id(), None)
+        return Span(name, _new_trace_id(), attributes=attributes)
+    if not parent.sampled:
+        return _NOOP
+    return Span(name, parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+
+
+def traced(name=None, **attributes):
+    """Decorator form of span(); the span is named after the function by default."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(func):
+    """
+    Binds func to the current trace context, for handing work to another
+    thread (threading.Thread(target=tracing.propagate(fn))). Spans the
+    thread opens become children of the span that started it.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return wrapper
+
+
+def start_request_span(name, headers):
+    """
+    Opens the root (SERVER) span of a request. The trace is continued from
+    a W3C traceparent header, or from X-Trace-Id; otherwise a new trace
+    is started. An incoming sampled flag forces recording.
+    """
+    trace_id, parent_id, forced = None, None, False
+    match = _TRACEPARENT.match(headers.get(TRACEPARENT_HEADER, '').strip().lower())
+    if match:
+        trace_id, parent_id = match.group(1), match.group(2)
+        forced = int(match.group(3), 16) & 0x01 == 1
+    else:
+        candidate = headers.get(TRACE_ID_HEADER, '').strip().lower().replace('-', '')
+        if _TRACE_ID.match(candidate):
+            trace_id = candidate
+    trace_id = trace_id or _new_trace_id()
+
+    if not ENABLED or not (forced or random.random() < SAMPLE_RATE):
+        return _UnsampledSpan(trace_id, parent_id)
+    return Span(name, trace_id, parent_id=parent_id, kind="SERVER")
+
+
+def traceparent(span_obj):
+    """Formats the W3C traceparent header for a span."""
+    span_id = span_obj.span_id or '%016x' % random.getrandbits(64)
+    return f"00-{span_obj.trace_id}-{span_id}-{'01' if span_obj.sampled else '00'}"
+
+
+# --- Exporter ---
+
+class ChromeTraceExporter:
+    """
+    Writes finished spans to this process's trace file on a background
+    thread. Worker processes each write their own file, as the profiling
+    sampler does, so no two processes append to or rotate the same one.
+
+    Each span is a Chrome trace 'complete' event (ph 'X'); the file is a
+    JSON array whose closing bracket is optional in that format, so it
+    can be appended to and still be opened at any time. When the file
+    exceeds MAX_FILE_BYTES it is rotated to <file>.1 ... .N.
+    """
+
+    def __init__(self, directory=TRACE_DIR, max_bytes=MAX_FILE_BYTES, backup_count=BACKUP_COUNT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.path = None
+        self._queue = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def export(self, span_obj):
+        if self._pid != os.getpid():
+            # First span, or the first in a forked worker (the parent's thread did not survive the fork)
+            self._start()
+        self._queue.put(self._event(span_obj))
+
+    def _event(self, span_obj):
+        return {
+            "name": span_obj.name,
+            "cat": span_obj.kind.lower(),
+            "ph": "X",
+            "ts": span_obj.start_us,
+            "dur": span_obj.duration_us,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": {
+                "trace_id": span_obj.trace_id,
+                "span_id": span_obj.span_id,
+                "parent_id": span_obj.parent_id,
+                "status": span_obj.status,
+                **span_obj.attributes
+            }
+        }
+
+    def _start(self):
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                self.path = os.path.join(self.directory, f"trace-{socket.gethostname()}-{pid}.json")
+                self._queue = queue.SimpleQueue()
+                self._pid = pid
+                threading.Thread(target=self._run, args=(self._queue,), name="smartkyc-trace-exporter",
+                                 daemon=True).start()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(self.path, 'a', encoding='utf-8')
+        if f.tell() == 0:
+            f.write("[\n")
+        return f
+
+    def _rotate(self, f):
+        f.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        return self._open()
+
+    def _run(self, events):
+        f = self._open()
+        while True:
+            event = events.get()
+            f.write(json.dumps(event, default=str, separators=(',', ':')) + ",\n")
+            # Flush once the queue is drained, so bursts share one write
+            if events.empty():
+                f.flush()
+                if f.tell() >= self.max_bytes:
+                    f = self._rotate(f)
+
+
+_exporter = ChromeTraceExporter()
+
+
+# --- Middleware ---
+
+class TracingMiddleware:
+    """
+    Opens the SERVER span for every request, continuing the caller's
+    trace. The trace id (X-Trace-Id) and traceparent headers are returned
+    only when the request's span was recorded, i.e. there is a trace to
+    look up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        root = start_request_span(f"{request.method} {request.path}", request.headers)
+        with root:
+            root.set_attribute('http.method', request.method)
+            root.set_attribute('http.target', request.path)
+            response = self.get_response(request)
+            root.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500 and root.sampled:
+                root.status = "ERROR"
+
+        if root.sampled:
+            response[TRACE_ID_HEADER] = root.trace_id
+            response[TRACEPARENT_HEADER] = traceparent(root)
+        return response
@@ -7,11 +7,22 @@ urlpatterns = [
     # POST /api/v1/applications/start/
     path('applications/start/', views.start_application, name='start_application'),
 
-    # GET /api/v1/applications/<uuid:app_id>/
+    # GET /api/v1/applications/export/?format=jsonl|csv&status=&since=  (X-SmartKYC-Export-Token header)
+    path('applications/export/', views.export_applications, name='export_applications'),
+
+    # GET /api/v1/applications/<uuid:app_id>/?view=full|summary&fields=
     # We use re_path for a simple regex, but <uuid:app_id> is cleaner if we use it
     path('applications/<uuid:app_id>/', views.get_application_status, name='get_application_status'),
 
     path('applications/<uuid:app_id>/document/', views.upload_document, name='upload_document'),
     path('applications/<uuid:app_id>/selfie/', views.upload_selfie, name='upload_selfie'),
     path('applications/<uuid:app_id>/analyze/', views.analyze_application, name='analyze_application'),
-]
\ No newline at end of file
+
+    # GET /api/v1/stats/
+    path('stats/', views.get_stats, name='get_stats'),
+
+    # GET /api/v1/profiling/samples/ and /api/v1/profiling/<id>/?output=collapsed|pstats
+    # (require the SMARTKYC_PROFILING_TOKEN; see api/profiling.py)
+    path('profiling/samples/', views.get_profile_samples, name='get_profile_samples'),
+    path('profiling/<str:profile_id>/', views.get_profile, name='get_profile'),
+]
@@ -1,14 +1,49 @@
 # api/views.py
 
-from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from datetime import datetime
+
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, parser_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from . import data_manager
+from . import domain
 from . import ai_mocks
+from . import preprocessing
+from . import quality
+from .parsers import TracedFormParser, TracedMultiPartParser
+from .idempotency import idempotent
+from .rate_limit import CheapRateThrottle, ExpensiveRateThrottle
+from . import stats
+from . import profiling
+from . import projection
+from . import renderers
+from . import response_cache
+
+
+def _quality_rejection(model_inputs, kind):
+    """
+    Runs the capture-quality gate on a preprocessed upload. Returns a 422
+    response explaining what to fix, or None if the upload may go on to
+    the AI layer. A rejected capture is not saved, so the client can
+    simply upload a retake.
+    """
+    if model_inputs is None or not quality.ENABLED:
+        return None
+    report = quality.check(model_inputs, kind)
+    if report.passed:
+        return None
+    return Response(
+        {"error": report.reason, "quality": report.as_dict()},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
 
 
 @api_view(['POST'])
+@throttle_classes([CheapRateThrottle])
+@idempotent
 def start_application(request):
     """
     Starts a new KYC application process.
@@ -21,10 +56,21 @@ def start_application(request):
 
 
 @api_view(['GET'])
+@throttle_classes([CheapRateThrottle])
 def get_application_status(request, app_id):
     """
     Retrieves the status and data for a specific KYC application.
+
+    Query params:
+      view    full (default) or summary (status, decision, explanations and step statuses)
+      fields  optional, comma-separated dotted fields to return instead,
+              e.g. status,explanations,documents.*.status
     """
+    try:
+        representation, project = projection.projection_for(request.query_params)
+    except projection.InvalidFields as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
         # Convert app_id from URL (which is UUID object) to string
         app_id_str = str(app_id)
@@ -32,6 +78,23 @@ def get_application_status(request, app_id):
         application = data_manager.get_application(app_id_str)
 
         if application:
+            version = application.get('updated_at')
+            if version is not None and request.accepted_renderer.format == 'json':
+                # Serve the encoded body of this version; polls of an
+                # unchanged application skip serialization entirely
+                body, encoding, hit = response_cache.get_or_encode(
+                    app_id_str, version, representation, request.headers.get('Accept-Encoding'),
+                    lambda: renderers.dumps(project(application) if project else application)
+                )
+                response = HttpResponse(body, content_type='application/json')
+                if encoding:
+                    response['Content-Encoding'] = encoding
+                patch_vary_headers(response, ('Accept-Encoding',))
+                response['X-Response-Cache'] = 'hit' if hit else 'miss'
+                return response
+
+            if project is not None:
+                application = project(application)
             return Response(application, status=status.HTTP_200_OK)
         else:
             return Response({"error": "Application not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -41,7 +104,9 @@ def get_application_status(request, app_id):
 
 
 @api_view(['POST'])
-@parser_classes([MultiPartParser, FormParser])  # Tell DRF to handle files
+@parser_classes([TracedMultiPartParser, TracedFormParser])  # Tell DRF to handle files
+@throttle_classes([ExpensiveRateThrottle])
+@idempotent
 def upload_document(request, app_id):
     """
     Uploads a document for a specific KYC application.
@@ -56,6 +121,13 @@ def upload_document(request, app_id):
         if not application:
             return Response({"error": "Application not found"}, status=status.HTTP_404_NOT_FOUND)
 
+        # Expired applications must be started again
+        if application['status'] == domain.Status.EXPIRED:
+            return Response(
+                {"error": "Cannot upload document. Application status is 'EXPIRED'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         # 2. Get data from the multipart request
         document_type = request.data.get('document_type')
         file = request.FILES.get('file')
@@ -67,24 +139,29 @@ def upload_document(request, app_id):
             )
 
         # 3. Determine where to store this document
-        storage_key = None
-        if document_type in ["PASSPORT", "DRIVER_LICENSE", "TAMPERED_EXAMPLE"]:
-            storage_key = "id_document"
-        elif document_type == "UTILITY_BILL":
-            storage_key = "address_proof"
-
-        if not storage_key:
+        try:
+            document_type = domain.DocumentType(document_type)
+        except ValueError:
             return Response(
                 {"error": f"Invalid 'document_type': {document_type}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        storage_key = document_type.storage_key
 
         # 4. Call our "AI Engine"
         # We are not saving the file, just simulating its processing
         # In a real app, we'd save to S3 and pass the URL
         mock_file_path = f"uploads/{app_id_str}/{file.name}"
 
-        ai_result = ai_mocks.mock_document_intelligence(document_type, file.name)
+        # Bad captures are turned away here, before the (slow) AI call
+        model_inputs = preprocessing.preprocess(file.read(), preprocessing.DOCUMENT_TARGETS, app_id=app_id_str)
+        rejection = _quality_rejection(model_inputs, "document")
+        if rejection is not None:
+            return rejection
+
+        ai_result = ai_mocks.mock_document_intelligence(
+            document_type, file.name, app_id=app_id_str, model_inputs=model_inputs
+        )
 
         # 5. Save results and update workflow
         updated_application = data_manager.save_document_data(
@@ -102,7 +179,9 @@ def upload_document(request, app_id):
 
 
 @api_view(['POST'])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([TracedMultiPartParser, TracedFormParser])
+@throttle_classes([ExpensiveRateThrottle])
+@idempotent
 def upload_selfie(request, app_id):
     """
     Uploads a selfie for biometric and liveness verification.
@@ -118,7 +197,7 @@ def upload_selfie(request, app_id):
 
         # 2. === Workflow State Check ===
         # Only allow selfie upload if documents are done.
-        if application['status'] != "PENDING_SELFIE":
+        if application['status'] != domain.Status.PENDING_SELFIE:
             return Response(
                 {"error": f"Cannot upload selfie. Application status is '{application['status']}'."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -138,10 +217,18 @@ def upload_selfie(request, app_id):
         # 4. Call our "AI Engine"
         mock_file_path = f"uploads/{app_id_str}/{file.name}"
 
+        image_bytes = file.read()
+        model_inputs = preprocessing.preprocess(image_bytes, preprocessing.SELFIE_TARGETS, app_id=app_id_str)
+        rejection = _quality_rejection(model_inputs, "selfie")
+        if rejection is not None:
+            return rejection
+
         ai_result = ai_mocks.mock_biometric_verification(
             app_id_str,
             file.name,
-            trigger_fail=trigger_fail
+            trigger_fail=trigger_fail,
+            image_bytes=image_bytes,
+            model_inputs=model_inputs
         )
 
         # 5. Save results and update workflow
@@ -158,6 +245,8 @@ def upload_selfie(request, app_id):
 
 
 @api_view(['POST'])
+@throttle_classes([ExpensiveRateThrottle])
+@idempotent
 def analyze_application(request, app_id):
     """
     Triggers the final 'Risk Intelligence' AI layer to make a
@@ -172,7 +261,7 @@ def analyze_application(request, app_id):
 
         # 2. === Workflow State Check ===
         # Only allow analysis if selfie is done.
-        if application['status'] != "PENDING_RISK_ANALYSIS":
+        if application['status'] != domain.Status.PENDING_RISK_ANALYSIS:
             return Response(
                 {"error": f"Cannot analyze. Application status is '{application['status']}'."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -192,3 +281,96 @@ def analyze_application(request, app_id):
 
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@throttle_classes([CheapRateThrottle])
+def get_stats(request):
+    """
+    Returns the live KYC funnel, status counts, decision mix and AI
+    processing times. Maintained incrementally; no store scan per request.
+    """
+    try:
+        return Response(stats.get_stats(), status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# A plain Django view: DRF reserves ?format= for renderer selection,
+# and the export is written straight to the response as it is produced.
+@require_GET
+def export_applications(request):
+    """
+    Streams applications as JSONL or CSV. Token-gated (see
+    export.EXPORT_TOKEN) and charged to the expensive rate limit buckets.
+
+    Query params:
+      format  jsonl (default) or csv
+      status  optional, comma-separated list of statuses
+      since   optional ISO 8601 date/timestamp; only applications updated at or after it
+    """
+    # Imported on first use; most workers never serve an export
+    from . import export
+
+    if not export.is_authorized(request):
+        return JsonResponse({"error": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    # DRF throttles only run for API views; apply the same buckets here
+    throttle = ExpensiveRateThrottle()
+    if not throttle.allow_request(request, None):
+        response = JsonResponse({"error": "Request was throttled."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(throttle.wait())
+        return response
+
+    export_format = request.GET.get('format', 'jsonl')
+    if export_format not in export.EXPORT_FORMATS:
+        return JsonResponse(
+            {"error": f"Invalid format. Must be one of: {', '.join(export.EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    statuses = {s.strip() for s in request.GET.get('status', '').split(',') if s.strip()}
+    try:
+        since = export.parse_since(request.GET.get('since'))
+    except ValueError:
+        return JsonResponse({"error": "Invalid 'since'. Use an ISO 8601 date or timestamp."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        export.iter_export(export_format, statuses=statuses, since=since),
+        content_type=export.EXPORT_FORMATS[export_format]
+    )
+    filename = f"applications-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# --- Profiling (token-gated; see api/profiling.py) ---
+
+@require_GET
+def get_profile(request, profile_id):
+    """
+    Returns one request profile, by the X-Profile-Id of the profiled response.
+
+    Query params:
+      output  collapsed (default, flamegraph.pl / speedscope input) or pstats
+    """
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    output = request.GET.get('output', 'collapsed')
+    if output not in ("collapsed", "pstats"):
+        return JsonResponse({"error": "Invalid output. Must be one of: collapsed, pstats"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    text = profiling.load_profile(profile_id, output)
+    if text is None:
+        return JsonResponse({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+    return HttpResponse(text, content_type='text/plain; charset=utf-8')
+
+
+@require_GET
+def get_profile_samples(request):
+    """Returns the background sampler's stacks, merged across workers, as collapsed stacks."""
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    text = profiling.format_collapsed(profiling.aggregated_samples())
+    return HttpResponse(text, content_type='text/plain; charset=utf-8')
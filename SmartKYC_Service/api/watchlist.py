@@ -0,0 +1,301 @@
+# api/watchlist.py
+
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from . import tracing
+
+# Define the path to our local watchlist (CSV or JSON, kept next to applications.json)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+WATCHLIST_FILES = [
+    os.path.join(DATA_DIR, 'watchlist.csv'),
+    os.path.join(DATA_DIR, 'watchlist.json'),
+]
+
+# How often (seconds) to check the list file for changes
+RELOAD_CHECK_SEC = 5.0
+
+logger = logging.getLogger(__name__)
+
+# Character n-gram size for the inverted postings
+NGRAM_SIZE = 3
+
+# Postings longer than this are treated as stop-grams and skipped at query time
+MAX_POSTING_LENGTH = 50_000
+
+# Maximum number of candidates scored with the edit distance per query
+MAX_CANDIDATES = 256
+
+
+# --- Name Normalization ---
+
+def normalize_name(name):
+    """
+    Uppercases, strips punctuation and sorts tokens so that
+    'Doe, Jane' and 'JANE DOE' normalize to the same string.
+    """
+    tokens = re.sub(r'[^A-Z0-9 ]', ' ', str(name or '').upper()).split()
+    return ' '.join(sorted(tokens))
+
+
+def ngrams(normalized_name, n=NGRAM_SIZE):
+    """Returns the set of padded character n-grams of a normalized name."""
+    padded = f" {normalized_name} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _digit
+
+
+def soundex(token):
+    """American Soundex code of a single token (e.g. 'ROBERT' -> 'R163')."""
+    token = re.sub(r'[^A-Z]', '', token.upper())
+    if not token:
+        return ''
+
+    code = token[0]
+    previous = _SOUNDEX_CODES.get(token[0], '')
+    for letter in token[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "HW":
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def phonetic_key(normalized_name):
+    """Phonetic key of a whole name: the sorted Soundex codes of its tokens."""
+    return ' '.join(sorted(soundex(token) for token in normalized_name.split()))
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Levenshtein distance between a and b, or max_distance + 1 as soon as
+    the distance is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        # Only cells within max_distance of the diagonal can stay in bounds
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+        current = [max_distance + 1] * (len(b) + 1)
+        current[0] = i
+        row_min = current[0] if lo == 1 else max_distance + 1
+        for j in range(lo, hi + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return min(previous[len(b)], max_distance + 1)
+
+
+def max_distance_for(normalized_name):
+    """Edit budget that grows with the length of the name."""
+    return min(3, max(1, len(normalized_name) // 6))
+
+
+# --- Loading ---
+
+def load_entries(path):
+    """
+    Reads watchlist entries from a CSV (with a 'name' column) or a JSON list
+    of objects. Optional fields: 'entry_id', 'list_type' (e.g. SANCTIONS, PEP),
+    'country'.
+    """
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            rows = json.load(f)
+    else:
+        with open(path, 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    entries = []
+    for i, row in enumerate(rows):
+        if not row.get('name'):
+            continue
+        entries.append({
+            "entry_id": row.get('entry_id') or str(i),
+            "name": row['name'],
+            "list_type": (row.get('list_type') or "SANCTIONS").upper(),
+            "country": row.get('country') or None
+        })
+    return entries
+
+
+# --- Index ---
+
+class WatchlistIndex:
+    """
+    A precompiled, read-only fuzzy name index.
+
+    Names are stored once in normalized form. Character n-grams map to
+    sorted NumPy arrays of entry ids (inverted postings), and a phonetic key
+    maps to entry ids so that sound-alike spellings are also candidates.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.names = [normalize_name(entry['name']) for entry in entries]
+
+        gram_ids = {}
+        pair_grams = []
+        pair_entries = []
+        self.phonetic = {}
+        for entry_id, name in enumerate(self.names):
+            for gram in ngrams(name):
+                pair_grams.append(gram_ids.setdefault(gram, len(gram_ids)))
+                pair_entries.append(entry_id)
+            self.phonetic.setdefault(phonetic_key(name), []).append(entry_id)
+
+        # Group (gram, entry) pairs into one contiguous array per gram
+        pair_grams = np.asarray(pair_grams, dtype=np.int32)
+        pair_entries = np.asarray(pair_entries, dtype=np.int32)
+        order = np.argsort(pair_grams, kind='stable')
+        boundaries = np.searchsorted(pair_grams[order], np.arange(len(gram_ids) + 1))
+        sorted_entries = pair_entries[order]
+
+        self.postings = {
+            gram: sorted_entries[boundaries[gid]:boundaries[gid + 1]]
+            for gram, gid in gram_ids.items()
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def screen(self, name, limit=5):
+        """
+        Screens one name against the list.
+
+        Returns up to `limit` hits as dicts with the entry, the edit distance
+        and a similarity in [0, 1], best first.
+        """
+        query = normalize_name(name)
+        if not query or not self.entries:
+            return []
+
+        max_distance = max_distance_for(query)
+        query_grams = ngrams(query)
+
+        postings = [self.postings[g] for g in query_grams if g in self.postings]
+        selective = [p for p in postings if len(p) <= MAX_POSTING_LENGTH] or postings
+
+        # q-gram lemma: a name within max_distance edits shares at least this many n-grams
+        min_shared = max(1, len(query_grams) - NGRAM_SIZE * max_distance - (len(postings) - len(selective)))
+
+        candidates = np.empty(0, dtype=np.int32)
+        if selective:
+            counts = np.bincount(np.concatenate(selective), minlength=len(self.entries))
+            ids = np.flatnonzero(counts >= min_shared)
+            counts = counts[ids]
+            if len(ids) > MAX_CANDIDATES:
+                ids = ids[np.argpartition(-counts, MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+            candidates = ids
+
+        phonetic_ids = self.phonetic.get(phonetic_key(query), [])[:MAX_CANDIDATES]
+        candidate_ids = set(candidates.tolist()) | set(phonetic_ids)
+
+        hits = []
+        for entry_id in candidate_ids:
+            distance = bounded_edit_distance(query, self.names[entry_id], max_distance)
+            if distance <= max_distance:
+                longest = max(len(query), len(self.names[entry_id]))
+                hits.append({
+                    **self.entries[entry_id],
+                    "distance": distance,
+                    "similarity": round(1 - distance / longest, 4)
+                })
+
+        hits.sort(key=lambda hit: (hit['distance'], hit['name']))
+        return hits[:limit]
+
+
+# --- Module-level Index with Hot Reload ---
+
+_state = {
+    "index": WatchlistIndex([]),
+    "path": None,
+    "mtime": None,
+    "checked_at": 0.0,
+    "reloading": False
+}
+_lock = threading.Lock()
+
+
+def _current_file():
+    for path in WATCHLIST_FILES:
+        if os.path.exists(path):
+            return path, os.path.getmtime(path)
+    return None, None
+
+
+def _reload(path, mtime):
+    """Builds a new index off to the side, then swaps it in with one assignment."""
+    try:
+        index = WatchlistIndex(load_entries(path)) if path else WatchlistIndex([])
+        with _lock:
+            _state["index"] = index
+            _state["path"] = path
+            _state["mtime"] = mtime
+    except Exception as e:
+        # Keep serving the previous list if the new file is malformed
+        logger.warning("Failed to load watchlist", extra={"stage": "watchlist", "path": path, "error": str(e)})
+    finally:
+        with _lock:
+            _state["reloading"] = False
+
+
+def get_index():
+    """
+    Returns the current watchlist index.
+
+    The first load is synchronous. After that, a changed list file is
+    rebuilt in a background thread while the previous index keeps serving.
+    """
+    now = time.monotonic()
+    with _lock:
+        due = now - _state["checked_at"] >= RELOAD_CHECK_SEC
+        if due:
+            _state["checked_at"] = now
+        first_load = _state["mtime"] is None and _state["path"] is None and due
+
+    if due:
+        path, mtime = _current_file()
+        if (path, mtime) != (_state["path"], _state["mtime"]):
+            with _lock:
+                if _state["reloading"]:
+                    return _state["index"]
+                _state["reloading"] = True
+            if first_load:
+                _reload(path, mtime)
+            else:
+                threading.Thread(target=tracing.propagate(_reload), args=(path, mtime), daemon=True).start()
+
+    return _state["index"]
+
+
+@tracing.traced("watchlist.screen_name")
+def screen_name(name, limit=5):
+    """Screens a name against the current watchlist."""
+    return get_index().screen(name, limit=limit)
@@ -0,0 +1,116 @@
+# benchmarks/bench_api_mode.py
+"""
+Worker boot time and per-request overhead of the full settings profile
+(smartkyc_backend.settings) against API mode (smartkyc_backend.settings_api).
+
+The service is copied to a temporary directory so each run starts from an
+empty store. Boot is measured in a fresh interpreter per run: Django setup,
+the WSGI handler (which loads the middleware) and the URLconf. Requests go
+through django.test.Client, i.e. the full middleware stack, with the
+expiry sweeper and tracing off.
+
+    python benchmarks/bench_api_mode.py --boot-runs 5 --requests 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES = ("smartkyc_backend.settings", "smartkyc_backend.settings_api")
+
+BOOT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from importlib import import_module
+get_wsgi_application()
+import_module(settings.ROOT_URLCONF)
+print(json.dumps({"boot_sec": time.perf_counter() - start, "modules": len(sys.modules)}))
+"""
+
+REQUEST_SCRIPT = """
+import json, statistics, time
+import django
+django.setup()
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+setup_test_environment()
+client = Client()
+app_id = client.post('/api/v1/applications/start/').json()['application_id']
+cases = {
+    "GET application": lambda: client.get(f'/api/v1/applications/{app_id}/'),
+    "GET stats": lambda: client.get('/api/v1/stats/'),
+    "GET unknown application": lambda: client.get('/api/v1/applications/00000000-0000-0000-0000-000000000000/'),
+}
+results = {}
+for name, call in cases.items():
+    for _ in range(50):
+        call()
+    timings = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    results[name] = {"p50_us": statistics.median(timings) * 1e6,
+                     "p99_us": timings[int(len(timings) * 0.99) - 1] * 1e6}
+print(json.dumps(results))
+"""
+
+
+def copy_service(target):
+    shutil.copytree(SERVICE_DIR, target, ignore=shutil.ignore_patterns(
+        'data', 'source', 'benchmarks', '__pycache__', 'db.sqlite3'))
+    os.makedirs(os.path.join(target, 'data'))
+
+
+def run_script(service_dir, settings_module, script):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module,
+               SMARTKYC_EXPIRY_SWEEPER='0', SMARTKYC_TRACING='0', SMARTKYC_LOG_LEVEL='WARNING')
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', script], cwd=service_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    elapsed = time.perf_counter() - start
+    return json.loads(output.strip().splitlines()[-1]), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boot-runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service_dir = os.path.join(tmp_dir, 'service')
+        copy_service(service_dir)
+
+        print(f"Boot (median of {args.boot_runs} fresh interpreters)")
+        for settings_module in PROFILES:
+            runs = [run_script(service_dir, settings_module, BOOT_SCRIPT) for _ in range(args.boot_runs)]
+            boot = statistics.median(result["boot_sec"] for result, _ in runs)
+            process = statistics.median(elapsed for _, elapsed in runs)
+            print(f"  {settings_module:32s} setup {boot * 1000:7.1f} ms, "
+                  f"process {process * 1000:7.1f} ms, {runs[0][0]['modules']:5d} modules")
+
+        print(f"\nPer request ({args.requests} requests per endpoint)")
+        script = f"REQUESTS = {args.requests}\n{REQUEST_SCRIPT}"
+        for settings_module in PROFILES:
+            results, _ = run_script(service_dir, settings_module, script)
+            print(f"  {settings_module}")
+            for name, timing in results.items():
+                print(f"    {name:26s} p50 {timing['p50_us']:8.1f} us, p99 {timing['p99_us']:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
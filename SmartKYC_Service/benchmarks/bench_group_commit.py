@@ -0,0 +1,96 @@
+# benchmarks/bench_group_commit.py
+"""
+Write throughput and latency of the group committer (api/group_commit.py).
+
+Runs T threads that each perform M small mutations against a temporary
+store with fsync enabled, once per window setting.
+
+    python benchmarks/bench_group_commit.py --threads 32 --ops 20 --store-size 1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import store_formats  # noqa: E402
+from api.group_commit import GroupCommitter  # noqa: E402
+
+
+def make_store(path, store_format):
+    def load():
+        with open(path, 'rb') as f:
+            return store_format.decode(f.read())
+
+    def store(data):
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(store_format.dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+
+    return load, store
+
+
+def run(window_ms, args, path, store_format):
+    load, store = make_store(path, store_format)
+    committer = GroupCommitter(load, store, window_sec=window_ms / 1000, max_ops=args.max_ops)
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker(worker_id):
+        for op in range(args.ops):
+            key = f"w{worker_id}-{op}"
+
+            def mutation(applications, key=key):
+                applications[key] = {"application_id": key, "status": "PENDING_DOCUMENTS"}
+                return key
+
+            start = time.perf_counter()
+            committer.submit(mutation)
+            with latencies_lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = args.threads * args.ops
+    print(f"window {window_ms:>5.1f} ms: {total / elapsed:8.1f} ops/s, "
+          f"{committer.commits:5d} commits ({committer.mutations / committer.commits:5.1f} ops/commit), "
+          f"latency p50 {statistics.median(latencies) * 1000:7.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ops', type=int, default=20)
+    parser.add_argument('--store-size', type=int, default=1000)
+    parser.add_argument('--max-ops', type=int, default=64)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 2, 10])
+    args = parser.parse_args()
+
+    store_format = store_formats.FORMATS["json"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "applications.json")
+        seed = {f"seed-{i}": {"application_id": f"seed-{i}", "status": "APPROVED"} for i in range(args.store_size)}
+        for window_ms in args.windows:
+            with open(path, 'wb') as f:
+                f.write(store_format.dumps(seed))
+            run(window_ms, args, path, store_format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_projection.py
+"""
+Payload size and render time of GET /applications/<id>/ representations
+(api/projection.py): the full record, ?view=summary and a polling client's
+?fields=status,explanations.
+
+Render time is projection plus JSON encoding with DRF's JSONRenderer
+settings (compact separators, ensure_ascii off). The compiled projections
+are also compared with a projection that walks the field paths on every
+call, to show what precompiling buys.
+
+    python benchmarks/bench_projection.py --apps 2000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import projection  # noqa: E402
+from api.synthetic import generate_applications  # noqa: E402
+
+
+def render(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def interpreted(paths):
+    """Reference projection: parses and walks every path on each call."""
+    def project(value, segments):
+        if not segments or not isinstance(value, dict):
+            return value
+        head, rest = segments[0], segments[1:]
+        keys = value.keys() if head == '*' else [head] if head in value else []
+        return {key: project(value[key], rest) for key in keys}
+
+    def merge(into, part):
+        for key, sub in part.items():
+            if key in into and isinstance(into[key], dict) and isinstance(sub, dict):
+                merge(into[key], sub)
+            else:
+                into[key] = sub
+
+    def apply(app):
+        out = {}
+        for path in paths:
+            merge(out, project(app, path.split('.')))
+        return out
+    return apply
+
+
+def measure(apps, project, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for app in apps:
+            render(project(app) if project else app)
+        best = min(best, time.perf_counter() - start)
+    return best / len(apps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    apps = list(generate_applications(args.apps, seed=args.seed))
+    polling_fields = projection.parse_fields("status,explanations")
+    cases = [
+        ("full", None),
+        ("view=summary", projection.SUMMARY),
+        ("view=summary (interpreted)", interpreted(projection.SUMMARY_FIELDS)),
+        ("fields=status,explanations", projection.compile_projection(polling_fields)),
+        ("fields=... (interpreted)", interpreted(polling_fields)),
+    ]
+
+    full_bytes = statistics.mean(len(render(app)) for app in apps)
+    full_time = measure(apps, None, args.repeat)
+    print(f"{len(apps)} synthetic applications\n")
+    print(f"{'representation':30s} {'bytes':>8s} {'vs full':>8s} {'render':>10s} {'vs full':>8s}")
+    for name, project in cases:
+        size = statistics.mean(len(render(project(app) if project else app)) for app in apps)
+        per_app = full_time if project is None else measure(apps, project, args.repeat)
+        print(f"{name:30s} {size:8.0f} {size / full_bytes:7.0%} {per_app * 1e6:8.2f} us {per_app / full_time:7.0%}")
+
+
+if __name__ == '__main__':
+    main()
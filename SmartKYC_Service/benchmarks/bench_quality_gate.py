@@ -0,0 +1,106 @@
+# benchmarks/bench_quality_gate.py
+"""
+Cost of the capture-quality gate (api/quality.py) per upload, against
+the inference step it saves when it turns a bad capture away.
+
+Synthetic document photos (12 MP JPEG by default) are generated sharp,
+as a clipped white-paper scan, defocused, with a glare spot and at low
+resolution. For each, the
+benchmark reports the preprocessing time (paid once either way; the
+gate reuses its variants), the gate time and verdict, and compares the
+gate with the mock document inference latency (1.5-3.5 s in
+api/ai_mocks.py), which a rejected capture no longer waits for.
+
+    python benchmarks/bench_quality_gate.py --size 4000x3000 --repeat 20
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import preprocessing  # noqa: E402
+from api import quality  # noqa: E402
+
+# Mean of the mock document inference latency, random.uniform(1.5, 3.5)
+MOCK_INFERENCE_SEC = 2.5
+
+
+def document_photo(width, height, seed, background=(226, 222, 210)):
+    """A card-like capture: rows of dark text and a photo block on off-white (or the given background)."""
+    rng = np.random.default_rng(seed)
+    image = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=height // 40)
+    alphabet = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ')
+    for y in range(height // 10, height - height // 10, height // 25):
+        draw.text((width // 12, y), ''.join(rng.choice(alphabet, 40)), fill=(20, 20, 30), font=font)
+    draw.rectangle((width * 2 // 3, height // 8, width * 9 // 10, height // 2), fill=(150, 120, 100))
+    return image
+
+
+def captures(width, height, seed):
+    sharp = document_photo(width, height, seed)
+    glare = sharp.copy()
+    ImageDraw.Draw(glare).ellipse((width // 5, height // 6, width * 2 // 3, height * 2 // 3), fill=(255, 255, 255))
+    return {
+        "sharp": sharp,
+        "white scan": document_photo(width, height, seed, background=(255, 255, 255)),
+        "defocused": sharp.filter(ImageFilter.GaussianBlur(width / 1000)),
+        "glare": glare.filter(ImageFilter.GaussianBlur(1)),
+        "low resolution": sharp.resize((480, 360), Image.Resampling.LANCZOS),
+    }
+
+
+def jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def timed(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='4000x3000', help="capture size, WIDTHxHEIGHT")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.size.split('x'))
+
+    # Preprocess without touching (or being helped by) the service's variant cache
+    preprocessing.CACHE_DIR = tempfile.mkdtemp(prefix="bench-quality-")
+    preprocessing._store_cached = lambda digest, variants, source_size: None
+
+    print(f"{width}x{height} JPEG captures, median of {args.repeat}; "
+          f"mock inference {MOCK_INFERENCE_SEC * 1000:.0f} ms\n")
+    print(f"{'capture':16s} {'preprocess':>11s} {'gate':>9s} {'gate/inference':>15s}  verdict")
+    for name, image in captures(width, height, args.seed).items():
+        data = jpeg(image)
+        model_inputs, preprocess_sec = timed(
+            lambda: preprocessing.preprocess(data, preprocessing.DOCUMENT_TARGETS), max(args.repeat // 4, 1)
+        )
+        report, gate_sec = timed(lambda: quality.check(model_inputs, "document"), args.repeat)
+        details = ", ".join(f"{key}={value}" for key, value in report.metrics.items())
+        print(f"{name:16s} {preprocess_sec * 1000:8.1f} ms {gate_sec * 1000:6.2f} ms "
+              f"{gate_sec / MOCK_INFERENCE_SEC:14.3%}  {report.status} ({details})")
+
+
+if __name__ == '__main__':
+    main()
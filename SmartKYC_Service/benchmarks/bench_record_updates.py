@@ -0,0 +1,118 @@
+# benchmarks/bench_record_updates.py
+"""
+Memory allocated by each workflow step's record update (the
+_apply_document / _apply_selfie / _apply_risk_analysis functions the
+upload and analyze requests run inside their commit), measured with
+tracemalloc.
+
+Synthetic applications (api/synthetic.py) are replayed from a fresh
+PENDING_DOCUMENTS record through ID document, address proof, selfie and
+risk analysis. For every step the previous version of the record is kept
+alive, as a cached response or a batch's change list would. Each step
+is measured as the workflow runs it (copy-on-write on the JSON record,
+api/records.py), and after a copy.deepcopy() of the record, the cost
+of getting an independent new version by copying. Per step:
+
+  new blocks / new KiB   memory the updated record holds that the
+                         previous version did not (net, after the step)
+  peak KiB               transient peak during the step
+  time                   mean wall time of the step
+
+    python benchmarks/bench_record_updates.py --apps 500
+"""
+
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import data_manager  # noqa: E402
+from api.synthetic import generate_application  # noqa: E402
+
+
+def workflow(completed):
+    """The steps that rebuild `completed` (an APPROVED application) from a fresh record."""
+    documents = completed['documents']
+
+    def document_result(entry):
+        return {key: entry[key] for key in ("forensics", "extracted_data", "model_info")}
+
+    return [
+        ("id document", lambda app: data_manager._apply_document(
+            app, "id_document", documents['id_document']['document_type'],
+            documents['id_document']['file_path'], document_result(documents['id_document']))),
+        ("address proof", lambda app: data_manager._apply_document(
+            app, "address_proof", documents['address_proof']['document_type'],
+            documents['address_proof']['file_path'], document_result(documents['address_proof']))),
+        ("selfie", lambda app: data_manager._apply_selfie(
+            app, completed['selfie']['file_path'], completed['selfie']['ai_analysis'])),
+        ("risk analysis", lambda app: data_manager._apply_risk_analysis(app, completed['risk_analysis'])),
+    ]
+
+
+def fresh_record(completed):
+    """The record create_new_application() writes, with `completed`'s id and creation time."""
+    return {
+        "application_id": completed['application_id'],
+        "status": "PENDING_DOCUMENTS",
+        "created_at": completed['created_at'],
+        "updated_at": completed['created_at'],
+        "risk_score": None,
+        "explanations": [],
+        "documents": {"id_document": None, "address_proof": None},
+        "selfie": None,
+        "extracted_data": None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    completed_apps = [generate_application(i, rng, status="APPROVED") for i in range(args.apps)]
+
+    count = len(completed_apps)
+    print(f"{count} synthetic applications, per step (previous versions kept alive)\n")
+    print(f"{'step':32s} {'new blocks':>10s} {'new KiB':>9s} {'peak KiB':>9s} {'time':>10s}")
+    for label, isolate in (("", None), (" after deepcopy", copy.deepcopy)):
+        for name, (blocks, size, peak, elapsed) in measure(completed_apps, isolate).items():
+            print(f"{name + label:32s} {blocks / count:10.1f} {size / count / 1024:9.2f} "
+                  f"{peak / count / 1024:9.2f} {elapsed / count * 1e6:7.1f} us")
+
+
+def measure(completed_apps, isolate):
+    totals = {}
+    tracemalloc.start()
+    for completed in completed_apps:
+        versions = [fresh_record(completed)]
+        for name, step in workflow(completed):
+            before = tracemalloc.take_snapshot()
+            current_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            versions.append(step(isolate(versions[-1]) if isolate else versions[-1]))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - current_before
+            stats = tracemalloc.take_snapshot().compare_to(before, 'filename')
+            blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+            size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+
+            total = totals.setdefault(name, [0, 0, 0, 0.0])
+            total[0] += blocks
+            total[1] += size
+            total[2] += peak
+            total[3] += elapsed
+    tracemalloc.stop()
+    return totals
+
+
+if __name__ == '__main__':
+    main()
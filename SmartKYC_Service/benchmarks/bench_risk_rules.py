@@ -0,0 +1,119 @@
+# benchmarks/bench_risk_rules.py
+"""
+Per-application evaluation cost of the compiled risk rules (api/risk_engine.py).
+
+Expands the bundled rules file to N rules (default 200) by cloning rules
+with shifted thresholds, then times the scalar path (with and without
+per-rule timing) and the vectorized batch path on synthetic features.
+
+The scalar path tests each distinct condition once (clones of a rule
+share theirs, and the shifted thresholds of one feature are a single
+bisect), so its cost follows the number of condition groups and fired
+rules more than the rule count. Timing every rule bypasses that grouping
+and is expected to be over budget; production samples timing_sample_rate
+of the evaluations.
+
+    python benchmarks/bench_risk_rules.py --rules 200 --apps 20000
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import risk_engine  # noqa: E402
+
+BUDGET_US = 100
+
+
+def expand_rules(config, count):
+    base = config['rules']
+    rules = []
+    for i in range(count):
+        rule = copy.deepcopy(base[i % len(base)])
+        rule['id'] = f"{rule['id']}_{i}"
+        when = rule['when']
+        if when.get('op') in ("lt", "gt") and isinstance(when.get('value'), (int, float)):
+            when['value'] = when['value'] + (i // len(base)) * 0.001
+        rules.append(rule)
+    return {**config, "rules": rules}
+
+
+def synthetic_features(rng):
+    statuses = ["CLEAR"] * 8 + ["TAMPERED", "BLURRY"]
+    selfie_failed = rng.random() < 0.1
+    hits = [{"list_type": "PEP", "name": "DOE, JANE", "similarity": 1.0}] if rng.random() < 0.02 else []
+    return {
+        "id_status": rng.choice(statuses),
+        "addr_status": rng.choice(statuses),
+        "documents_missing": rng.random() < 0.01,
+        "selfie_missing": False,
+        "selfie_status": "REJECTED_MISMATCH" if selfie_failed else "CLEAR",
+        "selfie_failed": selfie_failed,
+        "selfie_reason": "Selfie does not match." if selfie_failed else "Biometric verification successful.",
+        "match_score": round(rng.uniform(0.3, 0.99), 4),
+        "duplicate_faces": int(rng.random() < 0.01),
+        "extracted_missing": False,
+        "id_name": "JANE DOE",
+        "addr_name": "JANE DOE" if rng.random() < 0.95 else "JOHN DOE",
+        "name_mismatch": False,
+        "duplicate_documents": int(rng.random() < 0.05),
+        "duplicate_dob_names": int(rng.random() < 0.05),
+        "screened_name": "JANE DOE",
+        "watchlist_hits": hits,
+        "watchlist_hit": bool(hits),
+        "sanctions_hit": False,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=200)
+    parser.add_argument('--apps', type=int, default=20_000)
+    args = parser.parse_args()
+
+    with open(risk_engine.RULES_FILES[-1]) as f:
+        config = expand_rules(json.load(f), args.rules)
+
+    start = time.perf_counter()
+    rules = risk_engine.RuleSet(config)
+    print(f"Compiled {len(rules.rules)} rules into {len(rules._groups)} condition groups "
+          f"in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    rng = random.Random(1)
+    rows = [synthetic_features(rng) for _ in range(args.apps)]
+
+    cases = (
+        ("scalar", False),
+        (f"scalar, {rules.timing_sample_rate:.0%} timed", None),  # production default
+        ("scalar, every rule timed", True),
+    )
+    for label, timed in cases:
+        start = time.perf_counter()
+        for row in rows:
+            rules.evaluate(row, timed=timed)
+        per_app = (time.perf_counter() - start) / len(rows) * 1e6
+        verdict = "OK" if per_app < BUDGET_US else "over budget"
+        print(f"{label:>26}: {per_app:.1f} us/application ({verdict}, budget {BUDGET_US} us)")
+
+    start = time.perf_counter()
+    columns = risk_engine.feature_columns(rows)
+    rules.evaluate_columns(columns, rows, rng=np.random.default_rng(0))
+    per_app = (time.perf_counter() - start) / len(rows) * 1e6
+    print(f"{'vectorized batch':>26}: {per_app:.1f} us/application")
+
+    slowest = sorted(rules.rule_timings().items(), key=lambda item: -(item[1]['mean_us'] or 0))[:5]
+    print("Slowest rules (sampled):")
+    for rule_id, timing in slowest:
+        print(f"  {rule_id}: {timing['mean_us']} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_snapshot.py
+"""
+Cold-start and single-record read cost: full JSON load vs the mmap snapshot.
+
+    python benchmarks/bench_snapshot.py --applications 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api import store_formats  # noqa: E402
+from bench_store_formats import synthetic_application  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=100_000)
+    parser.add_argument('--reads', type=int, default=10_000)
+    args = parser.parse_args()
+
+    store = {}
+    for i in range(args.applications):
+        app = synthetic_application(i)
+        store[app['application_id']] = app
+    ids = random.Random(3).choices(list(store), k=args.reads)
+
+    json_format = store_formats.FORMATS["json"]
+    snapshot_format = store_formats.FORMATS["snapshot"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "applications.json")
+        snap_path = os.path.join(tmp, "applications.snap")
+        with open(json_path, 'wb') as f:
+            f.write(json_format.dumps(store))
+        start = time.perf_counter()
+        with open(snap_path, 'wb') as f:
+            f.write(snapshot_format.dumps(store))
+        print(f"Snapshot written in {time.perf_counter() - start:.2f}s "
+              f"({os.path.getsize(snap_path) / 1e6:.1f} MB vs {os.path.getsize(json_path) / 1e6:.1f} MB JSON)")
+
+        # Cold start + first read
+        start = time.perf_counter()
+        with open(json_path, 'rb') as f:
+            loaded = json_format.decode(f.read())
+        loaded.get(ids[0])
+        print(f"json     cold start + first read: {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+        start = time.perf_counter()
+        reader = store_formats.SnapshotReader(snap_path)
+        reader.get(ids[0])
+        print(f"snapshot cold start + first read: {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+        # Per-request reads (the json path re-reads the whole file, as read_data() does)
+        start = time.perf_counter()
+        for app_id in ids[:20]:
+            with open(json_path, 'rb') as f:
+                json_format.decode(f.read()).get(app_id)
+        print(f"json     get_application:          {(time.perf_counter() - start) / 20 * 1000:9.2f} ms/read")
+
+        start = time.perf_counter()
+        for app_id in ids:
+            reader.get(app_id)
+        print(f"snapshot get_application:          {(time.perf_counter() - start) / len(ids) * 1e6:9.2f} us/read")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_store_formats.py
+"""
+File size, load time and dump time of each store format (api/store_formats.py).
+
+Builds a synthetic store of N completed applications and round-trips it
+through every registered format. Install orjson, msgpack and cbor2 to
+include the optional codecs.
+
+    python benchmarks/bench_store_formats.py --applications 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import store_formats  # noqa: E402
+
+
+def synthetic_application(i):
+    app_id = str(uuid.UUID(int=i))
+    now = "2025-11-15T04:55:47.131454Z"
+    return {
+        "application_id": app_id,
+        "status": "APPROVED",
+        "created_at": now,
+        "updated_at": now,
+        "risk_score": 8,
+        "explanations": ["All automated checks passed.", "Data consistent across documents.",
+                         "Biometric match score is high."],
+        "documents": {
+            "id_document": {
+                "file_path": f"uploads/{app_id}/passport.jpg", "uploaded_at": now, "status": "PROCESSED",
+                "document_type": "PASSPORT",
+                "forensics": {"status": "CLEAR", "confidence_score": 0.9731,
+                              "checks_passed": ["hologram_check", "font_analysis", "template_match"]},
+                "extracted_data": {"first_name": "JANE", "last_name": "DOE", "document_number": f"P{i:08d}",
+                                   "dob": "1990-01-01", "expiry_date": "2030-11-14", "nationality": "USA"},
+                "model_info": {"ocr_model": "mock-trocr-transformer-v1.2", "forensics_model": "mock-cnn-tamper-v2.1",
+                               "processing_time_sec": 2.41}
+            },
+            "address_proof": {
+                "file_path": f"uploads/{app_id}/bill.jpg", "uploaded_at": now, "status": "PROCESSED",
+                "document_type": "UTILITY_BILL",
+                "forensics": {"status": "CLEAR", "confidence_score": 0.9512,
+                              "checks_passed": ["logo_match", "address_database_crosscheck", "date_check"]},
+                "extracted_data": {"name": "JANE DOE", "address": "123 MAIN ST, ANYTOWN, USA 12345",
+                                   "issue_date": "2025-10-16", "provider": "City Electric & Gas"},
+                "model_info": {"ocr_model": "mock-trocr-transformer-v1.2", "forensics_model": "mock-cnn-tamper-v2.1",
+                               "processing_time_sec": 1.87}
+            }
+        },
+        "selfie": {
+            "file_path": f"uploads/{app_id}/selfie.jpg", "uploaded_at": now, "status": "CLEAR",
+            "ai_analysis": {
+                "status": "CLEAR", "reason": "Biometric verification successful.",
+                "liveness_check": {"status": "REAL", "confidence": 0.9812},
+                "face_match": {"status": "MATCH", "match_score": 0.9711, "id_document_face_ref": f"doc_{app_id}_face.jpg",
+                               "selfie_face_ref": f"selfie_{app_id}_face.jpg", "duplicate_faces": []},
+                "model_info": {"face_match_model": "mock-cnn-facenet-v3.0", "liveness_model": "mock-antispoof-v1.8",
+                               "processing_time_sec": 1.52}
+            }
+        },
+        "extracted_data": {"first_name": "JANE", "last_name": "DOE", "document_number": f"P{i:08d}",
+                           "dob": "1990-01-01", "expiry_date": "2030-11-14", "nationality": "USA",
+                           "address_issue_date": "2025-10-16", "address_provider": "City Electric & Gas"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    store = {}
+    for i in range(args.applications):
+        app = synthetic_application(i)
+        store[app['application_id']] = app
+
+    print(f"{'format':<12} {'size (MB)':>10} {'dump (s)':>9} {'load (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, store_format in sorted(store_formats.FORMATS.items()):
+            path = os.path.join(tmp, f"store.{store_format.extension}")
+
+            dump_times, load_times = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                raw = store_format.dumps(store)
+                with open(path, 'wb') as f:
+                    f.write(raw)
+                dump_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                with open(path, 'rb') as f:
+                    loaded = store_format.decode(f.read())
+                load_times.append(time.perf_counter() - start)
+
+            assert len(loaded) == len(store)
+            print(f"{name:<12} {os.path.getsize(path) / 1e6:>10.1f} {min(dump_times):>9.3f} {min(load_times):>9.3f}")
+
+    missing = [lib for lib, mod in (("orjson", store_formats.orjson), ("msgpack", store_formats.msgpack),
+                                    ("cbor2", store_formats.cbor2)) if mod is None]
+    if missing:
+        print(f"Not installed (skipped or using stdlib fallback): {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_watchlist.py
+"""
+Build-time and screening-latency benchmark for api/watchlist.py.
+
+Generates a synthetic watchlist of N names, then screens exact, misspelled
+and unrelated names against it.
+
+    python benchmarks/bench_watchlist.py --entries 1000000 --queries 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import watchlist  # noqa: E402
+
+FIRST = ["JANE", "JOHN", "MARIA", "AHMED", "WEI", "OLGA", "PEDRO", "AISHA", "IVAN", "FATIMA",
+         "LUCA", "CHEN", "SARAH", "OMAR", "ELENA", "DAVID", "YUKI", "NADIA", "KARL", "PRIYA"]
+CONSONANTS = "BCDFGHJKLMNPRSTVWZ"
+VOWELS = "AEIOUY"
+
+
+def random_name(rng):
+    syllables = rng.randint(2, 4)
+    last = ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) + rng.choice(["", "N", "R", "S"])
+                   for _ in range(syllables))
+    return f"{rng.choice(FIRST)} {last}"
+
+
+def misspell(rng, name):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + name[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    entries = [
+        {"entry_id": str(i), "name": random_name(rng), "list_type": "SANCTIONS", "country": None}
+        for i in range(args.entries)
+    ]
+
+    start = time.perf_counter()
+    index = watchlist.WatchlistIndex(entries)
+    print(f"Indexed {len(index):,} entries in {time.perf_counter() - start:.2f}s "
+          f"({len(index.postings):,} n-grams)")
+
+    samples = rng.sample(entries, args.queries)
+    cases = {
+        "exact": [entry['name'] for entry in samples],
+        "misspelled": [misspell(rng, entry['name']) for entry in samples],
+        "unrelated": [f"QX{random_name(rng)}ZZ" for _ in range(args.queries)],
+    }
+
+    for case, names in cases.items():
+        latencies = []
+        found = 0
+        for name, entry in zip(names, samples):
+            start = time.perf_counter()
+            hits = index.screen(name)
+            latencies.append((time.perf_counter() - start) * 1000)
+            # Synthetic names can repeat, so any hit with the listed name counts
+            found += any(hit['name'] == entry['name'] for hit in hits)
+        latencies.sort()
+        print(f"{case:>10}: mean {sum(latencies) / len(latencies):.3f} ms, "
+              f"p50 {latencies[len(latencies) // 2]:.3f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms, "
+              f"recall {found / len(names):.3f}")
+
+
+if __name__ == '__main__':
+    main()
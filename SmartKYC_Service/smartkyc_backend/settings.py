@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request-scoped tracing spans (api/tracing.py); enable with SMARTKYC_TRACING=1
+    'api.tracing.TracingMiddleware',
+    # On-demand request profiles and the background stack sampler (api/profiling.py);
+    # enable with SMARTKYC_PROFILING_TOKEN / SMARTKYC_PROFILING_SAMPLER=1
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -124,3 +130,36 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Django REST framework
+# API responses are encoded with orjson when it is installed (api/renderers.py)
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Logging
+# The api app logs JSON lines (application_id, stage, duration_ms, ...) via a
+# queue, so request threads never block on stdout. See api/structured_log.py.
+# SMARTKYC_LOG_DEBUG_SAMPLE_RATE keeps that fraction of DEBUG events.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'structured': {
+            'class': 'api.structured_log.AsyncJsonHandler',
+            'debug_sample_rate': float(os.environ.get('SMARTKYC_LOG_DEBUG_SAMPLE_RATE', '1.0')),
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['structured'],
+            'level': os.environ.get('SMARTKYC_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,51 @@
+"""
+API-mode settings for smartkyc_backend.
+
+The KYC endpoints are token-less JSON views; they use no admin, sessions,
+messages, auth, templates or CSRF. This profile drops them, which cuts
+worker boot (fewer apps to import and set up) and per-request middleware
+cost. Select it with
+
+    DJANGO_SETTINGS_MODULE=smartkyc_backend.settings_api
+
+Everything not overridden here comes from settings.py.
+See benchmarks/bench_api_mode.py for the comparison.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'api',
+]
+
+MIDDLEWARE = [
+    'api.tracing.TracingMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    # Kept for APPEND_SLASH, so URLs behave as in the full profile
+    'django.middleware.common.CommonMiddleware',
+]
+
+# No admin/ routes
+ROOT_URLCONF = 'smartkyc_backend.urls_api'
+
+TEMPLATES = []
+AUTH_PASSWORD_VALIDATORS = []
+
+# Responses are not translated; skips loading the translation catalogs
+USE_I18N = False
+
+# JSON only, and no authentication: without django.contrib.auth there is
+# no AnonymousUser, so request.user is None.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['api.renderers.FastJSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+}
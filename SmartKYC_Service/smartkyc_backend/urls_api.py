@@ -0,0 +1,8 @@
+# smartkyc_backend/urls_api.py
+
+from django.urls import path, include
+
+# URLconf of the API-mode settings (settings_api.py): the API without admin/
+urlpatterns = [
+    path('api/v1/', include('api.urls')),
+]